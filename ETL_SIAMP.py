@@ -13,136 +13,115 @@ from __future__ import annotations
 import argparse
 import glob
 import io
+import multiprocessing
 import os
 import re
+import sqlite3
 import sys
 import warnings
 import configparser
 import traceback
-from time import sleep
+from functools import partial
 from typing import Any
-import xml.etree.ElementTree as ET
-from datetime import datetime
+from datetime import datetime, timedelta
+from time import perf_counter
+import numpy as np
 import pandas as pd
-import requests
-from openpyxl import load_workbook
-from openpyxl.worksheet.table import Table, TableStyleInfo
-from openpyxl.utils import get_column_letter
+from ETL_SIAMP_LECTURE import Classeur, LECTEURS
+from ETL_SIAMP_CACHE import CacheFeuilles, PARQUET_DISPONIBLE, TAILLE_MAX_MO
+from ETL_SIAMP_META import lister_feuilles
+from ETL_SIAMP_SCAN import lire_manifeste
+from ETL_SIAMP_FOURNISSEURS import TAUX_SECOURS, CacheTaux
+from ETL_SIAMP_DOUBLONS import dedoublonner, ecrire_journal, FEUILLE_DOUBLONS
+from ETL_SIAMP_REFERENCES import charger_references, cache_references
+from ETL_SIAMP_ECRITURE import (classeur_sortie, ecrire_feuille, ecrire_partitions, partitionner, FORMAT_EURO,
+                                MODES_PARTITION, CIBLES_PARTITION, FEUILLE_INDEX)
+from ETL_SIAMP_ENRICHISSEMENT import enrichir, afficher_rapport
+from ETL_SIAMP_ETAPES import Etape, Ordonnanceur
+from ETL_SIAMP_HISTORIQUE import (IndexHistorique, MODES_HISTORIQUE, FEUILLE_CHEVAUCHEMENTS, cles_historique,
+                                  mois_lignes, rapport_chevauchements)
+from ETL_SIAMP_TAUX import BaseTaux, IndexTaux, FENETRE_JOURS, STATISTIQUES_CUBE, taux_mensuels_lignes
+from ETL_SIAMP_SCHEMA import (typer_feuille, unifier_categories, en_objet, est_categorie,
+                              memoire_mo, memoire_sans_categories_mo)
+from ETL_SIAMP_NORMALISATION import (normaliser, par_valeurs_uniques, nettoyer_str, nettoyer_invisibles,
+                                     majuscules, majuscules_sans_vides, strip_majuscules)
 
 # ------------------------------------------------------------------ console UTF‑8
-if sys.stdout and hasattr(sys.stdout, "buffer"):
+# reconfigure plutôt qu'un nouveau TextIOWrapper : le module est aussi importé (GUI, scan) et
+# un second wrapper sur le même tampon le fermerait en étant libéré
+if sys.stdout and hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8", errors="replace")
+elif sys.stdout and hasattr(sys.stdout, "buffer"):
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
 warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
 
 
 # ------------------------------------------------------------------ taux de change
-import requests
-import xml.etree.ElementTree as ET
-from datetime import datetime
-
-def get_ecb_rates(date: str | None = None, required_currencies: set[str] | None = None):
-    print(f"[DEBUG] Appel get_ecb_rates(date={date})", flush=True)
-    if date:
-        url = "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-hist.xml"
-    else:
-        url = "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-daily.xml"
+MODES_TAUX = ["date", "mois", "moyenne_mois", "fin_mois"]
+STATISTIQUE_MODE = {"moyenne_mois": "moyenne", "fin_mois": "fin_mois"}  # modes servis par le cube mensuel
 
+def _completer_base(base: BaseTaux, date: str | None) -> bool:
+    """
+    Synchronise la base locale si elle ne couvre pas `date` ; hors ligne, on s'en contente.
+    Renvoie False si la synchronisation a été évitée.
+    """
+    if not base.doit_synchroniser(date):
+        return False
     try:
-        response = requests.get(url)
-        print(f"[INFO] 📡 Requête vers {url}", flush=True)
-        print(f"[INFO] ✅ Statut : {response.status_code}", flush=True)
-        response.raise_for_status()
-
-        root = ET.fromstring(response.content)
-        ns = {'ns': 'http://www.ecb.int/vocabulary/2002-08-01/eurofxref'}
-
-        rates = {"EUR": 1.0}
-        from datetime import datetime, timedelta
-
-        if date:
-            limit_date = (datetime.strptime(date, "%Y-%m-%d") - timedelta(days=60)).strftime("%Y-%m-%d")
-            print(f"[INFO] 🔍 Recherche limitée aux taux entre {limit_date} et {date}", flush=True)
-
+        ajoutes = base.synchroniser()
+        print(f"[INFO] ✅ {ajoutes} taux ajoutés à la base locale", flush=True)
+    except Exception as e:
+        print(f"[WARN] ⚠ Synchronisation BCE impossible ({e}) : base locale seule", flush=True)
+    return True
 
 
-        dates = [cube.attrib["time"] for cube in root.findall(".//ns:Cube[@time]", ns)]
-        if date:
-            dates = sorted([d for d in dates if limit_date <= d <= date], reverse=True)
-        else:
-            dates = sorted(dates, reverse=True)
-
-
-        rates_found = set(rates.keys())
-        target_cube = None
-
-        for d in dates:
-            cube_d = root.find(f".//ns:Cube[@time='{d}']", ns)
-            if cube_d is None:
-                continue
-
-            for cube in cube_d.findall("ns:Cube", ns):
-                cur = cube.attrib["currency"]
-                if cur not in rates:
-                    rate = float(cube.attrib["rate"])
-                    rates[cur] = rate
-                    print(f"[INFO] ➕ Taux récupéré pour {cur} au {d} = {rate}", flush=True)
-                    rates_found.add(cur)
-
-            if required_currencies and required_currencies <= rates_found:
-                print(f"[INFO] ✅ Tous les taux requis trouvés avant {d}", flush=True)
-                break
-
-
-        if date:
-            # chercher le jour exact OU le plus proche avant
-            dates = [cube.attrib["time"] for cube in root.findall(".//ns:Cube[@time]", ns)]
-            print(f"[INFO] 📅 {len(dates)} dates trouvées dans l'historique ECB", flush=True)
-            print(f"[INFO] 📅 Premières dates disponibles : {dates[:5]}", flush=True)
-            dates.sort(reverse=True)
-            target_date = None
-            for d in dates:
-                if d <= date:
-                    target_date = d
-                    break
-
-            if not target_date:
-                raise ValueError(f"Aucun taux trouvé avant la date {date}")
-
-            target_cube = root.find(f".//ns:Cube[@time='{target_date}']", ns)
-            if target_date != date:
-                print(f"[INFO] ⚠️ Pas de taux pour {date}, utilisation de {target_date} à la place", flush=True)
-            else:
-                print(f"[INFO] ✅ Taux trouvés pour la date exacte : {target_date}", flush=True)
+def synchroniser_bce(date: str | None = None) -> bool:
+    """Complète la base locale jusqu'à `date` (étape réseau, lancée pendant la lecture des fichiers)."""
+    try:
+        with BaseTaux() as base:
+            return _completer_base(base, date)
+    except Exception as e:
+        print(f"[WARN] ⚠ Base de taux inaccessible ({e})", flush=True)
+        return False
 
 
-            if target_date != date:
-                print(f"[INFO] ⚠ Aucun taux pour {date}, substitution par {target_date}", flush=True)
+def get_ecb_rates(date: str | None = None, required_currencies: set[str] | None = None,
+                  cache: CacheTaux | None = None, synchroniser: bool = True):
+    """
+    Taux BCE au `date` (dernier jour publié ≤ date, devises absentes complétées
+    sur 60 jours), lus dans la base locale ETL_SIAMP_TAUX ; le réseau ne sert qu'à
+    compléter la base. Base vide et BCE injoignable → taux codés en dur.
+    Une réponse encore valide dans `cache` (instantané du GUI) est reprise telle quelle.
+    synchroniser=False : la base a déjà été complétée (synchroniser_bce).
+    """
+    print(f"[DEBUG] Appel get_ecb_rates(date={date})", flush=True)
+    try:
+        rates = cache.lire("BCE", date) if cache is not None else None
+        target_date = date
+        if rates is not None:
+            print(f"[INFO] ♻️ Taux BCE au {date} repris de l'instantané de l'interface", flush=True)
         else:
-            # date non spécifiée : dernier taux connu
-            cubes = root.findall(".//Cube[@time]")
-            if not cubes:
-                raise ValueError("Pas de données de taux trouvées")
-            target_cube = cubes[0]
-            target_date = target_cube.attrib["time"]
-        
-        print("[INFO] 🔎 Récupération des taux de conversion :", flush=True)
-        for cube in target_cube.findall("ns:Cube", ns):
-            currency = cube.attrib["currency"]
-            raw_rate = float(cube.attrib["rate"])
-            print(f"  → {currency} = {raw_rate}", flush=True)
-            if raw_rate != 0:
-                rates[currency] = raw_rate
-        rates["EUR"] = 1.0
-
+            t0 = perf_counter()
+            with BaseTaux() as base:
+                synchronise = _completer_base(base, date) if synchroniser else None
+                t1 = perf_counter()
+                rates, target_date = base.taux_au(date)
+            etat = {True: f"{(t1 - t0) * 1000:.0f} ms", False: "évitée (base locale à jour)",
+                    None: "faite en parallèle de la lecture"}[synchronise]
+            print(f"[INFO] ⏱️ Taux BCE : synchronisation {etat}, "
+                  f"recherche {(perf_counter() - t1) * 1000:.1f} ms", flush=True)
+        if not rates:
+            raise ValueError("Base de taux vide" if date is None else f"Aucun taux trouvé avant la date {date}")
+
+        if date and target_date != date:
+            print(f"[INFO] ⚠ Aucun taux pour {date}, substitution par {target_date}", flush=True)
         if required_currencies:
-            missing = required_currencies - rates_found
+            missing = required_currencies - rates.keys()
             if missing:
                 print(f"[WARN] ❌ Aucun taux trouvé pour {sorted(missing)} dans les 60 derniers jours.", flush=True)
                 print(f"[SUGGESTION] ✍️ Veuillez les ajouter manuellement dans l'interface ou en ligne de commande.", flush=True)
 
-
-
-        print(f"[INFO] Taux ECB récupérés au {date}", flush=True)
+        print(f"[INFO] Taux ECB récupérés au {date or target_date}", flush=True)
         for k, v in rates.items():
             print(f"  → {k} = {v}")
         return rates
@@ -150,11 +129,273 @@ def get_ecb_rates(date: str | None = None, required_currencies: set[str] | None
     except Exception as e:
         print(f"[ERROR] Erreur récupération ECB : {e}", flush=True)
         print("[FALLBACK] 🛑 Repli sur taux locaux codés en dur", flush=True)
-        return {
-        "EUR":1.0, "USD":0.93, "GBP":1.15,
-        "EGP":0.03, "CHF":1.04, "AED":0.25, "JPY":0.0062
+        return dict(TAUX_SECOURS)
+
+def get_ecb_index(debut: str, fin: str) -> IndexTaux:
+    """Taux BCE de la base locale entre `debut` − 60 jours et `fin`, pour les jointures par date."""
+    try:
+        with BaseTaux() as base:
+            _completer_base(base, fin)
+            depuis = (datetime.strptime(debut, "%Y-%m-%d") - timedelta(days=FENETRE_JOURS)).strftime("%Y-%m-%d")
+            return base.index(depuis, fin)
+    except Exception as e:
+        print(f"[ERROR] Erreur lecture de la base de taux : {e}", flush=True)
+        return IndexTaux.depuis_lignes([], [], [])
+
+def get_ecb_cube(debut: str, fin: str) -> pd.DataFrame:
+    """Cube mensuel BCE (moyenne, fin de mois, min, max) des mois de `debut` à `fin` (YYYY-MM-DD)."""
+    try:
+        with BaseTaux() as base:
+            _completer_base(base, fin)
+            return base.cube(debut[:7], fin[:7])
+    except Exception as e:
+        print(f"[ERROR] Erreur lecture du cube de taux : {e}", flush=True)
+        return pd.DataFrame(columns=["mois", "devise", *STATISTIQUES_CUBE, "cotations"])
+
+# ------------------------------------------------------------------ lecture des fichiers filiales
+TURNOVER_SHEET = re.compile(r"^TURNOVER($|\s+[A-Z][a-z]{2}\s+\d{1,2}$)", re.I)
+VAR_PATTS  = [r"^CD\s*\+\s*FSD", r"^CD\+FSD", r"^VARIABLE\s*COSTS?"]
+COGS_PATTS = [r"^PRU", r"^COGS"]
+
+# Définir les deux formats stricts
+FORMATS = [
+    ["MONTH", "SIAMP UNIT", "SALE TYPE", "TYPE OF CANAL", "ENSEIGNE", "CUSTOMER NAME", "COMMERCIAL AREA", "SUR FAMILLE", "FAMILLE", "REFERENCE", "PRODUCT NAME", "QUANTITY", "TURNOVER", "CURRENCY", "COUNTRY", "VARIABLE COSTS", "COGS"],
+    ["MONTH", "SIAMP UNIT", "SALE TYPE", "TYPE OF CANAL", "ENSEIGNE", "CUSTOMER NAME", "COMMERCIAL AREA", "SUR FAMILLE", "FAMILLE", "REFERENCE", "PRODUCT NAME", "QUANTITY", "TURNOVER", "CURRENCY", "COUNTRY"]
+]
+
+
+def renommer_colonnes(colonnes) -> dict[str, str]:
+    """Retourne le renommage VARIABLE COSTS / COGS / TURNOVER / CURRENCY / CUSTOMER NAME."""
+    ren: dict[str,str] = {}
+    for c in colonnes:
+        U = c.upper()
+        if any(re.match(p,U) for p in VAR_PATTS):
+            ren[c] = "VARIABLE COSTS"
+        elif any(re.match(p,U) for p in COGS_PATTS):
+            ren[c] = "COGS"
+        elif U=="TURNOVER":
+            ren[c] = "TURNOVER"
+        elif U=="CURRENCY":
+            ren[c] = "CURRENCY"
+        elif U in {"CUSTOMER","CUSTOMER NAME"}:
+            ren[c] = "CUSTOMER NAME"
+    return ren
+
+
+def renommer_entete(colonnes) -> list[str]:
+    """En-têtes nettoyés (strip) puis renommés selon renommer_colonnes."""
+    colonnes = [c.strip() for c in colonnes]
+    ren = renommer_colonnes(colonnes)
+    return [ren.get(c, c) for c in colonnes]
+
+
+def sonder_feuille(entete, filename: str):
+    """
+    Validation stricte sur la seule ligne d'en-tête, avant toute lecture des données.
+    Les colonnes ajoutées à la lecture (NOMFICHIER, FEUILLE, SOURCE) sont prises en compte
+    pour que le détail des rejets reste celui de validate_strict_columns sur la feuille complète.
+    """
+    colonnes = renommer_entete(entete) + ["NOMFICHIER", "FEUILLE", "SOURCE"]
+    return validate_strict_columns(pd.DataFrame(columns=colonnes), filename, FORMATS, return_details=True)
+
+
+def devises_feuille(df: pd.DataFrame) -> set[str]:
+    """Devises distinctes d'une feuille lue, normalisées comme CURRENCY avant le calcul des montants."""
+    if "CURRENCY" not in df.columns:
+        return set()
+    serie = df["CURRENCY"]
+    valeurs = serie.cat.categories if est_categorie(serie) else serie.dropna().unique()
+    return {strip_majuscules(nettoyer_str(v)) for v in valeurs if isinstance(v, str)} - {""}
+
+
+def filtre_periode(mois: str | None, debut: str | None, fin: str | None) -> dict | None:
+    """
+    Prédicats de période appliqués à chaque feuille dès la lecture de MONTH :
+    mois choisis ("2025-01,2025-02") en clés entières, bornes de dates incluses.
+    None si aucun filtre n'est demandé.
+    """
+    if not (mois or debut or fin):
+        return None
+    return {
+        "mois": None if not mois else np.array(
+            [np.datetime64(m.strip(), "M") for m in mois.split(",") if m.strip()]).astype(np.int64),
+        "debut": pd.Timestamp(debut) if debut else None,
+        "fin": pd.Timestamp(fin) + pd.Timedelta(days=1) if fin else None,  # fin incluse
     }
 
+
+def cle_mois(dates: pd.Series) -> np.ndarray:
+    """Clé entière (année − 1970) × 12 + mois − 1 de chaque date ; NaT → plus petit int64."""
+    return dates.to_numpy(dtype="datetime64[ns]").astype("datetime64[M]").astype(np.int64)
+
+
+def masque_periode(dates: pd.Series, filtre: dict) -> np.ndarray:
+    """Lignes dont la date satisfait le filtre (les dates manquantes sont écartées)."""
+    valeurs = dates.to_numpy(dtype="datetime64[ns]")
+    garder = ~np.isnat(valeurs)
+    if filtre["mois"] is not None:
+        garder &= np.isin(cle_mois(dates), filtre["mois"])
+    if filtre["debut"] is not None:
+        garder &= valeurs >= filtre["debut"].to_datetime64()
+    if filtre["fin"] is not None:
+        garder &= valeurs < filtre["fin"].to_datetime64()
+    return garder
+
+
+def estimer_lignes(path: str) -> int | None:
+    """Nombre de lignes des feuilles TURNOVER d'après leur <dimension> (None si inconnu)."""
+    try:
+        lignes = [f["lignes"] for f in lister_feuilles(path, TURNOVER_SHEET.match)]
+    except Exception:
+        return None
+    if any(n is None for n in lignes):
+        return None
+    return sum(lignes)
+
+
+def traiter_fichier(path: str, lecteur: str = "stream", cache: CacheFeuilles | None = None,
+                    entree: dict | None = None, filtre: dict | None = None) -> dict:
+    """
+    Valide les en-têtes des feuilles TURNOVER d'un fichier filiale (sonde), puis lit
+    et renomme les feuilles conformes.
+    Avec l'entrée de manifeste du fichier (ETL_SIAMP_SCAN), la validité déjà connue
+    des feuilles est reprise telle quelle : les feuilles rejetées ne sont pas rouvertes.
+    Exécutable dans un processus séparé : les messages sont renvoyés dans "logs"
+    au lieu d'être imprimés, les feuilles valides dans "dfs" (ordre des feuilles)
+    et les rejets dans "ignores" ; "devises" réunit les devises des feuilles lues.
+    Avec `filtre` (filtre_periode), les lignes hors période sont écartées dès la
+    conversion de MONTH ; leur nombre est renvoyé dans "elaguees".
+    """
+    logs: list[str] = []
+    dfs: list[pd.DataFrame] = []
+    ignores: list[dict] = []
+    devises: set[str] = set()
+    elaguees = 0
+    try:
+        connues = {}
+        if entree and not entree.get("erreur"):
+            connues = {f["nom"]: f for f in entree["feuilles"] if f["turnover"]}
+        with Classeur(path, lecteur, cache) as xls:
+            for sh in filter(TURNOVER_SHEET.match, xls.feuilles):
+                info = connues.get(sh)
+                if info is not None:
+                    colonnes = info["colonnes"]
+                    is_valid, motif = info["valide"], info["motif"]
+                    cols_manquantes, cols_sup = info["colonnes_manquantes"], info["colonnes_sup"]
+                else:
+                    # SONDE : en-têtes seuls, le fichier non conforme est rejeté sans lecture des données
+                    entete = xls.entete(sh)
+                    is_valid, motif, cols_manquantes, cols_sup = sonder_feuille(entete, os.path.basename(path))
+                    colonnes = renommer_entete(entete)
+                if not is_valid:
+                    logs.append("    -> Colonnes: " + ", ".join(colonnes))
+                    ignores.append({
+                        'fichier': os.path.basename(path),
+                        'motif': motif,
+                        'colonnes_manquantes': cols_manquantes,
+                        'colonnes_sup': cols_sup
+                    })
+                    logs.append(f"\n❌ [IGNORÉ] {os.path.basename(path)} : Fichier non conforme, il ne sera pas fusionné.")
+                    if cols_manquantes:
+                        logs.append(f"   → Colonnes manquantes : {cols_manquantes}")
+                    if cols_sup:
+                        logs.append(f"   → Colonnes supplémentaires : {cols_sup}")
+                    continue
+
+                df = xls.lire(sh)
+                if xls.depuis_cache:
+                    logs.append(f"    ⚡ Feuille '{sh}' relue depuis le cache")
+                df.columns = renommer_entete(df.columns)
+
+                logs.append("    -> Colonnes: " + ", ".join(df.columns))
+
+                # log var/cogs
+                for nm in ("VARIABLE COSTS","COGS"):
+                    if nm in df.columns:
+                        n = df[nm].notna().sum()
+                        logs.append(f"       • {nm} détectée: {n} valeurs non-null")
+
+                df["NOMFICHIER"] = os.path.basename(path)
+                df["FEUILLE"]     = sh
+                df["SOURCE"] = f"MENSUEL_{datetime.now().strftime('%Y-%m-%d')}"
+
+                # Conversion explicite de la première colonne (MONTH) en datetime si possible
+                if "MONTH" in df.columns:
+                    try:
+                        df["MONTH"] = pd.to_datetime(df["MONTH"], errors="coerce")
+                        nb_dates = df["MONTH"].notna().sum()
+                        logs.append(f"       📅 Dates valides détectées dans 'MONTH' : {nb_dates}")
+                    except Exception as e:
+                        logs.append(f"       ⚠ Erreur conversion 'MONTH' en date : {e}")
+
+                # ➤ Filtre de période poussé à la lecture : la suite ne traite que les lignes utiles
+                if filtre and "MONTH" in df.columns and pd.api.types.is_datetime64_any_dtype(df["MONTH"]):
+                    garder = masque_periode(df["MONTH"], filtre)
+                    if not garder.all():
+                        df = df[garder].reset_index(drop=True)
+                        elaguees += int((~garder).sum())
+                        logs.append(f"       ✂️ {int((~garder).sum())} ligne(s) hors période écartée(s)")
+
+                dfs.append(typer_feuille(df))
+                devises |= devises_feuille(df)
+
+    except Exception as e:
+        logs.append(f"  [ERROR] {path}: {e}")
+
+    return {"dfs": dfs, "ignores": ignores, "logs": logs, "devises": devises, "elaguees": elaguees}
+
+# ------------------------------------------------------------------ montants en euros
+COLONNES_EURO = ["C.A en €", "VAR Margin", "Margin"]   # format monétaire dans la sortie
+COLONNES_TOTAUX = ["QUANTITY"] + COLONNES_EURO          # totaux par partition (feuille INDEX)
+
+def _colonne_numerique(df: pd.DataFrame, col: str) -> np.ndarray:
+    """Colonne convertie une fois en float64 (texte non numérique → NaN) ; colonne absente → NaN."""
+    if col not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+
+def taux_par_ligne(df: pd.DataFrame, mode: str, manuels: dict[str, float]) -> np.ndarray:
+    """
+    Taux BCE propre à chaque ligne selon `mode` : taux en vigueur à la date MONTH
+    (jointure as-of, « mois ») ou statistique du cube mensuel pour le mois de MONTH.
+    NaN là où le taux unique doit s'appliquer : devises à taux manuel, date manquante,
+    devise non cotée.
+    """
+    debut, fin = (d.strftime("%Y-%m-%d") for d in (df["MONTH"].min(), df["MONTH"].max()))
+    if mode == "mois":
+        taux = get_ecb_index(debut, fin).taux_lignes(df["MONTH"], df["CURRENCY"])
+    else:
+        taux = taux_mensuels_lignes(get_ecb_cube(debut, fin), STATISTIQUE_MODE[mode], df["MONTH"], df["CURRENCY"])
+    if manuels:
+        taux[df["CURRENCY"].isin(list(manuels)).to_numpy()] = np.nan
+    return taux
+
+
+def calculer_montants_euro(df: pd.DataFrame, rates: dict[str, float],
+                           taux_lignes: np.ndarray | None = None) -> pd.DataFrame:
+    """
+    Ajoute "Taux €", "C.A en €", "VAR Margin" et "Margin" en un calcul vectorisé.
+    Comme l'ancien calcul ligne à ligne, un opérande manquant (ou une colonne absente)
+    donne un montant manquant : la propagation des NaN suffit.
+    `taux_lignes` (un taux par ligne, NaN = taux de `rates`) remplace le taux unique par devise.
+    """
+    codes, devises = pd.factorize(df["CURRENCY"])
+    # taux par devise distincte, le dernier élément (NaN) sert aux devises manquantes (code -1)
+    taux_devises = np.array([rates.get(d, np.nan) for d in devises] + [np.nan], dtype=float)
+    taux = taux_devises[codes]
+    if taux_lignes is not None:
+        taux = np.where(np.isnan(taux_lignes), taux, taux_lignes)
+
+    ca = _colonne_numerique(df, "TURNOVER") * taux
+    quantite = _colonne_numerique(df, "QUANTITY")
+    df["Taux €"] = taux
+    df["C.A en €"] = ca
+    df["VAR Margin"] = ca - _colonne_numerique(df, "VARIABLE COSTS") * taux * quantite
+    df["Margin"] = ca - _colonne_numerique(df, "COGS") * taux * quantite
+    return df
+
+
 # ------------------------------------------------------------------ CLI
 def main():
     parser = argparse.ArgumentParser(description="Fusionnez plusieurs fichiers Excel Turnover")
@@ -162,9 +403,27 @@ def main():
     parser.add_argument("--chemin_sortie", required=True)
     parser.add_argument("--taux_manuels",  help="USD=0.93,GBP=1.15", default=None)
     parser.add_argument("--date",          help="YYYY-MM-DD pour historique (premium)", default=None)
+    parser.add_argument("--taux_instantane", default=None, help="Instantané JSON des taux déjà obtenus par le GUI (CacheTaux)")
+    parser.add_argument("--mode_taux", choices=MODES_TAUX, default="date",
+                        help="date : taux unique au --date ; mois : taux BCE en vigueur à la date MONTH de chaque ligne ; "
+                             "moyenne_mois / fin_mois : moyenne mensuelle / taux de fin de mois du mois de MONTH")
     parser.add_argument("--date_debut", help="Date début de la période à filtrer (YYYY-MM-DD)", default=None)
     parser.add_argument("--date_fin",   help="Date fin de la période à filtrer (YYYY-MM-DD)", default=None)
     parser.add_argument("--mois_selectionnes", help="Liste des mois à traiter, séparés par des virgules (ex: 2025-02,2025-03)", default=None)
+    parser.add_argument("--workers", type=int, default=1, help="Nombre de processus pour lire les fichiers en parallèle (1 = séquentiel)")
+    parser.add_argument("--no-cache", dest="no_cache", action="store_true", help="Ne pas utiliser le cache disque des feuilles déjà lues")
+    parser.add_argument("--cache_max_mo", type=float, default=TAILLE_MAX_MO, help="Taille maximale du cache disque (Mo)")
+    parser.add_argument("--manifest", default=None, help="Manifeste JSON produit par ETL_SIAMP_SCAN (schémas et lignes déjà connus)")
+    parser.add_argument("--historique", choices=MODES_HISTORIQUE, default="signaler",
+                        help="Clés déjà consolidées par une exécution précédente : signaler (feuille annexe), "
+                             "remplacer (lignes reprises comme mise à jour, listées sans avertissement) ou aucun (pas d'index)")
+    parser.add_argument("--lecteur", choices=LECTEURS, default="stream", help="Lecteur des feuilles TURNOVER : stream (openpyxl read_only) ou pandas (ExcelFile.parse)")
+    parser.add_argument("--partition", choices=MODES_PARTITION, default="auto",
+                        help="Découpage de la sortie selon MONTH : auto (par année puis par mois, seulement au-delà de "
+                             "la limite de lignes d'Excel), annee, mois ou aucune (une seule feuille)")
+    parser.add_argument("--partition_cible", choices=CIBLES_PARTITION, default="feuilles",
+                        help="Partitions écrites en feuilles du classeur de sortie ou en classeurs séparés "
+                             "(<sortie>_<partition>.xlsx), avec une feuille INDEX dans le classeur de sortie")
 
     args = parser.parse_args()
     # ----------------------------------------- Charger les chemins des fichiers de référence
@@ -182,8 +441,6 @@ def main():
         print("[WARN] ⚠️ Fichier de config 'ref_files.cfg' introuvable. Les colonnes de correspondance ne seront pas alimentées.")
 
 
-    devises_detectées: set[str] = set()
-
     print(f"[DEBUG] 👋 Script lancé avec date = {args.date}", flush=True)
 
     # parse manuels
@@ -210,428 +467,372 @@ def main():
         out += ".xlsx"
     os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
 
-    # patterns
-    TURNOVER_SHEET = re.compile(r"^TURNOVER($|\s+[A-Z][a-z]{2}\s+\d{1,2}$)", re.I)
-    VAR_PATTS  = [r"^CD\s*\+\s*FSD", r"^CD\+FSD", r"^VARIABLE\s*COSTS?"]
-    COGS_PATTS = [r"^PRU", r"^COGS"]
+    cache = None
+    if not args.no_cache:
+        if PARQUET_DISPONIBLE:
+            cache = CacheFeuilles(taille_max_mo=args.cache_max_mo)
+        else:
+            print("[WARN] ⚠️ pyarrow absent : cache des feuilles désactivé.", flush=True)
 
-    all_dfs: list[pd.DataFrame] = []
-    fichiers_ignores = []  # Pour stocker les fichiers ignorés et leurs motifs
     total = len(files)
-    for idx, path in enumerate(files, 1):
-        print(f"[{idx}/{total}] {os.path.basename(path)}", flush=True)
-        try:
-            xls = pd.ExcelFile(path, engine="openpyxl")
-            for sh in filter(TURNOVER_SHEET.match, xls.sheet_names):
-                df = xls.parse(sh, usecols="A:Q")
-                df.columns = [c.strip() for c in df.columns]
-
-                # renommage
-                ren: dict[str,str] = {}
-                for c in df.columns:
-                    U = c.upper()
-                    if any(re.match(p,U) for p in VAR_PATTS):
-                        ren[c] = "VARIABLE COSTS"
-                    elif any(re.match(p,U) for p in COGS_PATTS):
-                        ren[c] = "COGS"
-                    elif U=="TURNOVER":
-                        ren[c] = "TURNOVER"
-                    elif U=="CURRENCY":
-                        ren[c] = "CURRENCY"
-                    elif U in {"CUSTOMER","CUSTOMER NAME"}:
-                        ren[c] = "CUSTOMER NAME"
-                df.rename(columns=ren, inplace=True)
-
-                print("    -> Colonnes:", ", ".join(df.columns), flush=True)
-
-                # log var/cogs
-                for nm in ("VARIABLE COSTS","COGS"):
-                    if nm in df.columns:
-                        n = df[nm].notna().sum()
-                        print(f"       • {nm} détectée: {n} valeurs non-null", flush=True)
-
-                df["NOMFICHIER"] = os.path.basename(path)
-                df["FEUILLE"]     = sh
-                df["SOURCE"] = f"MENSUEL_{datetime.now().strftime('%Y-%m-%d')}"
 
+    # ➤ Poids de chaque fichier dans la progression : lignes TURNOVER annoncées par <dimension>
+    #   (un fichier sans dimension compte pour la moyenne des autres)
+    manifeste = {}
+    if args.manifest:
+        manifeste = lire_manifeste(args.manifest)
+        print(f"[INFO] 📝 Manifeste : {len(manifeste)} fichier(s) déjà scanné(s)", flush=True)
+    entrees = [manifeste.get(os.path.abspath(f)) for f in files]
+    filtre = filtre_periode(args.mois_selectionnes, args.date_debut, args.date_fin)
+    if filtre:
+        print(f"[INFO] 🗓️ Filtre de période appliqué à la lecture : mois {args.mois_selectionnes or '-'}, "
+              f"du {args.date_debut or '-'} au {args.date_fin or '-'}", flush=True)
+    lignes = [
+        sum(fe["lignes"] + 1 for fe in e["feuilles"] if fe["turnover"])
+        if e and not e["erreur"] else estimer_lignes(f)
+        for f, e in zip(files, entrees)
+    ]
+    connues = [n for n in lignes if n is not None]
+    defaut = max(1, sum(connues) // len(connues)) if connues else 1
+    poids = [max(1, n) if n is not None else defaut for n in lignes]
+    poids_total = sum(poids)
+    if connues:
+        print(f"[INFO] 📏 ~{sum(connues)} lignes TURNOVER à lire dans {total} fichier(s)", flush=True)
+    fait = 0
+
+    def publier(idx: int, path: str, res: dict):
+        nonlocal fait
+        fait += poids[idx]
+        print(f"[{idx + 1}/{total}] {os.path.basename(path)}", flush=True)
+        for ligne in res["logs"]:
+            print(ligne, flush=True)
+        print(f"PROGRESS:{int(fait/poids_total*100)}%", flush=True)
+
+    def lecture_en_erreur(path: str, e: Exception) -> dict:
+        return {"dfs": [], "ignores": [], "logs": [f"  [ERROR] {path}: {e}"], "devises": set(), "elaguees": 0}
+
+    cache_taux = CacheTaux.charger(args.taux_instantane) if args.taux_instantane else None
+    colonnes_cle = ["MONTH", "REFERENCE", "CUSTOMER NAME", "QUANTITY"]
 
-                # Conversion explicite de la première colonne (MONTH) en datetime si possible
-                if "MONTH" in df.columns:
-                    try:
-                        df["MONTH"] = pd.to_datetime(df["MONTH"], errors="coerce")
-                        nb_dates = df["MONTH"].notna().sum()
-                        print(f"       📅 Dates valides détectées dans 'MONTH' : {nb_dates}", flush=True)
-                    except Exception as e:
-                        print(f"       ⚠ Erreur conversion 'MONTH' en date : {e}", flush=True)
-
-                # Définir les deux formats stricts
-                FORMATS = [
-                    ["MONTH", "SIAMP UNIT", "SALE TYPE", "TYPE OF CANAL", "ENSEIGNE", "CUSTOMER NAME", "COMMERCIAL AREA", "SUR FAMILLE", "FAMILLE", "REFERENCE", "PRODUCT NAME", "QUANTITY", "TURNOVER", "CURRENCY", "COUNTRY", "VARIABLE COSTS", "COGS"],
-                    ["MONTH", "SIAMP UNIT", "SALE TYPE", "TYPE OF CANAL", "ENSEIGNE", "CUSTOMER NAME", "COMMERCIAL AREA", "SUR FAMILLE", "FAMILLE", "REFERENCE", "PRODUCT NAME", "QUANTITY", "TURNOVER", "CURRENCY", "COUNTRY"]
-                ]
-
-                # VALIDATION STRICTE
-                is_valid, motif, cols_manquantes, cols_sup = validate_strict_columns(df, os.path.basename(path), FORMATS, return_details=True)
-                if is_valid:
-                    all_dfs.append(df)
-                else:
-                    fichiers_ignores.append({
-                        'fichier': os.path.basename(path),
-                        'motif': motif,
-                        'colonnes_manquantes': cols_manquantes,
-                        'colonnes_sup': cols_sup
-                    })
-                    print(f"\n❌ [IGNORÉ] {os.path.basename(path)} : Fichier non conforme, il ne sera pas fusionné.", flush=True)
-                    if cols_manquantes:
-                        print(f"   → Colonnes manquantes : {cols_manquantes}", flush=True)
-                    if cols_sup:
-                        print(f"   → Colonnes supplémentaires : {cols_sup}", flush=True)
+    # ---------------------------- ASSEMBLAGE ----------------------------
+    def assembler(**lectures) -> dict:
+        # ➤ Ordre déterministe (ordre des fichiers puis des feuilles) pour drop_duplicates(keep="last")
+        resultats = [lectures[nom] for nom in noms_lecture]
+        assemblage = {"dfs": [], "ignores": [], "devises": set()}
+        for res in resultats:
+            assemblage["dfs"].extend(res["dfs"])
+            assemblage["ignores"].extend(res["ignores"])
+            assemblage["devises"] |= res["devises"]
+
+        elaguees = {os.path.basename(f): r["elaguees"] for f, r in zip(files, resultats) if r["elaguees"]}
+        if elaguees:
+            print(f"[INFO] ✂️ {sum(elaguees.values())} ligne(s) hors période écartée(s) à la lecture : "
+                  + ", ".join(f"{nom} {n}" for nom, n in elaguees.items()), flush=True)
+
+        if not assemblage["dfs"]:
+            print("\n❌ Aucun fichier valide trouvé. Arrêt du script.", flush=True)
+            sys.exit("Aucune feuille valide trouvée.")
+
+        # ➕ Convertir en majuscules (important)
+        assemblage["devises"] = {d.upper() for d in assemblage["devises"]}
+        return assemblage
+
+    # ---------------------------- TAUX ----------------------------
+    def calculer_taux(assemblage: dict, **_) -> dict:
+        # ✅ Maintenant que les devises sont détectées, on appelle la fonction
+        #    (uniquement pour celles que les taux manuels ne couvrent pas)
+        devises_detectées = assemblage["devises"]
+        devises_bce = devises_detectées - manu.keys() - {"EUR"}
+        if devises_detectées and not devises_bce:
+            print(f"[INFO] ⏭️ Devises {sorted(devises_detectées)} couvertes par les taux manuels : BCE non consultée", flush=True)
+            rates = {"EUR": 1.0}
+        else:
+            rates = get_ecb_rates(args.date, required_currencies=devises_bce, cache=cache_taux,
+                                  synchroniser=not synchro_bce)
+        rates.update(manu)
+        return {"rates": rates, "devises_bce": devises_bce}
+
+    # ---------------------------- CONSOLIDATION ----------------------------
+    def consolider(assemblage: dict) -> dict:
+        all_dfs = assemblage.pop("dfs")  # les feuilles ne vivent plus qu'ici : libérées après la concaténation
+        unifier_categories(all_dfs)
+        fusion = pd.concat(all_dfs, ignore_index=True)
+        del all_dfs
+        print(f"[INFO] 🗜️ Mémoire fusion : {memoire_mo(fusion):.1f} Mo "
+              f"(au lieu de {memoire_sans_categories_mo(fusion):.1f} Mo sans catégories)", flush=True)
+
+        # ➤ Nettoyage des chaînes de caractères : strip, upper, suppression des caractères invisibles
+        #   (colonnes texte et catégorielles, une évaluation par valeur distincte)
+        fusion = normaliser(fusion, nettoyer_str)
+
+
+        # ➤ Supprimer les doublons métier basés sur les colonnes clés
+        nb_avant = fusion.shape[0]
+        fusion, journal_cle = dedoublonner(fusion, colonnes_cle, garder="last", etape="clé métier", detail=colonnes_cle)
+        nb_apres = fusion.shape[0]
+        print(f"[INFO] 🧹 {nb_avant - nb_apres} doublon(s) supprimé(s) après nettoyage logique", flush=True)
+        return {"fusion": fusion, "journal": journal_cle}
+
+    # ---------------------------- CORRESPONDANCES ----------------------------
+    def completer_correspondances(consolidation: dict, references) -> dict:
+        refs = references
+        if refs.sur_famille is not None:
+            print(f"[INFO] ✅ Table chargé ({len(refs.sur_famille)} référence(s), {len(refs.enseigne)} enseigne(s)).")
+        fusion = consolidation.pop("fusion")
+
+        # ➤ Colonnes de correspondance par recherche indexée (pas de merge : le frame n'est pas recopié)
+        fusion.index = pd.RangeIndex(len(fusion))
+        correspondances = []
+
+        # ---------------------------- ZONE AFFECTATION ----------------------------
+        try:
+            if refs.zones is None:
+                raise ValueError("ZONE AFFECTATION non chargée")
+            fusion["COUNTRY"] = par_valeurs_uniques(en_objet(fusion["COUNTRY"]), majuscules)
 
+            fusion, rapport = enrichir(fusion, "COUNTRY", refs.zones, "PAYS", "COMMERCIAL AREA")
+            correspondances.append(rapport)
+            print(f"[INFO] ✅ Fusion COMMERCIAL AREA effectuée.")
         except Exception as e:
-            print(f"  [ERROR] {path}: {e}", flush=True)
-
-        sleep(0.05)
-        print(f"PROGRESS:{int(idx/total*100)}%", flush=True)
-
-    if not all_dfs:
-        print("\n❌ Aucun fichier valide trouvé. Arrêt du script.", flush=True)
-        sys.exit("Aucune feuille valide trouvée.")
-
-    # ➕ Convertir en majuscules (important)
-    devises_detectées = {d.upper() for d in devises_detectées}
+            print(f"[ERROR] ❌ Erreur fusion ZONE AFFECTATION : {e}")
+            traceback.print_exc()
 
-    # ✅ Maintenant que les devises sont détectées, on appelle la fonction
-    rates = get_ecb_rates(args.date, required_currencies=devises_detectées)
-    rates.update(manu)
-
-    zone_affectation_df = None
-    table_df = None
-
-    if table_path and os.path.exists(table_path):
+        # ---------------------------- SUR FAMILLE ----------------------------
         try:
-            table_df = pd.read_excel(table_path, sheet_name="table", engine="openpyxl")
-            print(f"[INFO] ✅ Table chargé ({table_df.shape[0]} lignes).")
-        except Exception as e:
-            print(f"[ERROR] ❌ Erreur chargement table : {e}")
-
-
-    fusion = pd.concat(all_dfs, ignore_index=True)
-
-    # ➤ Nettoyage des chaînes de caractères : strip, upper, suppression des caractères invisibles
-    def nettoyer_str(s):
-        if pd.isna(s):
-            return None
-        if isinstance(s, str):
-            s = s.strip().upper()
-            s = re.sub(r'[^\x20-\x7E\u00A0-\uFFFF]', '', s)  # supprime caractères invisibles
-            return s
-        return s
-
-    # Appliquer à toutes les colonnes de type objet (texte)
-    for col in fusion.select_dtypes(include="object").columns:
-        fusion[col] = fusion[col].apply(nettoyer_str)
-
-
-    # ➤ Supprimer les doublons métier basés sur les colonnes clés
-    colonnes_cle = ["MONTH", "REFERENCE", "CUSTOMER NAME", "QUANTITY"]
-    nb_avant = fusion.shape[0]
-    fusion = fusion.drop_duplicates(subset=colonnes_cle, keep="last")
-    nb_apres = fusion.shape[0]
-    print(f"[INFO] 🧹 {nb_avant - nb_apres} doublon(s) supprimé(s) après nettoyage logique", flush=True)
-
-
-    print(f"[DEBUG] 📌 Rates récupérés : {rates}", flush=True)
-    currencies_in_file = set(fusion["CURRENCY"].dropna().unique())
-    print(f"[DEBUG] 📌 Devises trouvées dans les fichiers : {currencies_in_file}", flush=True)
-    missing_currencies = currencies_in_file - set(rates.keys())
-    if missing_currencies:
-        print(f"[ERROR] ❌ Aucune correspondance de taux pour les devises suivantes : {missing_currencies}", flush=True)
-        print("         ➡️ Ajoutez-les dans les taux manuels ou vérifiez les données sources.", flush=True)
-        sys.exit(1)
-    else:
-        print("[INFO] ✅ Tous les taux de conversion sont disponibles pour les devises présentes.", flush=True)
+            # Table compilée : REFERENCE et Sur-famille déjà nettoyées, doublons masqués supprimés
+            if refs.sur_famille is None:
+                raise ValueError("table de référence non chargée")
+            print(f"[INFO] 🔎 Table nettoyée : {refs.doublons_reference} doublon(s) masqué(s) supprimé(s) sur REFERENCE", flush=True)
 
+            # Nettoyage de REFERENCE côté fusion
+            fusion["REFERENCE"] = par_valeurs_uniques(fusion["REFERENCE"], majuscules)
 
-    # ---------------------------- ZONE AFFECTATION ----------------------------
-    try:
-        zone_affectation_df = pd.read_excel(
-            zone_affectation_path,
-            sheet_name="ZONE AFFECTATION",
-            usecols="A,E",  # A = PAYS, E = Zone commerciale
-            engine="openpyxl"
-        )
-        zone_affectation_df.columns = ["PAYS", "COMMERCIAL AREA"]
-        fusion["COUNTRY"] = fusion["COUNTRY"].astype(str).str.strip().str.upper()
-        zone_affectation_df["PAYS"] = zone_affectation_df["PAYS"].astype(str).str.strip().str.upper()
-        
-        fusion = fusion.merge(zone_affectation_df, how="left", left_on="COUNTRY", right_on="PAYS")
-        fusion.drop(columns=["PAYS"], inplace=True)
-        if "COMMERCIAL AREA_x" in fusion.columns and "COMMERCIAL AREA_y" in fusion.columns:
-            fusion.drop(columns=["COMMERCIAL AREA_x"], inplace=True)
-            fusion.rename(columns={"COMMERCIAL AREA_y": "COMMERCIAL AREA"}, inplace=True)
-        elif "COMMERCIAL AREA_y" in fusion.columns:
-            fusion.rename(columns={"COMMERCIAL AREA_y": "COMMERCIAL AREA"}, inplace=True)
-        print(f"[INFO] ✅ Fusion COMMERCIAL AREA effectuée.")
-    except Exception as e:
-        print(f"[ERROR] ❌ Erreur fusion ZONE AFFECTATION : {e}")
-        traceback.print_exc()
-
-    # ---------------------------- SUR FAMILLE ----------------------------
-    try:
-        # Nettoyage préalable des colonnes REFERENCE et Sur-famille dans table
-        table_df.iloc[:, 14] = table_df.iloc[:, 14].astype(str).str.strip().str.upper()
-        table_df.iloc[:, 16] = table_df.iloc[:, 16].astype(str).str.strip().str.upper()
-
-        # Supprimer les doublons masqués sur REFERENCE
-        before = table_df.shape[0]
-        table_df = table_df.drop_duplicates(subset=table_df.columns[14], keep="last")
-        after = table_df.shape[0]
-        print(f"[INFO] 🔎 Table nettoyée : {before - after} doublon(s) masqué(s) supprimé(s) sur REFERENCE", flush=True)
-
-        # Nettoyage de REFERENCE côté fusion
-        fusion["REFERENCE"] = fusion["REFERENCE"].astype(str).str.strip().str.upper()
-
-        # Fusionner proprement avec REFERENCE unique
-        fusion = fusion.merge(
-            table_df[[table_df.columns[14], table_df.columns[16]]].rename(columns={
-                table_df.columns[14]: "REFERENCE",
-                table_df.columns[16]: "Sur-famille"
-            }),
-            how="left",
-            on="REFERENCE"
-        )
-
-        print("[INFO] ✅ Colonne 'Sur famille' fusionnée et 'SUR FAMILLE' consolidée.")
-
-        # Nettoyage de tous les caractères invisibles restants
-        def nettoyer_cellules(df):
-            return df.applymap(
-                lambda x: (
-                    re.sub(r'[^\x09\x0A\x0D\x20-\x7E\u00A0-\uFFFF]', '', str(x))
-                    if isinstance(x, str) else x
-                )
-            )
-        fusion = nettoyer_cellules(fusion)
-
-    except Exception as e:
-        print(f"[ERROR] ❌ Erreur fusion SUR FAMILLE : {e}")
-        traceback.print_exc()
-
-        
-        def nettoyer_cellules(df):
-            return df.applymap(
-                lambda x: (
-                    re.sub(r'[^\x09\x0A\x0D\x20-\x7E\u00A0-\uFFFF]', '', str(x))
-                    if isinstance(x, str) else x
-                )
-            )
-        fusion = nettoyer_cellules(fusion)
+            # Recherche sur REFERENCE unique
+            fusion, rapport = enrichir(fusion, "REFERENCE", refs.sur_famille, "REFERENCE", "Sur-famille")
+            correspondances.append(rapport)
 
-    except Exception as e:
-        print(f"[ERROR] ❌ Erreur fusion SUR FAMILLE : {e}")
-        traceback.print_exc()
-
-
-    # ---------------------------- ENSEIGNE RET ----------------------------
-    try:
-        # Nettoyage et normalisation dans fusion
-        fusion["ENSEIGNE"] = fusion["ENSEIGNE"].fillna("").astype(str).str.strip().str.upper()
-        fusion["CUSTOMER NAME"] = fusion["CUSTOMER NAME"].fillna("").astype(str).str.strip().str.upper()
-        fusion["concat_key"] = fusion["ENSEIGNE"] + fusion["CUSTOMER NAME"]
-
-        # Nettoyage dans table
-        table_df.iloc[:, 21] = table_df.iloc[:, 21].astype(str).str.strip().str.upper()  # colonne V
-        table_df.iloc[:, 22] = table_df.iloc[:, 22].astype(str).str.strip().str.upper()  # colonne W
-        table_df["concat_key"] = table_df.iloc[:, 21]  # V déjà nettoyée
-
-        # Suppression des doublons sur concat_key
-        before = table_df.shape[0]
-        table_df = table_df.drop_duplicates(subset="concat_key", keep="last")
-        after = table_df.shape[0]
-        print(f"[INFO] 🔎 Table nettoyée : {before - after} doublon(s) masqué(s) supprimé(s) sur concat_key (ENSEIGNE + CUSTOMER NAME)", flush=True)
-
-        # Merge
-        fusion = fusion.merge(
-            table_df[["concat_key", table_df.columns[22]]].rename(columns={table_df.columns[22]: "Enseigne ret"}),  # colonne W
-            how="left",
-            on="concat_key"
-        )
-        fusion.drop(columns=["concat_key"], inplace=True)
-        print(f"[INFO] ✅ Fusion Enseigne ret effectuée.")
-
-    except Exception as e:
-        print(f"[ERROR] ❌ Erreur fusion Enseigne ret : {e}")
-        traceback.print_exc()
-
-
-    # Supprimer la colonne 'ENSEIGNE' car elle n'est pas utile (copie de CUSTOMER NAME)
-    if "ENSEIGNE" in fusion.columns:
-        fusion.drop(columns=["ENSEIGNE"], inplace=True)
-        print(f"[INFO] 🗑️ Colonne 'ENSEIGNE' supprimée (inutile car remplacée par 'Enseigne ret').")
+            print("[INFO] ✅ Colonne 'Sur famille' fusionnée et 'SUR FAMILLE' consolidée.")
 
+            # Nettoyage de tous les caractères invisibles restants
+            fusion = normaliser(fusion, nettoyer_invisibles)
 
+        except Exception as e:
+            print(f"[ERROR] ❌ Erreur fusion SUR FAMILLE : {e}")
+            traceback.print_exc()
+            fusion = normaliser(fusion, nettoyer_invisibles)
 
+        except Exception as e:
+            print(f"[ERROR] ❌ Erreur fusion SUR FAMILLE : {e}")
+            traceback.print_exc()
 
 
-    # 🔍 Extraire les dates uniques de la colonne "MONTH"
-    if "MONTH" in fusion.columns:
+        # ---------------------------- ENSEIGNE RET ----------------------------
         try:
-            fusion["MONTH"] = pd.to_datetime(fusion["MONTH"], errors="coerce")
-            dates_disponibles = sorted(fusion["MONTH"].dropna().dt.strftime("%Y-%m-%d").unique())
+            # Nettoyage et normalisation dans fusion
+            fusion["ENSEIGNE"] = par_valeurs_uniques(fusion["ENSEIGNE"], majuscules_sans_vides)
+            fusion["CUSTOMER NAME"] = par_valeurs_uniques(fusion["CUSTOMER NAME"], majuscules_sans_vides)
+            fusion["concat_key"] = fusion["ENSEIGNE"] + fusion["CUSTOMER NAME"]
+
+            # Table compilée : colonnes V (clé) et W (Enseigne ret) nettoyées, doublons supprimés
+            if refs.enseigne is None:
+                raise ValueError("table de référence non chargée")
+            print(f"[INFO] 🔎 Table nettoyée : {refs.doublons_enseigne} doublon(s) masqué(s) supprimé(s) sur concat_key (ENSEIGNE + CUSTOMER NAME)", flush=True)
+
+            # Recherche sur concat_key
+            fusion, rapport = enrichir(fusion, "concat_key", refs.enseigne, "concat_key", "Enseigne ret")
+            correspondances.append(rapport)
+            fusion.drop(columns=["concat_key"], inplace=True)
+            print(f"[INFO] ✅ Fusion Enseigne ret effectuée.")
+
         except Exception as e:
-            print(f"[ERROR] Impossible de convertir les dates : {e}")
-            dates_disponibles = []
-    else:
-        print("[WARN] ❌ Aucune colonne 'MONTH' trouvée.")
-        dates_disponibles = []
-
-    # 📋 Afficher les dates disponibles pour que l'utilisateur les choisisse
-    if dates_disponibles:
-        print(f"\n🗓️ Dates détectées dans les fichiers :\n" + "\n".join(f"  • {d}" for d in dates_disponibles))
-        
-        if args.mois_selectionnes:
-            mois_choisis = args.mois_selectionnes.split(",")
-            print(f"\n✅ Mois choisis via l'interface : {mois_choisis}")
-            fusion = fusion[fusion["MONTH"].dt.to_period("M").astype(str).isin(mois_choisis)]
+            print(f"[ERROR] ❌ Erreur fusion Enseigne ret : {e}")
+            traceback.print_exc()
+
+        for rapport in correspondances:
+            afficher_rapport(rapport)
+
+
+        # Supprimer la colonne 'ENSEIGNE' car elle n'est pas utile (copie de CUSTOMER NAME)
+        if "ENSEIGNE" in fusion.columns:
+            fusion.drop(columns=["ENSEIGNE"], inplace=True)
+            print(f"[INFO] 🗑️ Colonne 'ENSEIGNE' supprimée (inutile car remplacée par 'Enseigne ret').")
+        return {"fusion": fusion}
+
+    # ---------------------------- MONTANTS ----------------------------
+    def calculer_montants(correspondances: dict, taux: dict, assemblage: dict) -> dict:
+        fusion = correspondances.pop("fusion")
+        rates, devises_bce, devises_detectées = taux["rates"], taux["devises_bce"], assemblage["devises"]
+
+        print(f"[DEBUG] 📌 Rates récupérés : {rates}", flush=True)
+        currencies_in_file = set(fusion["CURRENCY"].dropna().unique())
+        print(f"[DEBUG] 📌 Devises trouvées dans les fichiers : {currencies_in_file}", flush=True)
+        missing_currencies = currencies_in_file - set(rates.keys())
+        if missing_currencies:
+            print(f"[ERROR] ❌ Aucune correspondance de taux pour les devises suivantes : {missing_currencies}", flush=True)
+            print("         ➡️ Ajoutez-les dans les taux manuels ou vérifiez les données sources.", flush=True)
+            sys.exit(1)
         else:
-            if os.environ.get("FROM_GUI") == "1":
-                print("[ERROR] ❌ Aucun mois sélectionné et interaction impossible (lancé depuis GUI). Merci de sélectionner les mois dans l'interface.")
-                sys.exit(1)
-            else:
-                print("\n⏳ Entrez les dates à inclure séparées par une virgule (ex: 2025-01-01,2025-01-15) :")
-                user_input = input(">>> ").strip()
-                dates_choisies = [d.strip() for d in user_input.split(",") if d.strip() in dates_disponibles]
-                print(f"\n✅ Dates retenues : {dates_choisies}\n")
-                fusion = fusion[fusion["MONTH"].dt.strftime("%Y-%m-%d").isin(dates_choisies)]
+            print("[INFO] ✅ Tous les taux de conversion sont disponibles pour les devises présentes.", flush=True)
 
-    else:
-        print("[WARN] ❌ Aucune date valide détectée, aucun filtre appliqué.")
+        # 🔍 Extraire les dates uniques de la colonne "MONTH"
+        if "MONTH" in fusion.columns:
+            try:
+                fusion["MONTH"] = pd.to_datetime(fusion["MONTH"], errors="coerce")
+                dates_disponibles = sorted(fusion["MONTH"].dropna().dt.strftime("%Y-%m-%d").unique())
+            except Exception as e:
+                print(f"[ERROR] Impossible de convertir les dates : {e}")
+                dates_disponibles = []
+        else:
+            print("[WARN] ❌ Aucune colonne 'MONTH' trouvée.")
+            dates_disponibles = []
 
+        # 📋 Afficher les dates disponibles pour que l'utilisateur les choisisse
+        if dates_disponibles:
+            print(f"\n🗓️ Dates détectées dans les fichiers :\n" + "\n".join(f"  • {d}" for d in dates_disponibles))
 
-    fusion["CURRENCY"] = fusion["CURRENCY"].str.strip().str.upper()
-    fusion["Taux €"] = fusion["CURRENCY"].map(rates)
+            if args.mois_selectionnes:
+                mois_choisis = args.mois_selectionnes.split(",")
+                print(f"\n✅ Mois choisis via l'interface : {mois_choisis}")
+                fusion = fusion[masque_periode(fusion["MONTH"], filtre_periode(args.mois_selectionnes, None, None))]
+            else:
+                if os.environ.get("FROM_GUI") == "1":
+                    print("[ERROR] ❌ Aucun mois sélectionné et interaction impossible (lancé depuis GUI). Merci de sélectionner les mois dans l'interface.")
+                    sys.exit(1)
+                else:
+                    print("\n⏳ Entrez les dates à inclure séparées par une virgule (ex: 2025-01-01,2025-01-15) :")
+                    user_input = input(">>> ").strip()
+                    dates_choisies = [d.strip() for d in user_input.split(",") if d.strip() in dates_disponibles]
+                    print(f"\n✅ Dates retenues : {dates_choisies}\n")
+                    fusion = fusion[fusion["MONTH"].dt.strftime("%Y-%m-%d").isin(dates_choisies)]
 
-    fusion["C.A en €"] = fusion.apply(
-        lambda row: row["TURNOVER"] * row["Taux €"]
-        if pd.notnull(row.get("TURNOVER")) and pd.notnull(row.get("Taux €"))
-        else None,
-        axis=1
-    )
+        else:
+            print("[WARN] ❌ Aucune date valide détectée, aucun filtre appliqué.")
 
-    # ➕ Calcul des marges
-    fusion["VAR Margin"] = fusion.apply(
-        lambda row: row["C.A en €"] - (row["VARIABLE COSTS"] * row["Taux €"] * row["QUANTITY"])
-        if pd.notnull(row.get("C.A en €")) and pd.notnull(row.get("VARIABLE COSTS")) and pd.notnull(row.get("Taux €")) and pd.notnull(row.get("QUANTITY"))
-        else None,
-        axis=1
-    )
 
-    fusion["Margin"] = fusion.apply(
-        lambda row: row["C.A en €"] - (row["COGS"] * row["Taux €"] * row["QUANTITY"])
-        if pd.notnull(row.get("C.A en €")) and pd.notnull(row.get("COGS")) and pd.notnull(row.get("Taux €")) and pd.notnull(row.get("QUANTITY"))
-        else None,
-        axis=1
-    )
+        fusion["CURRENCY"] = par_valeurs_uniques(fusion["CURRENCY"], strip_majuscules)
 
+        # ➕ Taux, C.A en € et marges (calcul vectorisé)
+        taux_lignes = None
+        if (args.mode_taux != "date" and devises_bce and "MONTH" in fusion.columns
+                and pd.api.types.is_datetime64_any_dtype(fusion["MONTH"]) and fusion["MONTH"].notna().any()):
+            taux_lignes = taux_par_ligne(fusion, args.mode_taux, manu)
+            au_mois = int(np.isfinite(taux_lignes).sum())
+            print(f"[INFO] 📅 Taux « {args.mode_taux} » : {au_mois} ligne(s) au taux BCE de leur mois, "
+                  f"{len(fusion) - au_mois} au taux unique", flush=True)
+        fusion = calculer_montants_euro(fusion, rates, taux_lignes)
 
 
-    dev_non_gérées = devises_detectées - rates.keys()
 
-    print(f"[INFO] 🏦 Devises détectées dans les fichiers : {sorted(devises_detectées)}", flush=True)
-    print(f"[INFO] ✅ Taux disponibles ECB : {sorted(rates.keys())}", flush=True)
+        dev_non_gérées = devises_detectées - rates.keys()
 
-    if dev_non_gérées:
-        print(f"[WARN] ⚠ Les devises suivantes n'ont pas de taux ECB : {sorted(dev_non_gérées)}", flush=True)
-    else:
-        print(f"[INFO] 🎉 Tous les taux de devises sont disponibles 🎯", flush=True)
+        print(f"[INFO] 🏦 Devises détectées dans les fichiers : {sorted(devises_detectées)}", flush=True)
+        print(f"[INFO] ✅ Taux disponibles ECB : {sorted(rates.keys())}", flush=True)
 
+        if dev_non_gérées:
+            print(f"[WARN] ⚠ Les devises suivantes n'ont pas de taux ECB : {sorted(dev_non_gérées)}", flush=True)
+        else:
+            print(f"[INFO] 🎉 Tous les taux de devises sont disponibles 🎯", flush=True)
 
-    ORDER = [
-    "MONTH", "SIAMP UNIT", "SALE TYPE", "TYPE OF CANAL", "CUSTOMER NAME",
-    "COMMERCIAL AREA", "SUR FAMILLE", "FAMILLE", "REFERENCE", "PRODUCT NAME",
-    "QUANTITY", "TURNOVER", "CURRENCY", "COUNTRY", "C.A en €",
-    "VARIABLE COSTS", "COGS", "VAR Margin", "Margin",
-    "NOMFICHIER", "FEUILLE", "Enseigne ret", "Sur famille"
-]
 
+        ORDER = [
+        "MONTH", "SIAMP UNIT", "SALE TYPE", "TYPE OF CANAL", "CUSTOMER NAME",
+        "COMMERCIAL AREA", "SUR FAMILLE", "FAMILLE", "REFERENCE", "PRODUCT NAME",
+        "QUANTITY", "TURNOVER", "CURRENCY", "COUNTRY", "C.A en €",
+        "VARIABLE COSTS", "COGS", "VAR Margin", "Margin",
+        "NOMFICHIER", "FEUILLE", "Enseigne ret", "Sur famille"
+    ]
 
-    if fusion.empty:
-        print("[ERROR] ❌ Aucune donnée après le filtrage, arrêt du script.", flush=True)
-        sys.exit(1)
 
-    fusion = fusion[[c for c in ORDER if c in fusion.columns]
-                    + [c for c in fusion.columns if c not in ORDER]]
-    
-    before = fusion.shape[0]
+        if fusion.empty:
+            print("[ERROR] ❌ Aucune donnée après le filtrage, arrêt du script.", flush=True)
+            sys.exit(1)
 
-    # ➤ Nettoyage global des chaînes : suppression espaces, mise en majuscule, suppression caractères invisibles
-    def nettoyer_str(s):
-        if pd.isna(s):
-            return None
-        if isinstance(s, str):
-            s = s.strip().upper()
-            s = re.sub(r'[^\x20-\x7E\u00A0-\uFFFF]', '', s)  # supprime caractères invisibles
-            return s
-        return s
+        fusion = fusion[[c for c in ORDER if c in fusion.columns]
+                        + [c for c in fusion.columns if c not in ORDER]]
+        return {"fusion": fusion}
 
-    # Appliquer le nettoyage sur toutes les colonnes objet
-    for col in fusion.select_dtypes(include="object").columns:
-        fusion[col] = fusion[col].apply(nettoyer_str)
+    # ---------------------------- ÉCRITURE ----------------------------
+    def ecrire_sortie(montants: dict, consolidation: dict, assemblage: dict) -> str:
+        fusion = montants.pop("fusion")
+        fichiers_ignores = assemblage["ignores"]
 
-    fusion.drop_duplicates(inplace=True)
-    after = fusion.shape[0]
-    print(f"[INFO] 🧹 Suppression de {before - after} doublon(s) exact(s) après fusion", flush=True)
+        before = fusion.shape[0]
 
-    fusion.to_excel(out, index=False)
-    print(f"[DEBUG] 📄 Fichier Excel sauvegardé : {out}", flush=True)
-    print(f"[DEBUG] 📏 Shape du DataFrame fusionné : {fusion.shape}", flush=True)
+        # ➤ Nettoyage global des chaînes : suppression espaces, mise en majuscule, suppression caractères invisibles
+        fusion = normaliser(fusion, nettoyer_str)
 
-    # mise en forme Excel
-    print("[DEBUG] 🟡 Début de la mise en forme Excel...", flush=True)
-    try:
-        wb = load_workbook(out)
-        ws = wb.active
-
-        print(f"[DEBUG] 📊 Workbook chargé : {out}", flush=True)
-        print(f"[DEBUG] Nombre de lignes : {ws.max_row}, Nombre de colonnes : {ws.max_column}", flush=True)
-
-        if ws.max_row > 1 and ws.max_column > 0:
-            last_col_letter = get_column_letter(ws.max_column)
-            last_row = ws.max_row
-            table_range = f"A1:{last_col_letter}{last_row}"
-            print(f"[DEBUG] 🖋️ Définition de la table FusionTable sur la plage : {table_range}", flush=True)
-
-            table = Table(displayName="FusionTable", ref=table_range)
-            table.tableStyleInfo = TableStyleInfo(
-                name="TableStyleMedium9",
-                showFirstColumn=False,
-                showLastColumn=False,
-                showRowStripes=True,
-                showColumnStripes=False
-            )
-            
-            # ─── Videz d'abord toute table existante ───────────────────────
-            ws._tables.clear()
-
-            # ─── Ajout de la nouvelle table ───────────────────────────────
-            ws.add_table(table)
-            print("[DEBUG] ✅ Nouvelle table 'FusionTable' ajoutée avec succès", flush=True)
-
-
-            # ➕ Formatage des colonnes €
-            EURO_COLUMNS = {"C.A en €", "VAR Margin", "Margin"}
-            print("[DEBUG] 🎯 Formatage des colonnes €...", flush=True)
-            for col_idx in range(1, ws.max_column + 1):
-                header = ws.cell(row=1, column=col_idx).value
-                if header in EURO_COLUMNS:
-                    for row_idx in range(2, last_row + 1):
-                        cell = ws.cell(row=row_idx, column=col_idx)
-                        cell.number_format = u"#,##0.00\u00a0€"
-            print("[DEBUG] ✅ Formatage des colonnes € terminé", flush=True)
-        else:
-            print("[WARN] ⚠️ Impossible d'ajouter la table : pas assez de données (0 colonne ou 1 ligne).", flush=True)
+        fusion, journal_lignes = dedoublonner(fusion, garder="first", etape="ligne entière", detail=colonnes_cle)
+        after = fusion.shape[0]
+        print(f"[INFO] 🧹 Suppression de {before - after} doublon(s) exact(s) après fusion", flush=True)
 
-        wb.save(out)
+        # ➤ Clés métier déjà consolidées par une exécution précédente (index persistant des empreintes)
+        historique, cles_hist, deja = None, None, pd.DataFrame()
+        if args.historique != "aucun":
+            try:
+                historique = IndexHistorique()
+                cles_hist = cles_historique(fusion, colonnes_cle)
+                precedentes = historique.chevauchements(cles_hist, out)
+                if precedentes.any():
+                    infos = historique.executions(np.unique(precedentes[precedentes > 0]))
+                    deja = rapport_chevauchements(fusion, precedentes, infos, colonnes_cle)
+                    if args.historique == "remplacer":
+                        print(f"[INFO] ♻️ {len(deja)} ligne(s) remplacent celles d'une consolidation précédente :", flush=True)
+                    else:
+                        print(f"[WARN] ⚠️ {len(deja)} ligne(s) déjà consolidée(s) par une exécution précédente :", flush=True)
+                    resume = deja.groupby(["SORTIE PRÉCÉDENTE", "CONSOLIDÉE LE"], sort=False).size()
+                    for (sortie, quand), n in resume.items():
+                        print(f"   - {n} ligne(s) dans {sortie} (le {quand})", flush=True)
+                else:
+                    print(f"[INFO] 🗂️ Aucune clé déjà consolidée ({len(historique)} clé(s) dans l'index)", flush=True)
+            except sqlite3.Error as e:
+                print(f"[WARN] ⚠️ Index historique indisponible ({e}) : contrôle ignoré", flush=True)
+                historique = None
+
+        # ➤ Écriture en un seul passage (openpyxl write_only) : en-tête, formats € par colonne et
+        #   FusionTable posés au fil de l'écriture, puis feuilles annexes (doublons écartés avec
+        #   leur origine fichier/feuille, lignes déjà consolidées). Au-delà de la limite d'Excel
+        #   (ou sur --partition) : une feuille / un classeur par année ou par mois + feuille INDEX
+        journaux = [j for j in (consolidation["journal"], journal_lignes) if not j.empty]
+        journal = pd.concat(journaux, ignore_index=True) if len(journaux) > 1 else next(iter(journaux), journal_lignes)
+        t_ecriture = perf_counter()
+        try:
+            classeur = classeur_sortie()
+            formats = {c: FORMAT_EURO for c in COLONNES_EURO}
+            partitions = partitionner(fusion["MONTH"], args.partition)
+            if partitions:
+                ecrire_partitions(classeur, fusion, partitions, out, args.partition_cible, formats=formats,
+                                  table="FusionTable", totaux=COLONNES_TOTAUX)
+            else:
+                ecrire_feuille(classeur, fusion, "Sheet1", formats=formats, table="FusionTable")
+            ecrire_journal(classeur, journal)
+            ecrire_journal(classeur, deja, FEUILLE_CHEVAUCHEMENTS)
+            classeur.save(out)
+        except Exception as e:
+            print(f"[ERROR] ❌ Une erreur s'est produite pendant l'écriture Excel : {e}", flush=True)
+            sys.exit(1)
+        if partitions:
+            lieu = "classeur(s) séparé(s)" if args.partition_cible == "classeurs" else "feuille(s)"
+            print(f"[INFO] 🗂️ Sortie partitionnée en {len(partitions)} {lieu}, index dans la feuille « {FEUILLE_INDEX} » :",
+                  flush=True)
+            for etiquette, positions in partitions:
+                print(f"   - {etiquette} : {len(positions)} ligne(s)", flush=True)
+        if not journal.empty:
+            print(f"[INFO] 📋 {len(journal)} doublon(s) listé(s) dans la feuille « {FEUILLE_DOUBLONS} »", flush=True)
+        if not deja.empty:
+            print(f"[INFO] 📋 {len(deja)} ligne(s) listée(s) dans la feuille « {FEUILLE_CHEVAUCHEMENTS} »", flush=True)
+        print(f"[DEBUG] 📄 Fichier Excel sauvegardé : {out} "
+              f"(table FusionTable et formats € compris, {perf_counter() - t_ecriture:.1f} s)", flush=True)
+        print(f"[DEBUG] 📏 Shape du DataFrame fusionné : {fusion.shape}", flush=True)
+
+        # ➤ Sortie écrite : ses clés rejoignent l'index historique
+        if historique is not None:
+            try:
+                historique.enregistrer(cles_hist, mois_lignes(fusion), out)
+                print(f"[INFO] 🗂️ Index historique : {len(cles_hist)} clé(s) enregistrée(s) pour {out}", flush=True)
+            except sqlite3.Error as e:
+                print(f"[WARN] ⚠️ Index historique non mis à jour : {e}", flush=True)
+            finally:
+                historique.close()
         if fichiers_ignores:
             print(f"\n⚠️ Fusion partielle : certains fichiers n'ont pas été traités à cause de colonnes non conformes :", flush=True)
             for f in fichiers_ignores:
@@ -644,10 +845,42 @@ def main():
             print(f"\n⚠️ Fusion terminée avec des fichiers ignorés. Voir détails ci-dessus.\n", flush=True)
         else:
             print(f"\n✅ Fusion terminée – fichier créé : {out}\n", flush=True)
-
-    except Exception as e:
-        print(f"[ERROR] ❌ Une erreur s'est produite pendant la mise en forme Excel : {e}", flush=True)
-        sys.exit(1)
+        return out
+
+    # ➤ Graphe des étapes : la lecture des fichiers (processus si --workers > 1), la synchronisation
+    #   BCE (thread, réseau) et les tables de correspondance sont indépendantes et tournent en même
+    #   temps ; les étapes suivantes attendent leurs entrées. Le frame fusionné passe d'une étape à
+    #   la suivante par pop("fusion") : une seule référence vivante, comme dans un script linéaire.
+    excel = "processus" if args.workers > 1 and total > 1 else "principal"
+    if excel == "processus":
+        print(f"[INFO] ⚙️ Lecture parallèle de {total} fichier(s) sur {min(args.workers, total)} processus", flush=True)
+    noms_lecture = [f"lecture [{idx + 1}] {os.path.basename(path)}" for idx, path in enumerate(files)]
+    etapes = [
+        # ➤ Tables de correspondance (table + ZONE AFFECTATION) : cache compilé ou classeur ouvert une fois
+        Etape("references", partial(charger_references, table_path, zone_affectation_path,
+                                    None if args.no_cache else cache_references(args.cache_max_mo)),
+              executeur="processus" if excel == "processus" else "thread"),
+    ]
+    # synchronisation de la base de taux en tâche de fond, sauf si l'instantané du GUI répond déjà
+    synchro_bce = cache_taux is None or cache_taux.lire("BCE", args.date) is None
+    if synchro_bce:
+        etapes.append(Etape("synchro BCE", partial(synchroniser_bce, args.date), executeur="thread"))
+    etapes += [
+        Etape(nom, partial(traiter_fichier, path, args.lecteur, cache, entrees[idx], filtre), executeur=excel,
+              rappel=partial(publier, idx, path), secours=partial(lecture_en_erreur, path))
+        for idx, (nom, path) in enumerate(zip(noms_lecture, files))
+    ]
+    etapes += [
+        Etape("assemblage", assembler, noms_lecture),
+        Etape("consolidation", consolider, ["assemblage"]),
+        Etape("taux", calculer_taux, ["assemblage"] + (["synchro BCE"] if synchro_bce else [])),
+        Etape("correspondances", completer_correspondances, ["consolidation", "references"]),
+        Etape("montants", calculer_montants, ["correspondances", "taux", "assemblage"]),
+        Etape("ecriture", ecrire_sortie, ["montants", "consolidation", "assemblage"]),
+    ]
+    ordonnanceur = Ordonnanceur(etapes, processus=args.workers)
+    ordonnanceur.executer()
+    ordonnanceur.afficher_rapport()
 
 def validate_strict_columns(df, filename, formats, return_details=False):
     """
@@ -687,6 +920,7 @@ def validate_strict_columns(df, filename, formats, return_details=False):
 # Lancement sécurisé du script avec capture des erreurs
 # --------------------------------------------------
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     try:
         main()
     except Exception as e:
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ETL_SIAMP_CACHE.py – cache disque des feuilles déjà lues
+
+• Une feuille lue est stockée en Parquet, indexée par (fichier, feuille,
+  lecteur, VERSION_LECTEUR). Le fichier est identifié par taille + mtime
+  (défaut) ou par empreinte SHA-1 de son contenu.
+• Éviction LRU : chaque lecture rafraîchit la date du fichier cache, les plus
+  anciens sont supprimés dès que la taille totale dépasse la limite.
+• Sans pyarrow, le cache est simplement désactivé.
+"""
+from __future__ import annotations
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from ETL_SIAMP_LECTURE import VERSION_LECTEUR
+
+try:
+    import pyarrow.parquet as pq  # moteur Parquet de pandas
+    PARQUET_DISPONIBLE = True
+except ImportError:
+    PARQUET_DISPONIBLE = False
+
+TAILLE_MAX_MO = 512
+EMPREINTES = ("mtime", "contenu")
+
+
+def dossier_application() -> str:
+    """Dossier de travail persistant de l'ETL (cache, index…), surchargeable par ETL_SIAMP_DATA."""
+    if os.environ.get("ETL_SIAMP_DATA"):
+        return os.environ["ETL_SIAMP_DATA"]
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "ETL_SIAMP")
+
+
+class CacheFeuilles:
+    """Cache Parquet des DataFrames produits par Classeur.lire()."""
+
+    def __init__(self, dossier: str | None = None, taille_max_mo: float = TAILLE_MAX_MO,
+                 empreinte: str = "mtime"):
+        if empreinte not in EMPREINTES:
+            raise ValueError(f"Empreinte inconnue : {empreinte} (attendu : {', '.join(EMPREINTES)})")
+        self.dossier = dossier or os.path.join(dossier_application(), "feuilles")
+        self.taille_max = int(taille_max_mo * 2**20)
+        self.empreinte = empreinte
+        self.actif = PARQUET_DISPONIBLE
+        self._empreintes: dict[tuple, str] = {}
+        if self.actif:
+            try:
+                os.makedirs(self.dossier, exist_ok=True)
+            except OSError:
+                self.actif = False
+
+    # ------------------------------------------------------------------ clés
+    def cle_fichier(self, path: str) -> str:
+        st = os.stat(path)
+        ident = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        if ident not in self._empreintes:
+            if self.empreinte == "contenu":
+                h = hashlib.sha1()
+                with open(path, "rb") as f:
+                    for bloc in iter(lambda: f.read(1 << 20), b""):
+                        h.update(bloc)
+                brut = f"contenu|{h.hexdigest()}"
+            else:
+                brut = f"mtime|{ident[0]}|{st.st_size}|{st.st_mtime_ns}"
+            self._empreintes[ident] = hashlib.sha1(brut.encode("utf-8")).hexdigest()
+        return self._empreintes[ident]
+
+    def _chemin(self, cle_fichier: str, suffixe: str) -> str:
+        return os.path.join(self.dossier, f"{cle_fichier}_{suffixe}")
+
+    def _suffixe_feuille(self, feuille: str, lecteur: str) -> str:
+        h = hashlib.sha1(f"{feuille}|{lecteur}|v{VERSION_LECTEUR}".encode("utf-8")).hexdigest()[:16]
+        return f"{h}.parquet"
+
+    # ------------------------------------------------------------------ DataFrames
+    def lire(self, path: str, feuille: str, lecteur: str) -> pd.DataFrame | None:
+        if not self.actif:
+            return None
+        chemin = self._chemin(self.cle_fichier(path), self._suffixe_feuille(feuille, lecteur))
+        if not os.path.exists(chemin):
+            return None
+        try:
+            df = pd.read_parquet(chemin)
+        except Exception:
+            return None
+        self._toucher(chemin)
+        # Parquet relit les manquants des colonnes texte en None : on rétablit NaN
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].where(df[col].notna(), np.nan)
+        return df
+
+    def lire_colonnes(self, path: str, feuille: str, lecteur: str) -> list[str] | None:
+        """Noms des colonnes d'une feuille en cache, lus dans le schéma Parquet seul."""
+        if not self.actif:
+            return None
+        chemin = self._chemin(self.cle_fichier(path), self._suffixe_feuille(feuille, lecteur))
+        if not os.path.exists(chemin):
+            return None
+        try:
+            schema = pq.read_schema(chemin)
+        except Exception:
+            return None
+        meta = schema.pandas_metadata or {}
+        index = {c for c in meta.get("index_columns", []) if isinstance(c, str)}
+        return [nom for nom in schema.names if nom not in index]
+
+    def ecrire(self, path: str, feuille: str, lecteur: str, df: pd.DataFrame) -> bool:
+        """Stocke df ; renvoie False si la feuille n'est pas sérialisable (types mélangés)."""
+        if not self.actif:
+            return False
+        chemin = self._chemin(self.cle_fichier(path), self._suffixe_feuille(feuille, lecteur))
+        try:
+            self._ecrire_atomique(chemin, lambda tmp: df.to_parquet(tmp))
+        except Exception:
+            return False
+        self._evincer()
+        return True
+
+    # ------------------------------------------------------------------ interne
+    def _ecrire_atomique(self, chemin: str, ecrire) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.dossier, suffix=".tmp")
+        os.close(fd)
+        try:
+            ecrire(tmp)
+            os.replace(tmp, chemin)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    @staticmethod
+    def _toucher(chemin: str) -> None:
+        try:
+            os.utime(chemin)
+        except OSError:
+            pass
+
+    def _evincer(self) -> None:
+        """Supprime les entrées les moins récemment utilisées au-delà de taille_max."""
+        try:
+            entrees = [e for e in os.scandir(self.dossier) if e.is_file() and not e.name.endswith(".tmp")]
+        except OSError:
+            return
+        stats = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in entrees]
+        total = sum(taille for _, taille, _ in stats)
+        for _, taille, chemin in sorted(stats):
+            if total <= self.taille_max:
+                break
+            try:
+                os.remove(chemin)
+                total -= taille
+            except OSError:
+                pass
+
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ETL_SIAMP_DOUBLONS.py – suppression des doublons par empreintes 64 bits
+
+• Une empreinte uint64 par ligne (même combinaison que pd.util.hash_pandas_object),
+  calculée une seule fois par étape : chaque colonne texte est factorisée, ses
+  valeurs distinctes hachées puis ré-indexées ; la détection des doublons passe
+  ensuite par une table de hachage sur ces entiers : coût linéaire.
+• Même résultat que drop_duplicates(subset=…, keep=…) : les lignes écartées sont
+  comparées à la ligne conservée sur les codes de factorisation (entiers) ; en cas
+  de collision d'empreintes, repli sur un regroupement exact des colonnes.
+• Chaque ligne écartée est journalisée avec son origine (NOMFICHIER, FEUILLE)
+  et celle de la ligne conservée, pour la feuille « DOUBLONS SUPPRIMÉS ».
+"""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from ETL_SIAMP_ECRITURE import ecrire_feuille, LIGNES_MAX_EXCEL
+from ETL_SIAMP_SCHEMA import est_categorie
+
+COLONNES_ORIGINE = ["NOMFICHIER", "FEUILLE"]
+FEUILLE_DOUBLONS = "DOUBLONS SUPPRIMÉS"
+
+
+# ------------------------------------------------------------------ empreintes
+def _colonne(serie: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Empreinte uint64 de chaque valeur d'une colonne, et tableau comparable associé :
+    codes des valeurs distinctes (texte, catégories) ou valeurs elles-mêmes (nombres, dates).
+    """
+    if est_categorie(serie):
+        codes, distinctes = serie.cat.codes.to_numpy(), serie.cat.categories
+    elif serie.dtype == object:
+        codes, distinctes = pd.factorize(serie, sort=False)
+        codes = codes.astype(np.int32, copy=False)
+    else:
+        valeurs = serie.to_numpy()
+        if valeurs.dtype.kind == "f":
+            valeurs = np.where(np.isnan(valeurs), np.nan, valeurs + 0.0)  # -0.0 → 0.0, NaN canonique
+        return pd.util.hash_array(valeurs, categorize=False), valeurs
+    empreinte = pd.util.hash_array(np.asarray(distinctes), categorize=False).take(codes) if len(distinctes) \
+        else np.zeros(len(codes), dtype=np.uint64)
+    empreinte[codes < 0] = np.iinfo(np.uint64).max
+    return empreinte, codes
+
+
+def _combiner(colonnes: list[np.ndarray]) -> np.ndarray:
+    """Combinaison des empreintes de colonnes, identique à pd.util.hash_pandas_object(df, index=False)."""
+    mult = np.uint64(1000003)
+    resultat = np.full(len(colonnes[0]), 0x345678, dtype=np.uint64)
+    for i, empreinte in enumerate(colonnes):
+        inverse = len(colonnes) - i
+        resultat ^= empreinte
+        resultat *= mult
+        mult += np.uint64(82520 + inverse + inverse)
+    return resultat + np.uint64(97531)
+
+
+def _empreintes(df: pd.DataFrame, colonnes: list[str]) -> tuple[np.ndarray, list[np.ndarray]]:
+    hachees, comparables = zip(*(_colonne(df[col]) for col in colonnes))
+    return _combiner(list(hachees)), list(comparables)
+
+
+def empreintes(df: pd.DataFrame, colonnes: list[str] | None = None) -> np.ndarray:
+    """
+    Empreinte uint64 de chaque ligne sur `colonnes` (toutes par défaut), stable d'une exécution
+    à l'autre. Texte et catégories sont hachés par valeur distincte ; -0.0 et 0.0 se confondent.
+    """
+    return _empreintes(df, list(df.columns) if colonnes is None else list(colonnes))[0]
+
+
+def _doublons(groupes: np.ndarray, garder: str) -> tuple[np.ndarray, np.ndarray]:
+    """Positions des lignes écartées et, pour chacune, position de la ligne conservée du même groupe."""
+    masque = pd.Index(groupes).duplicated(keep=garder)
+    supprimees = np.flatnonzero(masque)
+    if not len(supprimees):
+        return supprimees, supprimees
+    gardees = np.flatnonzero(~masque)
+    representant = np.empty(groupes.max() + 1, dtype=np.intp)
+    representant[groupes[gardees]] = gardees
+    return supprimees, representant[groupes[supprimees]]
+
+
+def _memes_valeurs(comparables: list[np.ndarray], lignes: np.ndarray, references: np.ndarray) -> bool:
+    """Vrai si chaque ligne écartée a bien les mêmes valeurs que sa ligne conservée (manquant = manquant)."""
+    for valeurs in comparables:
+        a, b = valeurs[lignes], valeurs[references]
+        ecarts = a != b
+        if ecarts.any() and not (pd.isna(a[ecarts]) & pd.isna(b[ecarts])).all():
+            return False
+    return True
+
+
+# ------------------------------------------------------------------ suppression
+def dedoublonner(df: pd.DataFrame, colonnes: list[str] | None = None, garder: str = "last",
+                 etape: str = "", detail: list[str] | None = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Équivalent de df.drop_duplicates(subset=colonnes, keep=garder) par empreintes.
+    Renvoie (df sans doublons, journal des lignes écartées).
+    """
+    colonnes = list(df.columns) if colonnes is None else list(colonnes)
+    empreinte, comparables = _empreintes(df, colonnes)
+    groupes = pd.factorize(empreinte)[0]
+    supprimees, conservees = _doublons(groupes, garder)
+    del empreinte
+    if len(supprimees) and not _memes_valeurs(comparables, supprimees, conservees):
+        print("[WARN] ⚠️ Collision d'empreintes détectée, regroupement exact des colonnes", flush=True)
+        groupes = df.groupby(colonnes, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+        supprimees, conservees = _doublons(groupes, garder)
+    del comparables
+
+    journal = journal_doublons(df, supprimees, conservees, etape, detail if detail is not None else colonnes)
+    if len(supprimees):
+        masque = np.zeros(len(df), dtype=bool)
+        masque[supprimees] = True
+        df = df[~masque]
+    return df, journal
+
+
+def _extraire(serie: pd.Series, positions: np.ndarray):
+    """Valeurs aux positions données ; les catégories restent catégorielles (pas de copie en object)."""
+    valeurs = serie.iloc[positions]
+    return valeurs.array if est_categorie(valeurs) else valeurs.to_numpy()
+
+
+def journal_doublons(df: pd.DataFrame, supprimees: np.ndarray, conservees: np.ndarray,
+                     etape: str, detail: list[str]) -> pd.DataFrame:
+    """Une ligne par doublon écarté : étape, origine, origine de la ligne conservée, colonnes de détail."""
+    origine = [c for c in COLONNES_ORIGINE if c in df.columns]
+    journal = {"ÉTAPE": pd.Categorical.from_codes(np.zeros(len(supprimees), dtype=np.int8), [etape])}
+    for col in origine:
+        journal[col] = _extraire(df[col], supprimees)
+    for col in origine:
+        journal[f"{col} CONSERVÉE"] = _extraire(df[col], conservees)
+    for col in detail:
+        if col in df.columns and col not in origine:
+            journal[col] = _extraire(df[col], supprimees)
+    return pd.DataFrame(journal)
+
+
+def ecrire_journal(classeur, journal: pd.DataFrame, feuille: str = FEUILLE_DOUBLONS) -> None:
+    """Ajoute au classeur de sortie (ETL_SIAMP_ECRITURE) une feuille annexe tronquée à la limite d'Excel."""
+    if journal.empty:
+        return
+    if len(journal) >= LIGNES_MAX_EXCEL:
+        print(f"[WARN] ⚠️ {len(journal)} lignes à lister : seules les {LIGNES_MAX_EXCEL - 1} premières "
+              f"figurent dans la feuille « {feuille} »", flush=True)
+        journal = journal.iloc[:LIGNES_MAX_EXCEL - 1]
+    ecrire_feuille(classeur, journal, feuille)
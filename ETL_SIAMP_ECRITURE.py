@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ETL_SIAMP_ECRITURE.py – écriture du classeur de sortie en un seul passage
+
+• openpyxl en mode write_only : chaque ligne est sérialisée dès son ajout dans un
+  fichier temporaire (chaînes en ligne, pas de table partagée) ; la mémoire ne dépend
+  pas du nombre de lignes.
+• Le frame est converti par blocs de TAILLE_BLOC lignes, jamais en entier.
+• En-tête (même style que pandas.to_excel), formats de colonnes (€, dates) et table
+  Excel sont posés pendant l'écriture : plus de relecture par load_workbook ni de
+  boucle cellule par cellule avant un second enregistrement.
+• Valeurs écrites comme pandas.to_excel : manquant → cellule vide, ±inf → "inf"/"-inf",
+  objets non reconnus → str.
+• Sortie partitionnée : au-delà de la limite d'Excel (1 048 576 lignes par feuille), ou
+  sur demande, les lignes sont réparties par année puis par mois (colonne MONTH) en
+  plusieurs feuilles ou plusieurs classeurs, chacun avec sa table, et une feuille INDEX
+  liste les partitions, leur nombre de lignes et leurs totaux.
+"""
+from __future__ import annotations
+
+import os
+import re
+import warnings
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.filters import AutoFilter
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+
+TAILLE_BLOC = 10_000
+FORMAT_EURO = "#,##0.00\u00a0€"
+FORMAT_DATE_HEURE = "YYYY-MM-DD HH:MM:SS"    # datetime_format par défaut de pandas.to_excel
+STYLE_TABLE = "TableStyleMedium9"
+LIGNES_MAX_EXCEL = 1_048_576                  # lignes par feuille, en-tête compris
+LIGNES_MAX_FEUILLE = LIGNES_MAX_EXCEL - 1
+
+MODES_PARTITION = ["auto", "annee", "mois", "aucune"]
+CIBLES_PARTITION = ["feuilles", "classeurs"]
+FEUILLE_INDEX = "INDEX"
+SANS_DATE = "SANS DATE"
+
+_BORD = Side(style="thin")
+_ENTETE = {"font": Font(bold=True), "border": Border(left=_BORD, right=_BORD, top=_BORD, bottom=_BORD),
+           "alignment": Alignment(horizontal="center", vertical="top")}
+
+
+def classeur_sortie() -> Workbook:
+    """Classeur vide en écriture seule (feuilles ajoutées par ecrire_feuille, puis save)."""
+    return Workbook(write_only=True)
+
+
+def _valeur(v):
+    """Valeur Python écrite par openpyxl, comme ExcelFormatter de pandas."""
+    if v is None or v is pd.NaT:
+        return None
+    t = type(v)
+    if t is str or t is int or t is bool:
+        return v
+    if t is float:
+        if v != v:
+            return None
+        return v if -np.inf < v < np.inf else ("inf" if v > 0 else "-inf")
+    if isinstance(v, (np.integer, np.floating, np.bool_)):
+        return _valeur(v.item())
+    if isinstance(v, (datetime, date)):
+        return v
+    if isinstance(v, timedelta):
+        return v.total_seconds() / 86400
+    if pd.isna(v):
+        return None
+    return str(v)
+
+
+def _colonne(serie: pd.Series) -> list:
+    """Valeurs d'un bloc de colonne prêtes pour openpyxl (chemin rapide pour les nombres)."""
+    valeurs = serie.to_numpy()
+    if valeurs.dtype.kind in "iub":
+        return valeurs.tolist()
+    if valeurs.dtype.kind == "f":
+        liste = valeurs.tolist()
+        if not np.isfinite(valeurs).all():
+            liste = [_valeur(v) for v in liste]
+        return liste
+    if valeurs.dtype.kind == "M":
+        manquantes = np.isnat(valeurs)
+        dates = pd.DatetimeIndex(valeurs).to_pydatetime()
+        dates[manquantes] = None
+        return dates.tolist()
+    return [_valeur(v) for v in serie.astype(object)]
+
+
+def _largeurs(df: pd.DataFrame, largeur_max: int) -> list[float]:
+    """Largeur de chaque colonne : texte le plus long (en-tête compris) + 2, plafonnée à largeur_max."""
+    largeurs = []
+    for i, nom in enumerate(df.columns):
+        longueur = len(str(nom))
+        if len(df):
+            longueur = max(longueur, int(df.iloc[:, i].astype(str).str.len().max()))
+        largeurs.append(min(longueur + 2, largeur_max))
+    return largeurs
+
+
+def ecrire_feuille(classeur: Workbook, df: pd.DataFrame, titre: str, formats: dict[str, str] | None = None,
+                   table: str | None = None, style_table: str = STYLE_TABLE, figer: bool = False,
+                   largeur_max: int | None = None) -> None:
+    """
+    Ajoute une feuille : en-tête, puis les lignes de df par blocs. `formats` associe un
+    number_format à des colonnes (les dates prennent FORMAT_DATE_HEURE par défaut) ;
+    `table` : nom de la table Excel posée sur la plage écrite ; `figer` fige l'en-tête ;
+    `largeur_max` ajuste la largeur des colonnes à leur contenu.
+    """
+    if len(df) > LIGNES_MAX_FEUILLE:
+        raise ValueError(f"{len(df)} lignes pour la feuille « {titre} » : la limite d'Excel est de "
+                         f"{LIGNES_MAX_FEUILLE} lignes (sortie partitionnée nécessaire)")
+    ws = classeur.create_sheet(titre)
+    # vues et largeurs sont écrites avec la première ligne : à poser avant tout append
+    if figer:
+        ws.freeze_panes = "A2"
+    if largeur_max:
+        for i, largeur in enumerate(_largeurs(df, largeur_max), 1):
+            ws.column_dimensions[get_column_letter(i)].width = largeur
+    colonnes = [str(c) for c in df.columns]
+
+    # formats demandés : posés aussi sur les cellules vides (comme la boucle de mise en forme
+    # d'origine) ; dates : seulement sur les valeurs, pandas n'écrivant pas les NaT
+    explicites = set(formats or {})
+    formats = dict(formats or {})
+    for nom, dtype in zip(colonnes, df.dtypes):
+        if dtype.kind == "M":
+            formats.setdefault(nom, FORMAT_DATE_HEURE)
+    styles = [(i, formats[nom], nom in explicites) for i, nom in enumerate(colonnes) if nom in formats]
+    for i, fmt, _ in styles:
+        ws.column_dimensions[get_column_letter(i + 1)].number_format = fmt   # format de colonne (lignes ajoutées)
+
+    entete = []
+    for nom in colonnes:
+        cellule = WriteOnlyCell(ws, nom)
+        cellule.font, cellule.border, cellule.alignment = _ENTETE["font"], _ENTETE["border"], _ENTETE["alignment"]
+        entete.append(cellule)
+    ws.append(entete)
+
+    for debut in range(0, len(df), TAILLE_BLOC):
+        bloc = df.iloc[debut:debut + TAILLE_BLOC]
+        for ligne in zip(*(_colonne(bloc.iloc[:, i]) for i in range(bloc.shape[1]))):
+            if styles:
+                ligne = list(ligne)
+                for i, fmt, vides in styles:
+                    if vides or ligne[i] is not None:
+                        cellule = WriteOnlyCell(ws, ligne[i])
+                        cellule.number_format = fmt
+                        ligne[i] = cellule
+            ws.append(ligne)
+
+    if table and colonnes and len(df):
+        ref = f"A1:{get_column_letter(len(colonnes))}{len(df) + 1}"
+        fusion_table = Table(displayName=table, ref=ref, autoFilter=AutoFilter(ref=ref),
+                             tableColumns=[TableColumn(id=i, name=nom) for i, nom in enumerate(colonnes, 1)])
+        fusion_table.tableStyleInfo = TableStyleInfo(name=style_table, showFirstColumn=False, showLastColumn=False,
+                                                     showRowStripes=True, showColumnStripes=False)
+        with warnings.catch_warnings():
+            # tableColumns sont fournies : l'avertissement générique du mode write_only est sans objet
+            warnings.simplefilter("ignore", UserWarning)
+            ws.add_table(fusion_table)
+
+
+# ------------------------------------------------------------------ partitions
+def _par_periode(dates: pd.Series, mode: str) -> tuple[list[str], np.ndarray]:
+    """(étiquettes dans l'ordre chronologique, code de chaque ligne) ; date manquante → SANS_DATE, en dernier."""
+    cles = dates.dt.year.to_numpy(dtype=float, na_value=np.nan) * 100
+    if mode == "mois":
+        cles += dates.dt.month.to_numpy(dtype=float, na_value=np.nan)
+    uniques, codes = np.unique(cles, return_inverse=True)
+    etiquettes = [SANS_DATE if np.isnan(c) else
+                  f"{int(c) // 100}-{int(c) % 100:02d}" if mode == "mois" else str(int(c) // 100)
+                  for c in uniques]
+    return etiquettes, codes.ravel()
+
+
+def _repartir(positions: np.ndarray, dates: pd.Series, niveaux: list[str],
+              lignes_max: int) -> list[tuple[str, np.ndarray]]:
+    etiquettes, codes = _par_periode(dates.iloc[positions], niveaux[0])
+    partitions = []
+    for k, etiquette in enumerate(etiquettes):
+        lignes = positions[codes == k]
+        if len(lignes) <= lignes_max:
+            partitions.append((etiquette, lignes))
+        elif len(niveaux) > 1 and etiquette != SANS_DATE:
+            partitions.extend(_repartir(lignes, dates, niveaux[1:], lignes_max))
+        else:
+            # un seul mois au-delà de la limite : tranches numérotées
+            partitions.extend((f"{etiquette} ({i})", lignes[debut:debut + lignes_max])
+                              for i, debut in enumerate(range(0, len(lignes), lignes_max), 1))
+    return partitions
+
+
+def partitionner(dates: pd.Series, mode: str = "auto",
+                 lignes_max: int = LIGNES_MAX_FEUILLE) -> list[tuple[str, np.ndarray]]:
+    """
+    Répartit les lignes selon leur date (MONTH) : [(étiquette, positions des lignes)], dans
+    l'ordre chronologique, les lignes gardant leur ordre. « auto » ne découpe que si la
+    limite est dépassée : par année, puis par mois pour une année encore trop grande.
+    Liste vide : une seule feuille suffit.
+    """
+    if mode not in MODES_PARTITION:
+        raise ValueError(f"Mode de partition inconnu : {mode} (attendu : {', '.join(MODES_PARTITION)})")
+    if mode == "aucune" or (mode == "auto" and len(dates) <= lignes_max):
+        return []
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, errors="coerce")
+    niveaux = ["annee", "mois"] if mode == "auto" else [mode]
+    return _repartir(np.arange(len(dates)), dates.reset_index(drop=True), niveaux, lignes_max)
+
+
+def index_partitions(df: pd.DataFrame, partitions: list[tuple[str, np.ndarray]], emplacements: list[str],
+                     colonne: str, totaux=()) -> pd.DataFrame:
+    """Une ligne par partition (emplacement, nombre de lignes, somme des colonnes `totaux`), puis TOTAL."""
+    index = {"PARTITION": [e for e, _ in partitions], colonne: emplacements,
+             "LIGNES": [len(p) for _, p in partitions]}
+    for col in totaux:
+        if col in df.columns:
+            valeurs = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+            index[col] = [float(np.nansum(valeurs[p])) for _, p in partitions]
+    index = pd.DataFrame(index)
+    total = {"PARTITION": "TOTAL", colonne: None, "LIGNES": int(index["LIGNES"].sum())}
+    total.update({col: index[col].sum() for col in index.columns[3:]})
+    return pd.concat([index, pd.DataFrame([total])], ignore_index=True)
+
+
+def ecrire_partitions(classeur: Workbook, df: pd.DataFrame, partitions: list[tuple[str, np.ndarray]], chemin: str,
+                      cible: str = "feuilles", formats: dict[str, str] | None = None, table: str | None = None,
+                      totaux=(), **options) -> pd.DataFrame:
+    """
+    Écrit df partition par partition, précédé de la feuille INDEX. cible « feuilles » : une
+    feuille par partition dans `classeur` ; « classeurs » : un classeur par partition à côté
+    de `chemin` (<nom>_<partition>.xlsx), `classeur` ne recevant que l'INDEX. Chaque partition
+    a sa table (<table>_<partition>). Renvoie l'index écrit.
+    """
+    if cible not in CIBLES_PARTITION:
+        raise ValueError(f"Cible de partition inconnue : {cible} (attendu : {', '.join(CIBLES_PARTITION)})")
+    racine, extension = os.path.splitext(chemin)
+    suffixes = [re.sub(r"\W+", "_", etiquette).strip("_") for etiquette, _ in partitions]
+    if cible == "feuilles":
+        colonne, emplacements = "FEUILLE", [etiquette for etiquette, _ in partitions]
+    else:
+        colonne, emplacements = "FICHIER", [f"{racine}_{suffixe}{extension or '.xlsx'}" for suffixe in suffixes]
+    index = index_partitions(df, partitions, [os.path.basename(e) for e in emplacements], colonne, totaux)
+    formats = formats or {}
+    ecrire_feuille(classeur, index, FEUILLE_INDEX, formats={c: formats[c] for c in totaux if c in formats},
+                   figer=True, largeur_max=50)
+
+    for (etiquette, positions), suffixe, emplacement in zip(partitions, suffixes, emplacements):
+        nom_table = f"{table}_{suffixe}" if table else None
+        if cible == "feuilles":
+            ecrire_feuille(classeur, df.iloc[positions], etiquette, formats, nom_table, **options)
+        else:
+            partiel = classeur_sortie()
+            ecrire_feuille(partiel, df.iloc[positions], etiquette, formats, nom_table, **options)
+            partiel.save(emplacement)
+    return index
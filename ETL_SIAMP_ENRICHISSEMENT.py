@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ETL_SIAMP_ENRICHISSEMENT.py – colonnes de correspondance par recherche indexée
+
+• Remplace fusion.merge(table, how="left") : la clé de la table de référence devient
+  un pd.Index, chaque valeur distincte de la clé côté fusion y est cherchée une seule
+  fois (factorize → get_indexer), puis la colonne est remplie par take vectorisé.
+• Le frame fusionné n'est ni copié ni ré-indexé : seule la colonne ajoutée est créée,
+  à la place qu'aurait donnée le merge (en fin de frame, l'éventuelle colonne du même
+  nom étant remplacée comme après le renommage _x/_y).
+• Table à clés non uniques (un pays rattaché à plusieurs zones) : repli sur le merge,
+  qui duplique les lignes concernées comme auparavant.
+• Chaque recherche rapporte son taux de correspondance et les clés sans correspondance.
+"""
+from __future__ import annotations
+
+import pandas as pd
+
+NB_CLES_AFFICHEES = 5
+
+
+def enrichir(df: pd.DataFrame, cle: str, table: pd.DataFrame, cle_table: str, colonne: str,
+             nom: str | None = None) -> tuple[pd.DataFrame, dict]:
+    """
+    Ajoute à df la colonne `colonne` de `table` (renommée `nom`) pour chaque valeur de df[cle]
+    trouvée dans table[cle_table]. Équivalent de
+        df.merge(table[[cle_table, colonne]], how="left", left_on=cle, right_on=cle_table)
+    sans la colonne clé de droite. Renvoie (df, rapport de correspondance).
+    """
+    nom = nom or colonne
+    index = pd.Index(table[cle_table])
+    if not index.is_unique:
+        return _par_merge(df, cle, table, cle_table, colonne, nom)
+
+    codes, distinctes = pd.factorize(df[cle], use_na_sentinel=False)
+    trouvees = index.get_indexer(distinctes)
+    positions = trouvees[codes]
+    valeurs = table[colonne].to_numpy()
+    if nom in df.columns:
+        del df[nom]
+    df[nom] = pd.api.extensions.take(valeurs, positions, allow_fill=True)
+    return df, _rapport(nom, len(df), int((positions >= 0).sum()), distinctes[trouvees < 0])
+
+
+def _par_merge(df: pd.DataFrame, cle: str, table: pd.DataFrame, cle_table: str, colonne: str,
+               nom: str) -> tuple[pd.DataFrame, dict]:
+    droite = table[[cle_table, colonne]].rename(columns={colonne: nom})
+    if cle_table == cle:
+        fusion = df.merge(droite, how="left", on=cle, indicator="_trouvee")
+    else:
+        fusion = df.merge(droite, how="left", left_on=cle, right_on=cle_table, indicator="_trouvee")
+        fusion.drop(columns=[cle_table], inplace=True)
+    if f"{nom}_x" in fusion.columns and f"{nom}_y" in fusion.columns:
+        fusion.drop(columns=[f"{nom}_x"], inplace=True)
+        fusion.rename(columns={f"{nom}_y": nom}, inplace=True)
+    trouvees = (fusion.pop("_trouvee") == "both").to_numpy()
+    absentes = pd.unique(fusion.loc[~trouvees, cle])
+    print(f"[INFO] 🔁 « {nom} » : clés non uniques dans la table, recherche par merge "
+          f"({len(fusion) - len(df)} ligne(s) dupliquée(s))", flush=True)
+    return fusion, _rapport(nom, len(fusion), int(trouvees.sum()), absentes)
+
+
+def _rapport(nom: str, lignes: int, trouvees: int, absentes) -> dict:
+    return {"colonne": nom, "lignes": lignes, "trouvees": trouvees,
+            "taux": trouvees / lignes if lignes else 1.0, "absentes": list(absentes)}
+
+
+def afficher_rapport(rapport: dict) -> None:
+    """Taux de correspondance d'une recherche et premières clés sans correspondance."""
+    print(f"[INFO] 🔗 « {rapport['colonne']} » : {rapport['trouvees']}/{rapport['lignes']} ligne(s) "
+          f"trouvée(s) ({rapport['taux']:.1%})", flush=True)
+    absentes = rapport["absentes"]
+    if absentes:
+        exemples = ", ".join(map(repr, absentes[:NB_CLES_AFFICHEES]))
+        suite = "…" if len(absentes) > NB_CLES_AFFICHEES else ""
+        print(f"       {len(absentes)} clé(s) sans correspondance : {exemples}{suite}", flush=True)
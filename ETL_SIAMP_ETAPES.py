@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ETL_SIAMP_ETAPES.py – graphe des étapes de l'ETL et ordonnanceur
+
+• Chaque étape déclare ses entrées (noms d'autres étapes) ; son résultat est passé
+  en argument nommé aux étapes qui en dépendent. Le graphe est vérifié (entrée
+  inconnue, cycle) avant toute exécution.
+• Les étapes prêtes sont lancées dès que leurs entrées sont disponibles : « thread »
+  pour les attentes réseau, « processus » pour l'analyse des classeurs Excel,
+  « principal » pour ce qui manipule le frame fusionné (exécuté dans le fil principal,
+  une étape à la fois, dans l'ordre de déclaration).
+• La sortie console d'une étape thread ou processus est retenue puis imprimée d'un bloc
+  à sa fin : les lignes PROGRESS lues par le GUI ne sont jamais coupées. Côté thread,
+  sys.stdout n'est remplacé que tant qu'une étape thread tourne, et le tampon suit le
+  contexte de l'étape (contextvars) : les threads qu'elle lance avec copy_context() y
+  écrivent aussi, les autres fils impriment directement.
+• En fin d'exécution : temps réel de chaque étape et chemin critique (la chaîne
+  d'étapes qui a fixé la durée totale).
+"""
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import io
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from time import perf_counter
+
+EXECUTEURS = ("principal", "thread", "processus")
+THREADS_MAX = 4
+
+# tampon de l'étape thread en cours dans ce contexte (None : sortie directe)
+_TAMPON: contextvars.ContextVar[list[str] | None] = contextvars.ContextVar("tampon_etape", default=None)
+
+
+class Etape:
+    """Étape du graphe : fn(**{entrée: résultat}) ; `rappel(résultat)` est appelé dans le fil principal."""
+    __slots__ = ("nom", "fn", "entrees", "executeur", "rappel", "secours")
+
+    def __init__(self, nom: str, fn, entrees=(), executeur: str = "principal", rappel=None, secours=None):
+        if executeur not in EXECUTEURS:
+            raise ValueError(f"Exécuteur inconnu : {executeur} (attendu : {', '.join(EXECUTEURS)})")
+        self.nom = nom
+        self.fn = fn
+        self.entrees = list(entrees)
+        self.executeur = executeur
+        self.rappel = rappel
+        self.secours = secours   # secours(exception) → résultat de remplacement, sinon l'erreur remonte
+
+
+def _executer_isole(fn, kwargs: dict):
+    """
+    Exécute fn dans un processus de travail, sortie console retenue : (résultat, début, fin, sortie).
+    perf_counter est une horloge monotone commune aux processus (Windows, Linux).
+    """
+    tampon = io.StringIO()
+    t0 = perf_counter()
+    try:
+        with contextlib.redirect_stdout(tampon):
+            res = fn(**kwargs)
+    except BaseException:
+        sys.stdout.write(tampon.getvalue())
+        raise
+    return res, t0, perf_counter(), tampon.getvalue()
+
+
+class _Aiguillage:
+    """Remplace sys.stdout pendant les étapes thread : ce qu'elles impriment va dans leur tampon."""
+
+    def __init__(self, sortie):
+        self.sortie = sortie
+
+    def write(self, texte: str) -> int:
+        tampon = _TAMPON.get()
+        if tampon is None:
+            return self.sortie.write(texte)
+        tampon.append(texte)
+        return len(texte)
+
+    def flush(self) -> None:
+        self.sortie.flush()
+
+    def __getattr__(self, nom):
+        return getattr(self.sortie, nom)
+
+
+class Ordonnanceur:
+    """Exécute un graphe d'étapes ; `debuts`, `fins` (s depuis le lancement) et `chemin_critique()` après executer()."""
+
+    def __init__(self, etapes: list[Etape], processus: int = 1):
+        self.etapes = {e.nom: e for e in etapes}
+        if len(self.etapes) != len(etapes):
+            raise ValueError("Noms d'étapes en double")
+        for e in etapes:
+            inconnues = [n for n in e.entrees if n not in self.etapes]
+            if inconnues:
+                raise ValueError(f"Étape « {e.nom} » : entrée(s) inconnue(s) {inconnues}")
+        self._verifier_acyclique()
+        self.processus = max(1, processus)
+        self.resultats: dict = {}
+        self.debuts: dict[str, float] = {}
+        self.fins: dict[str, float] = {}
+        self._aiguillage: _Aiguillage | None = None
+        self._threads_actifs = 0
+
+    def _verifier_acyclique(self) -> None:
+        restants = {nom: set(e.entrees) for nom, e in self.etapes.items()}
+        while restants:
+            prets = [nom for nom, entrees in restants.items() if not entrees]
+            if not prets:
+                raise ValueError(f"Cycle entre les étapes : {sorted(restants)}")
+            for nom in prets:
+                del restants[nom]
+            for entrees in restants.values():
+                entrees.difference_update(prets)
+
+    # ------------------------------------------------------------------ exécution
+    def _en_thread(self, etape: Etape, kwargs: dict):
+        tampon: list[str] = []
+        jeton = _TAMPON.set(tampon)
+        t0 = perf_counter()
+        try:
+            return etape.fn(**kwargs), t0, perf_counter(), ""
+        finally:
+            _TAMPON.reset(jeton)
+            self.sorties[etape.nom] = "".join(tampon)
+
+    def _aiguiller(self, actif: bool) -> None:
+        """Installe l'aiguillage au lancement de la première étape thread, le retire après la dernière."""
+        self._threads_actifs += 1 if actif else -1
+        if actif and self._threads_actifs == 1:
+            self._aiguillage = _Aiguillage(sys.stdout)
+            sys.stdout = self._aiguillage
+        elif not actif and self._threads_actifs == 0:
+            self._desinstaller()
+
+    def _desinstaller(self) -> None:
+        if self._aiguillage is not None and sys.stdout is self._aiguillage:
+            sys.stdout = self._aiguillage.sortie
+        self._aiguillage = None
+
+    def _terminer(self, etape: Etape, res, debut: float, fin: float, sortie: str) -> None:
+        # bornes ramenées à [lancement, récolte] : l'horloge d'un processus de travail peut différer
+        fin = min(fin, perf_counter())
+        self.debuts[etape.nom] = max(0.0, debut - self._t0)
+        self.fins[etape.nom] = max(self.debuts[etape.nom], fin - self._t0)
+        if sortie:
+            print(sortie, end="", flush=True)
+        self.resultats[etape.nom] = res
+        if etape.rappel is not None:
+            etape.rappel(res)
+
+    def _prete(self, etape: Etape) -> bool:
+        return all(n in self.resultats for n in etape.entrees)
+
+    def _recolter(self, en_cours: dict, bloquant: bool) -> None:
+        """Termine les étapes thread / processus achevées (attend la première si `bloquant`)."""
+        termines, _ = wait(en_cours, timeout=None if bloquant else 0, return_when=FIRST_COMPLETED)
+        for fut in termines:
+            e = en_cours.pop(fut)
+            if e.executeur == "thread":
+                self._aiguiller(False)
+            try:
+                res, debut, fin, sortie = fut.result()
+            except Exception as exc:
+                print(self.sorties.pop(e.nom, ""), end="", flush=True)
+                if e.secours is None:
+                    raise
+                res, debut, fin, sortie = e.secours(exc), perf_counter(), perf_counter(), ""
+            self._terminer(e, res, debut, fin, sortie or self.sorties.pop(e.nom, ""))
+
+    def executer(self) -> dict:
+        """Exécute toutes les étapes ; renvoie {nom d'étape: résultat}."""
+        self._t0 = perf_counter()
+        self.sorties: dict[str, str] = {}
+        attente = dict(self.etapes)
+        nb_processus = sum(e.executeur == "processus" for e in self.etapes.values())
+        nb_threads = sum(e.executeur == "thread" for e in self.etapes.values())
+        pools = {
+            "thread": ThreadPoolExecutor(min(nb_threads, THREADS_MAX)) if nb_threads else None,
+            "processus": ProcessPoolExecutor(min(nb_processus, self.processus)) if nb_processus else None,
+        }
+        self._threads_actifs = 0
+        en_cours: dict = {}
+        termine = False
+        try:
+            while attente or en_cours:
+                if en_cours:
+                    self._recolter(en_cours, bloquant=False)
+                for e in [e for e in attente.values() if e.executeur != "principal" and self._prete(e)]:
+                    del attente[e.nom]
+                    kwargs = {n: self.resultats[n] for n in e.entrees}
+                    if e.executeur == "thread":
+                        self._aiguiller(True)
+                        en_cours[pools["thread"].submit(self._en_thread, e, kwargs)] = e
+                    else:
+                        en_cours[pools["processus"].submit(_executer_isole, e.fn, kwargs)] = e
+
+                principale = next((e for e in attente.values() if self._prete(e)), None)
+                if principale is not None:
+                    del attente[principale.nom]
+                    t0 = perf_counter()
+                    res = principale.fn(**{n: self.resultats[n] for n in principale.entrees})
+                    self._terminer(principale, res, t0, perf_counter(), "")
+                elif en_cours:
+                    self._recolter(en_cours, bloquant=True)
+                elif attente:
+                    raise RuntimeError(f"Étapes bloquées : {sorted(attente)}")
+            termine = True
+        finally:
+            self._desinstaller()
+            for pool in pools.values():
+                if pool is not None:
+                    # arrêt sur erreur : on n'attend pas les étapes encore en cours
+                    pool.shutdown(wait=termine, cancel_futures=True)
+        return self.resultats
+
+    # ------------------------------------------------------------------ rapport
+    def chemin_critique(self) -> list[str]:
+        """Chaîne d'étapes qui se termine le plus tard, en remontant chaque fois l'entrée finie en dernier."""
+        if not self.fins:
+            return []
+        chemin = [max(self.fins, key=self.fins.get)]
+        while True:
+            entrees = [n for n in self.etapes[chemin[-1]].entrees if n in self.fins]
+            if not entrees:
+                return chemin[::-1]
+            chemin.append(max(entrees, key=self.fins.get))
+
+    def afficher_rapport(self) -> None:
+        """Temps réel de chaque étape (début → fin depuis le lancement) puis chemin critique."""
+        largeur = max(map(len, self.fins), default=0)
+        print(f"[INFO] ⏱️ Étapes ({max(self.fins.values(), default=0) * 1000:.0f} ms au total) :", flush=True)
+        for nom in sorted(self.fins, key=lambda n: (self.debuts[n], self.fins[n])):
+            print(f"   {nom:<{largeur}}  {self.etapes[nom].executeur:<9}  "
+                  f"{self.debuts[nom] * 1000:7.0f} → {self.fins[nom] * 1000:7.0f} ms  "
+                  f"({(self.fins[nom] - self.debuts[nom]) * 1000:.0f} ms)", flush=True)
+        chemin = self.chemin_critique()
+        if chemin:
+            print(f"[INFO] 🧭 Chemin critique ({self.fins[chemin[-1]] * 1000:.0f} ms) : " + " → ".join(chemin),
+                  flush=True)
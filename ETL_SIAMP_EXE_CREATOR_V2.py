@@ -13,7 +13,7 @@ from openpyxl.worksheet.table import Table, TableStyleInfo
 from openpyxl.utils import get_column_letter
 import sys
 import io
-import requests
+from ETL_SIAMP_FOURNISSEURS import FournisseurCurrencyAPI
 
 # Chemin absolu vers l'icône (sera utilisée dans l'interface et pour l'exécutable)
 ICON_PATH = "C:/Users/elias/OneDrive/Documents/PROFESSIONNEL/SIAMP/SUJETS/SUJET - 1 (Gestion C.A filiales)/Dev/siamp_icon.ico"
@@ -57,11 +57,7 @@ def get_live_conversion_rates(api_key):
     Récupère les taux de conversion via currencyapi.net en utilisant la clé API fournie.
     En cas d'erreur, lève l'exception afin d'informer l'utilisateur.
     """
-    url = "https://currencyapi.net/api/v1/rates"
-    params = {"key": api_key}
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    data = response.json()
+    data = FournisseurCurrencyAPI(api_key).brut()
 
     if not data.get("valid", False):
         raise ValueError("Clé API invalide ou réponse incorrecte.")
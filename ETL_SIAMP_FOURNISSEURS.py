@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ETL_SIAMP_FOURNISSEURS.py – sources de taux de change
+
+• Une interface commune (Fournisseur.taux) pour la BCE (base locale
+  ETL_SIAMP_TAUX), currencyapi.net et les taux locaux codés en dur.
+• Une seule requests.Session partagée (connexions réutilisées), un timeout
+  par fournisseur et des GET conditionnels (ETag / Last-Modified) : un flux
+  inchangé répond 304 sans être retéléchargé.
+• taux_fusionnes interroge les fournisseurs en parallèle et fusionne par
+  priorité : chaque devise vient du premier fournisseur (par priorité) qui la
+  donne ; dès que les devises demandées sont couvertes, les autres ne sont
+  plus attendus.
+• CacheTaux mémorise les réponses par (source, date) avec durée de vie et
+  taille bornée ; le GUI en transmet un instantané JSON à ETL_SIAMP.py
+  (--taux_instantane) pour ne pas refaire les mêmes requêtes.
+
+Conventions conservées telles quelles : BCE et currencyapi (ramené à la base
+EUR) en unités de devise pour 1 EUR, taux locaux en EUR pour 1 unité.
+"""
+from __future__ import annotations
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as DelaiDepasse
+from datetime import date as Date
+from time import monotonic
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ETL_SIAMP_CACHE import dossier_application
+
+# repli si la base BCE est vide et la BCE injoignable (EUR pour 1 unité)
+TAUX_SECOURS = {
+    "EUR":1.0, "USD":0.93, "GBP":1.15,
+    "EGP":0.03, "CHF":1.04, "AED":0.25, "JPY":0.0062
+}
+# devises non cotées par la BCE (EUR pour 1 unité)
+TAUX_COMPLEMENTAIRES = {
+    "MAD": 0.094,
+    "TND": 0.30,
+    "DZD": 0.0068,
+    "XOF": 0.0015,
+}
+
+FICHIER_CLE_API = "siamp_api_key.cfg"  # clé currencyapi.net enregistrée par ETL_SIAMP_EXE_CREATOR_V2
+DUREE_CACHE = 15 * 60      # durée de vie d'une réponse mémorisée (s)
+TAILLE_CACHE = 64          # nombre maximal de réponses mémorisées
+VERSION_INSTANTANE = 1     # format de l'instantané JSON de CacheTaux (autre version → ignoré)
+
+_session: requests.Session | None = None
+_verrou = threading.Lock()
+
+
+def session() -> requests.Session:
+    """Session HTTP partagée par tous les fournisseurs (créée à la première demande)."""
+    global _session
+    with _verrou:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers["User-Agent"] = "ETL_SIAMP"
+            adaptateur = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            _session.mount("https://", adaptateur)
+            _session.mount("http://", adaptateur)
+        return _session
+
+
+def get_conditionnel(url: str, validateurs: dict | None, timeout: float, **kwargs):
+    """
+    GET avec If-None-Match / If-Modified-Since d'après `validateurs` ({"etag", "last_modified"}).
+    Renvoie (réponse, nouveaux validateurs) ; réponse None si le serveur répond 304.
+    """
+    entetes = {}
+    if validateurs and validateurs.get("etag"):
+        entetes["If-None-Match"] = validateurs["etag"]
+    if validateurs and validateurs.get("last_modified"):
+        entetes["If-Modified-Since"] = validateurs["last_modified"]
+    reponse = session().get(url, headers=entetes, timeout=timeout, **kwargs)
+    if reponse.status_code == 304:
+        reponse.close()
+        return None, validateurs
+    reponse.raise_for_status()
+    return reponse, {"etag": reponse.headers.get("ETag"), "last_modified": reponse.headers.get("Last-Modified")}
+
+
+def chemin_instantane() -> str:
+    """Emplacement de l'instantané CacheTaux passé par le GUI à ETL_SIAMP.py."""
+    return os.path.join(dossier_application(), "taux_instantane.json")
+
+
+def cle_currencyapi() -> str | None:
+    """Clé currencyapi.net enregistrée, None si aucune."""
+    try:
+        with open(FICHIER_CLE_API, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+# ------------------------------------------------------------------ fournisseurs
+class Fournisseur(ABC):
+    """Source de taux : `taux(date, devises)` renvoie {devise: taux} ou lève une exception."""
+    nom = "?"
+    timeout = 10.0
+    memorisable = True  # réponse réutilisable par CacheTaux
+
+    def reponse_memorisable(self) -> bool:
+        return self.memorisable
+
+    @abstractmethod
+    def taux(self, date: str | None = None, devises: set[str] | None = None) -> dict[str, float]:
+        ...
+
+
+class FournisseurBCE(Fournisseur):
+    """
+    Taux de référence BCE au `date`, lus dans la base locale (complétée si besoin).
+    Base vide et BCE injoignable : `secours` s'il est fourni, sinon erreur.
+    """
+    nom = "BCE"
+    timeout = 60.0
+
+    def __init__(self, secours: dict[str, float] | None = None):
+        self.secours = secours
+        self.en_repli = False
+
+    def reponse_memorisable(self) -> bool:
+        return not self.en_repli  # un repli hors ligne ne doit pas masquer une synchronisation ultérieure
+
+    def taux(self, date=None, devises=None):
+        from ETL_SIAMP_TAUX import BaseTaux  # import tardif : ETL_SIAMP_TAUX utilise session()
+
+        with BaseTaux() as base:
+            if base.doit_synchroniser(date):
+                try:
+                    base.synchroniser(timeout=self.timeout)
+                except Exception as e:
+                    print(f"[WARN] ⚠ Synchronisation BCE impossible ({e}) : base locale seule", flush=True)
+            taux, _ = base.taux_au(date)
+        self.en_repli = not taux
+        if not taux:
+            if self.secours is None:
+                raise ValueError("Base de taux BCE vide")
+            print("[FALLBACK] 🛑 Repli sur taux locaux codés en dur", flush=True)
+            return dict(self.secours)
+        return taux
+
+
+class FournisseurCurrencyAPI(Fournisseur):
+    """Taux en temps réel de currencyapi.net (pas d'historique : seulement sans date ou pour aujourd'hui)."""
+    nom = "currencyapi"
+    url = "https://currencyapi.net/api/v1/rates"
+
+    def __init__(self, cle: str):
+        self.cle = cle
+        self.validateurs: dict | None = None
+        self.dernier: dict | None = None  # dernière réponse, resservie sur un 304
+
+    def brut(self) -> dict:
+        """Réponse JSON de l'API (taux en base USD)."""
+        reponse, self.validateurs = get_conditionnel(self.url, self.validateurs, self.timeout,
+                                                     params={"key": self.cle})
+        if reponse is not None:
+            self.dernier = reponse.json()
+        return self.dernier
+
+    def taux(self, date=None, devises=None):
+        if date and date != Date.today().isoformat():
+            return {}
+        data = self.brut()
+        if not data.get("valid", False):
+            raise ValueError("Clé API invalide ou réponse incorrecte.")
+        usd = {code.upper(): float(t) for code, t in data.get("rates", {}).items() if float(t) != 0}
+        if "EUR" not in usd:
+            raise ValueError("EUR manquant dans les taux retournés.")
+        taux = {code: t / usd["EUR"] for code, t in usd.items()}
+        taux["EUR"] = 1.0
+        return taux
+
+
+class FournisseurLocal(Fournisseur):
+    """Taux fixes (dict)."""
+    nom = "local"
+    memorisable = False
+
+    def __init__(self, taux: dict[str, float] | None = None):
+        self.fixes = dict(TAUX_COMPLEMENTAIRES if taux is None else taux)
+
+    def taux(self, date=None, devises=None):
+        return dict(self.fixes)
+
+
+# ------------------------------------------------------------------ mémo des réponses
+class CacheTaux:
+    """
+    Réponses de fournisseurs par (source, date) : chaque entrée expire après `duree`
+    secondes, la moins récemment utilisée est évincée au-delà de `taille_max`.
+    Les échéances sont en temps absolu (time.time) pour survivre à l'instantané.
+    """
+
+    def __init__(self, duree: float = DUREE_CACHE, taille_max: int = TAILLE_CACHE):
+        self.duree = duree
+        self.taille_max = taille_max
+        self._entrees: OrderedDict[tuple[str, str | None], tuple[float, dict]] = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entrees)
+
+    def lire(self, source: str, date: str | None) -> dict[str, float] | None:
+        with self._verrou:
+            entree = self._entrees.get((source, date))
+            if entree is None:
+                return None
+            if entree[0] < time.time():
+                del self._entrees[(source, date)]
+                return None
+            self._entrees.move_to_end((source, date))
+            return dict(entree[1])
+
+    def ecrire(self, source: str, date: str | None, taux: dict[str, float], expire: float | None = None) -> None:
+        with self._verrou:
+            self._entrees[(source, date)] = (expire or time.time() + self.duree, dict(taux))
+            self._entrees.move_to_end((source, date))
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+
+    # ---- instantané JSON (GUI → ETL_SIAMP.py)
+    def sauvegarder(self, chemin: str) -> None:
+        maintenant = time.time()
+        with self._verrou:
+            entrees = [{"source": s, "date": d, "expire": e, "taux": t}
+                       for (s, d), (e, t) in self._entrees.items() if e >= maintenant]
+        dossier = os.path.dirname(chemin) or "."
+        os.makedirs(dossier, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=dossier, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": VERSION_INSTANTANE, "entrees": entrees}, f)
+            os.replace(tmp, chemin)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    @classmethod
+    def charger(cls, chemin: str) -> "CacheTaux":
+        """Cache repris d'un instantané ; fichier absent, illisible ou d'une autre version → cache vide."""
+        cache = cls()
+        try:
+            with open(chemin, encoding="utf-8") as f:
+                instantane = json.load(f)
+        except (OSError, ValueError):
+            return cache
+        if instantane.get("version") == VERSION_INSTANTANE:
+            for e in instantane.get("entrees", []):
+                cache.ecrire(e["source"], e["date"], e["taux"], expire=e["expire"])
+        return cache
+
+
+# ------------------------------------------------------------------ fusion
+def taux_fusionnes(fournisseurs: list[Fournisseur], date: str | None = None,
+                   devises: set[str] | None = None,
+                   cache: CacheTaux | None = None) -> tuple[dict[str, float], dict[str, str]]:
+    """
+    Interroge les fournisseurs en parallèle et fusionne leurs taux par priorité
+    (ordre de la liste). Renvoie (taux, provenance {devise: nom du fournisseur}).
+    Un fournisseur en erreur ou hors délai est ignoré ; si `devises` est donné,
+    la fusion s'arrête dès qu'elles sont toutes couvertes. Avec `cache`, un
+    fournisseur dont la réponse (source, date) est encore valide n'est pas interrogé.
+    """
+    taux: dict[str, float] = {}
+    provenance: dict[str, str] = {}
+    pool = ThreadPoolExecutor(max_workers=max(1, len(fournisseurs)), thread_name_prefix="taux")
+    try:
+        debut = monotonic()
+        memos = [cache.lire(f.nom, date) if cache is not None else None for f in fournisseurs]
+        # contexte copié : les messages des fournisseurs suivent ceux de l'appelant (ETL_SIAMP_ETAPES)
+        futures = [pool.submit(contextvars.copy_context().run, f.taux, date, devises) if memo is None else None
+                   for f, memo in zip(fournisseurs, memos)]
+        for fournisseur, future, memo in zip(fournisseurs, futures, memos):
+            if devises and devises <= taux.keys():
+                break
+            try:
+                if memo is not None:
+                    reponse = memo
+                else:
+                    reponse = future.result(timeout=max(0.0, debut + fournisseur.timeout - monotonic()))
+                    if cache is not None and fournisseur.reponse_memorisable():
+                        cache.ecrire(fournisseur.nom, date, reponse)
+            except DelaiDepasse:
+                print(f"[WARN] ⚠ {fournisseur.nom} : pas de réponse en {fournisseur.timeout:g} s", flush=True)
+                continue
+            except Exception as e:
+                print(f"[WARN] ⚠ {fournisseur.nom} : {e}", flush=True)
+                continue
+            for devise, valeur in reponse.items():
+                if devise not in taux:
+                    taux[devise] = valeur
+                    provenance[devise] = fournisseur.nom
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return taux, provenance
@@ -22,29 +22,40 @@ def resource_path(relative_path: str) -> str:
 import re
 import pandas as pd
 import configparser
-from openpyxl import load_workbook
-from openpyxl.worksheet.table import Table, TableStyleInfo
-from openpyxl.utils import get_column_letter
 import subprocess
 import shutil
 import calendar
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
 from typing import List
 import xml.etree.ElementTree as ET
 from datetime import datetime
 import requests
-from PyQt6.QtCore   import Qt, QThread, pyqtSignal, QDate
+from ETL_SIAMP_CACHE import CacheFeuilles
+from ETL_SIAMP_ECRITURE import classeur_sortie, ecrire_feuille, ecrire_partitions, partitionner, FEUILLE_INDEX
+from ETL_SIAMP_META import noms_feuilles
+from ETL_SIAMP_SCAN import scanner_fichier, est_a_jour, ecrire_manifeste, chemin_manifeste
+from ETL_SIAMP_FOURNISSEURS import (FournisseurBCE, FournisseurCurrencyAPI, FournisseurLocal, taux_fusionnes,
+                                    cle_currencyapi, CacheTaux, chemin_instantane,
+                                    TAUX_SECOURS, TAUX_COMPLEMENTAIRES)
+from PyQt6.QtCore   import Qt, QThread, pyqtSignal, QDate, QTimer
 from PyQt6.QtGui    import QIcon, QAction, QKeySequence, QPainter, QFont, QColor
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel,
     QLineEdit, QPushButton, QFileDialog, QMessageBox, QListWidget, QComboBox,
-    QPlainTextEdit, QProgressBar, QDateEdit, QInputDialog
+    QPlainTextEdit, QProgressBar, QDateEdit, QInputDialog, QStyle
 )
 
 SCRIPT_CORE = "ETL_SIAMP.py"
+ATTENTE_SCANS_MS = 100   # intervalle de vérification des pré-scans en cours
 ICON_PATH        = resource_path("mydata/siamp_icon.ico")
 CONFIG_FILE      = resource_path("mydata/siamp_api_key.cfg")
 CONFIG_REF_FILE  = resource_path("mydata/ref_files.cfg")
 
+# Découpage de la sortie (--partition) : libellé affiché → mode
+PARTITIONS = [("Automatique", "auto"), ("Par année", "annee"), ("Par mois", "mois"), ("Aucun", "aucune")]
+
 # Définir un mapping de colonnes standard
 COLUMN_MAPPING = {
     # Variations possibles -> Nom standardisé
@@ -93,6 +104,8 @@ class Worker(QThread):
 # ---------------------------------------------------------------- DropListWidget
 class DropListWidget(QListWidget):
     """Zone de liste acceptant le glisser‑déposer de fichiers .xlsx"""
+    fichiers_ajoutes = pyqtSignal(list)
+    fichiers_retires = pyqtSignal(list)
 
     def __init__(self, on_click_callback=None):
         super().__init__()
@@ -125,27 +138,177 @@ class DropListWidget(QListWidget):
         event.acceptProposedAction()
 
     def dropEvent(self, event):
-        for url in event.mimeData().urls():
-            f = url.toLocalFile()
+        self.ajouter_fichiers([url.toLocalFile() for url in event.mimeData().urls()])
+        event.acceptProposedAction()
+
+    def ajouter_fichiers(self, paths: List[str]):
+        nouveaux = []
+        for f in paths:
             if f.lower().endswith(".xlsx") and f not in self.files():
                 self.addItem(f)
-        event.acceptProposedAction()
+                nouveaux.append(f)
+        if nouveaux:
+            self.fichiers_ajoutes.emit(nouveaux)
+
+    def retirer_selection(self):
+        retires = []
+        for item in self.selectedItems():
+            retires.append(item.text())
+            self.takeItem(self.row(item))
+        if retires:
+            self.fichiers_retires.emit(retires)
 
     def files(self) -> List[str]:
         return [self.item(i).text() for i in range(self.count())]
 
+    def item_fichier(self, path: str):
+        for i in range(self.count()):
+            if self.item(i).text() == path:
+                return self.item(i)
+        return None
+
 
 
 # ---------------------------------------------------------------- MainWindow
 class MainWindow(QMainWindow):
+    scan_termine = pyqtSignal(str, object)  # (chemin affiché, Future) émis depuis le pool
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("ETL SIAMP — Fusion Excel")
         self.setWindowIcon(QIcon(ICON_PATH))
         self.resize(760, 640)
+        self.cache_feuilles = CacheFeuilles()  # partagé avec ETL_SIAMP.py (même dossier)
+        self.manifeste: dict[str, dict] = {}   # chemin absolu → entrée ETL_SIAMP_SCAN
+        # ➤ Pré-scan en arrière-plan des fichiers ajoutés (pool borné, processus séparés)
+        self.prescan = ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1))
+        self.scans: dict[str, Future] = {}     # chemin absolu → scan en cours
+        self.echecs: dict[str, str] = {}       # chemin absolu → erreur du processus de scan (non relancé)
+        self.actions_en_attente: set[str] = set()  # actions relancées à la fin des pré-scans
+        self.cache_taux = CacheTaux()          # réponses des fournisseurs de taux, transmises à ETL_SIAMP.py
+        self.currencyapi: FournisseurCurrencyAPI | None = None  # gardé : validateurs ETag / Last-Modified
+        self.scan_termine.connect(self._on_scan_termine)
         self._build_tabs()
         self._apply_style()
 
+    def closeEvent(self, event):
+        self.prescan.shutdown(wait=False, cancel_futures=True)
+        super().closeEvent(event)
+
+    # ---------------------------------------------------------------- pré-scan
+    def _prescanner(self, paths: list[str]):
+        for path in paths:
+            cle = os.path.abspath(path)
+            entree = self.manifeste.get(cle)
+            if entree is not None and est_a_jour(entree):
+                self._afficher_statut(path, entree)
+                continue
+            self.echecs.pop(cle, None)
+            self._afficher_statut(path, None)
+            try:
+                fut = self.prescan.submit(scanner_fichier, path, "stream", self.cache_feuilles)
+            except BrokenProcessPool:
+                # un processus du pool a été tué : nouveau pool, les scans suivants y repartent
+                self.prescan = ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1))
+                fut = self.prescan.submit(scanner_fichier, path, "stream", self.cache_feuilles)
+            self.scans[cle] = fut
+            fut.add_done_callback(lambda f, p=path: self.scan_termine.emit(p, f))
+
+    def _annuler_scans(self, paths: list[str]):
+        for path in paths:
+            fut = self.scans.pop(os.path.abspath(path), None)
+            if fut is not None:
+                fut.cancel()  # sans effet si le scan a démarré : son résultat sera ignoré
+
+    def _on_scan_termine(self, path: str, fut: Future):
+        cle = os.path.abspath(path)
+        if self.scans.get(cle) is not fut:
+            return  # fichier retiré entre-temps, ou résultat déjà pris en compte
+        del self.scans[cle]
+        if fut.cancelled():
+            return
+        try:
+            entree = fut.result()
+        except Exception as e:
+            self.echecs[cle] = str(e)
+            self._afficher_statut(path, {"erreur": str(e), "feuilles": []})
+            return
+        self.manifeste[cle] = entree
+        self._afficher_statut(path, entree)
+
+    def _afficher_statut(self, path: str, entree: dict | None):
+        item = self.lst_files.item_fichier(path)
+        if item is None:
+            return
+        if entree is None:
+            icone, info = QStyle.StandardPixmap.SP_BrowserReload, "Analyse en cours…"
+        elif entree["erreur"]:
+            icone, info = QStyle.StandardPixmap.SP_MessageBoxCritical, f"Illisible : {entree['erreur']}"
+        else:
+            turnover = [f for f in entree["feuilles"] if f["turnover"]]
+            rejets = [f["nom"] for f in turnover if not f["valide"]]
+            mois = sorted({m for f in entree["feuilles"] for m in f["mois"]})
+            devises = sorted({d for f in turnover for d in f["devises"]})
+            resume = (f"{sum(f['lignes'] for f in turnover)} lignes TURNOVER\n"
+                      f"Mois : {', '.join(mois) or '-'}\nDevises : {', '.join(devises) or '-'}")
+            if not turnover:
+                icone, info = QStyle.StandardPixmap.SP_MessageBoxWarning, "Aucune feuille TURNOVER"
+            elif rejets:
+                icone, info = QStyle.StandardPixmap.SP_MessageBoxWarning, f"Non conforme : {', '.join(rejets)}\n{resume}"
+            else:
+                icone, info = QStyle.StandardPixmap.SP_DialogApplyButton, resume
+        item.setIcon(self.style().standardIcon(icone))
+        item.setToolTip(info)
+
+    def _prescans_en_cours(self) -> bool:
+        return any(os.path.abspath(p) in self.scans for p in self.lst_files.files())
+
+    def _apres_prescans(self, action) -> bool:
+        """
+        Vrai si des fichiers de la liste sont encore en pré-scan : `action` est alors relancée
+        (une seule fois) dès leurs résultats reçus, vérifiés par QTimer sans bloquer la fenêtre.
+        Les fichiers absents du manifeste ou modifiés depuis leur scan sont renvoyés au pool,
+        sauf ceux dont le scan a échoué (signalés par `_scanner`).
+        """
+        a_relancer = [p for p in self.lst_files.files()
+                      if (cle := os.path.abspath(p)) not in self.scans and cle not in self.echecs
+                      and not (cle in self.manifeste and est_a_jour(self.manifeste[cle]))]
+        if a_relancer:
+            self._prescanner(a_relancer)
+        if not self._prescans_en_cours():
+            return False
+        if action.__name__ not in self.actions_en_attente:
+            self.actions_en_attente.add(action.__name__)
+            self.txt_log.appendPlainText("⏳ Analyse des fichiers en cours, l'action reprendra à la fin…")
+            QTimer.singleShot(ATTENTE_SCANS_MS, lambda: self._relancer(action))
+        return True
+
+    def _relancer(self, action):
+        if self._prescans_en_cours():
+            QTimer.singleShot(ATTENTE_SCANS_MS, lambda: self._relancer(action))
+            return
+        self.actions_en_attente.discard(action.__name__)
+        action()
+
+    def _scanner(self, files: list[str]) -> list[dict]:
+        """
+        Entrées de manifeste des fichiers (mois, devises, schéma), issues du pré-scan : à appeler
+        après `_apres_prescans`. Aucun fichier n'est lu ici, pour ne pas figer la fenêtre ;
+        ceux dont le scan a échoué sont signalés et ignorés.
+        """
+        entrees = []
+        for path in files:
+            cle = os.path.abspath(path)
+            e = self.manifeste.get(cle)
+            if e is None:
+                erreur = self.echecs.get(cle, "analyse non disponible")
+                self.txt_log.appendPlainText(f"[WARN] ⚠ Fichier ignoré : {cle} – {erreur}")
+                continue
+            if e["erreur"]:
+                self.txt_log.appendPlainText(f"[WARN] ⚠ Fichier ignoré : {e['fichier']} – {e['erreur']}")
+            entrees.append(e)
+        return entrees
+
     def _detect_months(self):
         from collections import defaultdict
         from PyQt6.QtWidgets import QDialog, QTreeWidget, QTreeWidgetItem, QVBoxLayout, QPushButton
@@ -156,21 +319,14 @@ class MainWindow(QMainWindow):
         if not files:
             QMessageBox.warning(self, "Erreur", "Ajoutez au moins un fichier Excel.")
             return
+        if self._apres_prescans(self._detect_months):
+            return
 
-        # ➤ Détection des dates dans les fichiers
-        for path in files:
-            try:
-                xls = pd.ExcelFile(path, engine="openpyxl")
-                for sh in xls.sheet_names:
-                    df = xls.parse(sh, usecols="A:Q")
-                    df.columns = [c.strip().upper() for c in df.columns]
-                    if "MONTH" in df.columns:
-                        mois = pd.to_datetime(df["MONTH"], errors="coerce").dt.to_period("M")
-                        mois_uniques = sorted(mois.dropna().unique())
-                        for m in mois_uniques:
-                            mois_detectés[str(m)].append(os.path.basename(path))
-            except Exception as e:
-                self.txt_log.appendPlainText(f"[WARN] ⚠ Fichier ignoré : {path} – {e}")
+        # ➤ Détection des dates dans les fichiers (manifeste du scan)
+        for entree in self._scanner(files):
+            for feuille in entree["feuilles"]:
+                for m in feuille["mois"]:
+                    mois_detectés[m].append(entree["nom"])
 
         if not mois_detectés:
             QMessageBox.information(self, "Info", "Aucune date détectée dans les fichiers.")
@@ -277,6 +433,11 @@ class MainWindow(QMainWindow):
         btn_out.clicked.connect(self._choose_historique_output)
         row_out.addWidget(self.txt_historique_out)
         row_out.addWidget(btn_out)
+        row_out.addWidget(QLabel("Découpage :"))
+        self.cmb_historique_partition = QComboBox()
+        for libelle, mode in PARTITIONS:
+            self.cmb_historique_partition.addItem(libelle, mode)
+        row_out.addWidget(self.cmb_historique_partition)
         layout.addLayout(row_out)
 
         # Barre de progression + bouton lancer
@@ -298,13 +459,10 @@ class MainWindow(QMainWindow):
 
     def _add_historique_files(self):
         files, _ = QFileDialog.getOpenFileNames(self, "Sélectionner fichiers historiques", "", "Excel (*.xlsx)")
-        for f in files:
-            if f not in self.lst_historique_files.files():
-                self.lst_historique_files.addItem(f)
+        self.lst_historique_files.ajouter_fichiers(files)
 
     def _remove_historique_files(self):
-        for item in self.lst_historique_files.selectedItems():
-            self.lst_historique_files.takeItem(self.lst_historique_files.row(item))
+        self.lst_historique_files.retirer_selection()
 
     def _choose_historique_output(self):
         path, _ = QFileDialog.getSaveFileName(self, "Fichier de sortie historique", self.txt_historique_out.text(), "Excel (*.xlsx)")
@@ -425,87 +583,29 @@ class MainWindow(QMainWindow):
             after = fusion.shape[0]
             print(f"[INFO] 🧹 {before - after} doublon(s) supprimé(s) après enrichissements", flush=True)
 
-            # ➤ Sauvegarde Excel
-            fusion.to_excel(out, index=False)
-
-
-            # Sauvegarder en Excel
-            fusion.to_excel(out, index=False)
-
-            # Appliquer le formatage Excel
-            wb = load_workbook(out)
-            ws = wb.active
-
-            # Définir la plage du tableau et créer une table formatée
-            last_col_letter = get_column_letter(ws.max_column)
-            last_row = ws.max_row
-            table_range = f"A1:{last_col_letter}{last_row}"
-
-            # Créer et appliquer la table avec style
-            table = Table(displayName="HistoriqueTable", ref=table_range)
-            table.tableStyleInfo = TableStyleInfo(
-                name="TableStyleMedium2",
-                showFirstColumn=False,
-                showLastColumn=False,
-                showRowStripes=True,
-                showColumnStripes=False
-            )
-            
-            # Supprimer toute table existante et ajouter la nouvelle
-            ws._tables.clear()
-            ws.add_table(table)
-
-            # Formater les colonnes spécifiques
-            for idx, column in enumerate(ws[1], 1):
-                col_letter = get_column_letter(idx)
-                
-                # Formater la colonne MONTH comme date
-                if column.value == "MONTH":
-                    for cell in ws[col_letter][1:]:  # Skip header
-                        if cell.value:
-                            try:
-                                # Convertir en date Excel
-                                date_val = pd.to_datetime(cell.value, format="%d/%m/%Y")
-                                cell.value = date_val
-                                cell.number_format = "dd/mm/yyyy"
-                            except:
-                                pass
-
-                # Formater uniquement la colonne "TURNOVER €" avec le symbole €
-                elif column.value == "TURNOVER €":
-                    for cell in ws[col_letter][1:]:
-                        if cell.value and isinstance(cell.value, (int, float)):
-                            cell.number_format = "#,##0.00 €"
-
-                # Formater les autres colonnes monétaires sans le symbole €
-                elif column.value in ["TURNOVER", "C.A en €", "VARIABLE COSTS", "COGS", "VAR Margin", "Margin"]:
-                    for cell in ws[col_letter][1:]:
-                        if cell.value and isinstance(cell.value, (int, float)):
-                            cell.number_format = "#,##0.00"
-
-                # Formater la colonne QUANTITY
-                elif column.value == "QUANTITY":
-                    for cell in ws[col_letter][1:]:
-                        if cell.value and isinstance(cell.value, (int, float)):
-                            cell.number_format = "#,##0"
-
-            # Figer la première ligne
-            ws.freeze_panes = "A2"
-
-            # Ajuster la largeur des colonnes
-            for column in ws.columns:
-                max_length = 0
-                column_letter = get_column_letter(column[0].column)
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = (max_length + 2)
-                ws.column_dimensions[column_letter].width = min(adjusted_width, 50)
-
-            wb.save(out)
+            # ➤ Sauvegarde Excel en un seul passage (ETL_SIAMP_ECRITURE) : table, formats, volet figé
+            #   et largeurs posés pendant l'écriture ; une feuille par année / mois au-delà de la
+            #   limite d'Excel (ou selon le découpage choisi), avec une feuille INDEX
+            if "MONTH" in fusion.columns:
+                dates = pd.to_datetime(fusion["MONTH"], format="%d/%m/%Y", errors="coerce")
+                fusion["MONTH"] = dates.astype(object).where(dates.notna(), fusion["MONTH"])
+            else:
+                dates = pd.Series(pd.NaT, index=fusion.index)
+            formats = {"MONTH": "dd/mm/yyyy", "TURNOVER €": "#,##0.00\u00a0€", "QUANTITY": "#,##0"}
+            formats.update({c: "#,##0.00" for c in ["TURNOVER", "C.A en €", "VARIABLE COSTS", "COGS", "VAR Margin", "Margin"]})
+            options = {"table": "HistoriqueTable", "style_table": "TableStyleMedium2", "figer": True, "largeur_max": 50}
+
+            classeur = classeur_sortie()
+            partitions = partitionner(dates, self.cmb_historique_partition.currentData())
+            if partitions:
+                ecrire_partitions(classeur, fusion, partitions, out, formats=formats,
+                                  totaux=["QUANTITY", "TURNOVER", "C.A en €", "VAR Margin", "Margin"], **options)
+                self.txt_log_historique.appendPlainText(
+                    f"🗂️ {len(partitions)} feuille(s) : " + ", ".join(f"{e} ({len(p)} lignes)" for e, p in partitions)
+                    + f" — récapitulatif dans la feuille « {FEUILLE_INDEX} »")
+            else:
+                ecrire_feuille(classeur, fusion, "Sheet1", formats=formats, **options)
+            classeur.save(out)
             self.txt_log_historique.appendPlainText(f"✅ Fusion terminée avec mise en forme optimisée. Fichier créé : {out}")
             self.pbar_historique.setValue(100)
         except Exception as e:
@@ -528,6 +628,13 @@ class MainWindow(QMainWindow):
         btn_rates = QPushButton("Charger taux")
         btn_rates.clicked.connect(self._load_rates)
         row_date.addWidget(btn_rates)
+        row_date.addWidget(QLabel("Taux appliqués :"))
+        self.cmb_mode_taux = QComboBox()
+        self.cmb_mode_taux.addItem("Taux unique à cette date", "date")
+        self.cmb_mode_taux.addItem("Taux BCE du mois de chaque ligne", "mois")
+        self.cmb_mode_taux.addItem("Moyenne mensuelle BCE de chaque ligne", "moyenne_mois")
+        self.cmb_mode_taux.addItem("Taux BCE de fin de mois de chaque ligne", "fin_mois")
+        row_date.addWidget(self.cmb_mode_taux)
         row_date.addStretch()
         layout.addLayout(row_date)
 
@@ -541,6 +648,8 @@ class MainWindow(QMainWindow):
         # Liste de fichiers
         layout.addWidget(QLabel("Fichiers Excel :"))
         self.lst_files = DropListWidget(on_click_callback=self._add_files)
+        self.lst_files.fichiers_ajoutes.connect(self._prescanner)
+        self.lst_files.fichiers_retires.connect(self._annuler_scans)
         layout.addWidget(self.lst_files)
 
         # Boutons Ajouter / Retirer
@@ -574,6 +683,17 @@ class MainWindow(QMainWindow):
         btn_out.clicked.connect(self._choose_output)
         row_out.addWidget(self.txt_out)
         row_out.addWidget(btn_out)
+        row_out.addWidget(QLabel("Lignes déjà consolidées :"))
+        self.cmb_historique = QComboBox()
+        self.cmb_historique.addItem("Signaler", "signaler")
+        self.cmb_historique.addItem("Remplacer", "remplacer")
+        self.cmb_historique.addItem("Ne pas vérifier", "aucun")
+        row_out.addWidget(self.cmb_historique)
+        row_out.addWidget(QLabel("Découpage :"))
+        self.cmb_partition = QComboBox()
+        for libelle, mode in PARTITIONS:
+            self.cmb_partition.addItem(libelle, mode)
+        row_out.addWidget(self.cmb_partition)
         layout.addLayout(row_out)
 
         # Barre de progression
@@ -616,13 +736,10 @@ class MainWindow(QMainWindow):
 
     def _add_files(self):
         files, _ = QFileDialog.getOpenFileNames(self, "Sélectionner fichiers", "", "Excel (*.xlsx)")
-        for f in files:
-            if f not in self.lst_files.files():
-                self.lst_files.addItem(f)
+        self.lst_files.ajouter_fichiers(files)
 
     def _remove_files(self):
-        for item in self.lst_files.selectedItems():
-            self.lst_files.takeItem(self.lst_files.row(item))
+        self.lst_files.retirer_selection()
 
     def _choose_output(self):
         path, _ = QFileDialog.getSaveFileName(self, "Fichier de sortie", self.txt_out.text(), "Excel (*.xlsx)")
@@ -631,24 +748,6 @@ class MainWindow(QMainWindow):
 
     def _run_etl(self):
         files = self.lst_files.files()
-        # ➤ Détecter tous les mois distincts présents dans les fichiers
-        from collections import defaultdict
-        mois_detectés = defaultdict(list)
-
-        for path in files:
-            try:
-                xls = pd.ExcelFile(path, engine="openpyxl")
-                for sh in xls.sheet_names:
-                    df = xls.parse(sh, usecols="A:Q")
-                    df.columns = [c.strip().upper() for c in df.columns]
-                    if "MONTH" in df.columns:
-                        mois = pd.to_datetime(df["MONTH"], errors="coerce").dt.to_period("M")
-                        mois_uniques = sorted(mois.dropna().unique())
-                        for m in mois_uniques:
-                            mois_detectés[str(m)].append(os.path.basename(path))
-            except Exception as e:
-                self.txt_log.appendPlainText(f"[WARN] ⚠ Fichier ignoré : {path} – {e}")
-
         if not files:
             return QMessageBox.warning(self, "Erreur", "Ajoutez au moins un fichier Excel.")
         out = self.txt_out.text().strip()
@@ -671,9 +770,30 @@ class MainWindow(QMainWindow):
             cmd += ["--taux_manuels", man]
         date_str = self.date_edit.date().toString("yyyy-MM-dd")
         cmd += ["--date", date_str]
+        cmd += ["--mode_taux", self.cmb_mode_taux.currentData()]
+        cmd += ["--historique", self.cmb_historique.currentData()]
+        cmd += ["--partition", self.cmb_partition.currentData()]
         if hasattr(self, "mois_selectionnes") and self.mois_selectionnes:
             cmd += ["--mois_selectionnes", ",".join(self.mois_selectionnes)]
+        cmd += ["--workers", str(min(4, os.cpu_count() or 1))]
 
+        # ➤ Taux déjà obtenus dans cette session : le script les reprend sans nouvelle requête
+        if len(self.cache_taux):
+            try:
+                self.cache_taux.sauvegarder(chemin_instantane())
+                cmd += ["--taux_instantane", chemin_instantane()]
+            except OSError as e:
+                self.txt_log.appendPlainText(f"[WARN] ⚠ Instantané des taux non écrit : {e}")
+
+        # ➤ Fichiers déjà scannés : le script reprend leur schéma au lieu de les rouvrir
+        connus = [self.manifeste[p] for p in map(os.path.abspath, files)
+                  if p in self.manifeste and est_a_jour(self.manifeste[p])]
+        if connus:
+            try:
+                ecrire_manifeste(chemin_manifeste(), connus)
+                cmd += ["--manifest", chemin_manifeste()]
+            except OSError as e:
+                self.txt_log.appendPlainText(f"[WARN] ⚠ Manifeste non écrit : {e}")
 
         env = dict(os.environ, GOOEY="0")
 
@@ -695,37 +815,36 @@ class MainWindow(QMainWindow):
             "Traitement terminé avec succès !" if ok else "Le script a échoué."
         )
 
+    def _fournisseur_currencyapi(self) -> FournisseurCurrencyAPI | None:
+        """Fournisseur currencyapi.net réutilisé d'un chargement à l'autre (GET conditionnel) ; recréé si la clé change."""
+        cle = cle_currencyapi()
+        if not cle:
+            self.currencyapi = None
+        elif self.currencyapi is None or self.currencyapi.cle != cle:
+            self.currencyapi = FournisseurCurrencyAPI(cle)
+        return self.currencyapi
+
     def _load_rates(self):
+        if self._apres_prescans(self._load_rates):
+            return
         try:
-            from datetime import datetime, timedelta
-            from ETL_SIAMP import get_ecb_rates
+            from ETL_SIAMP import get_ecb_cube
 
             date = self.date_edit.date().toString("yyyy-MM-dd")
-            limit_date = (datetime.strptime(date, "%Y-%m-%d") - timedelta(days=60)).strftime("%Y-%m-%d")
-            rates = get_ecb_rates(date)
-
-            # ➕ Ajouter manuellement les devises non couvertes par l'ECB
-            rates.update({
-                "MAD": 0.094,
-                "TND": 0.30,
-                "DZD": 0.0068,
-                "XOF": 0.0015
-            })
 
             # 🔎 Analyser les fichiers chargés pour détecter les devises utilisées
             devises_utilisées = set()
-            TURNOVER_SHEET = re.compile(r"^TURNOVER($|\s+[A-Z][a-z]{2}\s+\d{1,2}$)", re.I)
-            for i in range(self.lst_files.count()):
-                path = self.lst_files.item(i).text()
-                try:
-                    xls = pd.ExcelFile(path, engine="openpyxl")
-                    for sh in filter(TURNOVER_SHEET.match, xls.sheet_names):
-                        df = xls.parse(sh, usecols="A:Q")
-                        df.columns = [str(c).strip().upper() for c in df.columns]
-                        if "CURRENCY" in df.columns:
-                            devises_utilisées.update(df["CURRENCY"].dropna().astype(str).str.strip().str.upper())
-                except Exception as e:
-                    self.txt_log.appendPlainText(f"[WARN] ⚠ Impossible de lire {path} : {e}")
+            for entree in self._scanner(self.lst_files.files()):
+                for feuille in entree["feuilles"]:
+                    devises_utilisées.update(feuille["devises"])
+
+            # 🏦 BCE, puis currencyapi.net (si une clé est enregistrée), puis taux locaux
+            #    pour les devises non couvertes par l'ECB, interrogés en parallèle
+            fournisseurs = [FournisseurBCE(secours=TAUX_SECOURS)]
+            if self._fournisseur_currencyapi() is not None:
+                fournisseurs.append(self.currencyapi)
+            fournisseurs.append(FournisseurLocal(TAUX_COMPLEMENTAIRES))
+            rates, provenance = taux_fusionnes(fournisseurs, date, devises_utilisées or None, self.cache_taux)
 
             # 🖨️ Affichage dans la console de l'UI
             self.txt_log.appendPlainText(f"📅 Taux de change ECB au {date} :\n")
@@ -739,7 +858,8 @@ class MainWindow(QMainWindow):
             else:
                 for cur in sorted(devises_utilisées):
                     if cur in rates:
-                        self.txt_log.appendPlainText(f"  • {cur:<4} → {rates[cur]:.6f}")
+                        source = "" if provenance[cur] == "BCE" else f" ({provenance[cur]})"
+                        self.txt_log.appendPlainText(f"  • {cur:<4} → {rates[cur]:.6f}{source}")
                     elif cur in manuels:
                         self.txt_log.appendPlainText(f"  • {cur:<4} → {manuels[cur]:.6f} (manuel)")
                     else:
@@ -757,6 +877,17 @@ class MainWindow(QMainWindow):
                 # Mise à jour du champ texte
                 self.txt_manual.setText(",".join(f"{k}={v}" for k, v in manuels.items()))
 
+                # 📊 Cube mensuel du mois choisi (moyenne, fin de mois, min, max)
+                if self.cmb_mode_taux.currentData() in ("moyenne_mois", "fin_mois"):
+                    cube = get_ecb_cube(date, date)
+                    cube = cube[cube["devise"].isin(devises_utilisées)]
+                    self.txt_log.appendPlainText(f"\n📊 Taux mensuels BCE {date[:7]} (moyenne / fin de mois / min / max) :")
+                    for l in cube.itertuples(index=False):
+                        self.txt_log.appendPlainText(
+                            f"  • {l.devise:<4} → {l.moyenne:.6f} / {l.fin_mois:.6f} / {l.min:.6f} / {l.max:.6f}")
+                    if cube.empty:
+                        self.txt_log.appendPlainText("  • Aucun taux mensuel disponible pour ces devises.")
+
         except Exception as e:
             QMessageBox.critical(self, "Erreur", f"Erreur lors de la récupération ECB :\n{e}")
 
@@ -829,8 +960,7 @@ class MainWindow(QMainWindow):
         path, _ = QFileDialog.getOpenFileName(self, "Choisir ZONE AFFECTATION", "", "Excel (*.xlsx)")
         if path:
             try:
-                xls = pd.ExcelFile(path, engine="openpyxl")
-                if "ZONE AFFECTATION" in xls.sheet_names:
+                if "ZONE AFFECTATION" in noms_feuilles(path):
                     self.txt_zone_affectation.setText(path)
                     QMessageBox.information(self, "✅ Succès", f"Fichier validé : Feuille 'ZONE AFFECTATION' détectée.")
                 else:
@@ -843,8 +973,7 @@ class MainWindow(QMainWindow):
         path, _ = QFileDialog.getOpenFileName(self, "Choisir table", "", "Excel (*.xlsx)")
         if path:
             try:
-                xls = pd.ExcelFile(path, engine="openpyxl")
-                if "table" in xls.sheet_names:
+                if "table" in noms_feuilles(path):
                     self.txt_table_file.setText(path)
                     QMessageBox.information(self, "✅ Succès", f"Fichier validé : Feuille 'table' détectée.")
                 else:
@@ -858,6 +987,7 @@ class MainWindow(QMainWindow):
 # Lancement de l'application
 # --------------------------------------------------
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     if hasattr(Qt.ApplicationAttribute, "AA_EnableHighDpiScaling"):
         app.setAttribute(Qt.ApplicationAttribute.AA_EnableHighDpiScaling)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ETL_SIAMP_HISTORIQUE.py – index des clés métier déjà consolidées
+
+• Chaque exécution de ETL_SIAMP.py enregistre l'empreinte 64 bits de la clé métier
+  (MONTH, REFERENCE, CUSTOMER NAME, QUANTITY) de chaque ligne écrite, avec le fichier
+  de sortie qui la contient : base SQLite dans le dossier de l'application. Une clé
+  présente dans plusieurs sorties y est rattachée à chacune (table clé × exécution).
+• Les valeurs sont ramenées à une forme texte canonique avant hachage (10013000,
+  10013000.0 et "10013000" donnent la même clé) : l'empreinte ne dépend pas du type
+  qu'a pris la colonne d'une exécution à l'autre.
+• Une nouvelle exécution interroge l'index en bloc (table temporaire + jointure sur la
+  clé primaire) : coût proportionnel aux nouvelles lignes, sans relire les sorties passées.
+• Clés déjà consolidées : « signaler » ou « remplacer » (lignes gardées dans les deux cas,
+  listées avec la sortie précédente la plus récente qui les contient). Réécrire un fichier
+  de sortie remplace ses seules clés : celles que d'autres sorties contiennent restent connues.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from ETL_SIAMP_CACHE import dossier_application
+from ETL_SIAMP_DOUBLONS import COLONNES_ORIGINE, empreintes
+from ETL_SIAMP_NORMALISATION import par_valeurs_uniques
+
+MODES_HISTORIQUE = ["signaler", "remplacer", "aucun"]
+VERSION_INDEX = 2  # 2 : clés rattachées à chaque sortie qui les contient (une seule auparavant)
+FEUILLE_CHEVAUCHEMENTS = "DÉJÀ CONSOLIDÉES"
+TAILLE_LOT = 50_000
+
+
+# ------------------------------------------------------------------ clés canoniques
+def valeur_canonique(v) -> str | None:
+    """Forme texte d'une valeur de clé, indépendante du type de la colonne ; manquant → None."""
+    if v is None or (not isinstance(v, str) and pd.isna(v)):
+        return None
+    if isinstance(v, (np.datetime64, datetime, date)):
+        return pd.Timestamp(v).isoformat()
+    if isinstance(v, (bool, np.bool_)):
+        return str(bool(v))
+    if isinstance(v, (int, np.integer)):
+        return str(int(v))
+    if isinstance(v, (float, np.floating)):
+        return str(int(v)) if float(v).is_integer() else repr(float(v))
+    return str(v)
+
+
+def cles_historique(df: pd.DataFrame, colonnes: list[str]) -> np.ndarray:
+    """Empreinte int64 (signée, pour SQLite) de la clé canonique de chaque ligne."""
+    canon = pd.DataFrame({col: par_valeurs_uniques(df[col], valeur_canonique).astype(object)
+                          for col in colonnes if col in df.columns})
+    return empreintes(canon).view(np.int64)
+
+
+def mois_lignes(df: pd.DataFrame) -> np.ndarray:
+    """Mois « YYYY-MM » de chaque ligne (None si MONTH absent ou non daté)."""
+    if "MONTH" not in df.columns or not pd.api.types.is_datetime64_any_dtype(df["MONTH"]):
+        return np.full(len(df), None, dtype=object)
+    return df["MONTH"].dt.strftime("%Y-%m").to_numpy(dtype=object)
+
+
+def _chemin_sortie(sortie: str) -> str:
+    return os.path.normcase(os.path.abspath(sortie))
+
+
+# ------------------------------------------------------------------ index persistant
+class IndexHistorique:
+    """Empreintes des clés métier écrites par les exécutions précédentes."""
+
+    def __init__(self, chemin: str | None = None):
+        self.chemin = chemin or os.path.join(dossier_application(), "historique_cles.sqlite")
+        os.makedirs(os.path.dirname(self.chemin) or ".", exist_ok=True)
+        self.cnx = sqlite3.connect(self.chemin, timeout=30)
+        self.cnx.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            PRAGMA temp_store = MEMORY;
+            PRAGMA cache_size = -65536;
+            CREATE TABLE IF NOT EXISTS executions (
+                id     INTEGER PRIMARY KEY,
+                date   TEXT NOT NULL,
+                sortie TEXT NOT NULL,
+                lignes INTEGER NOT NULL
+            );
+        """)
+        if self.cnx.execute("PRAGMA user_version").fetchone()[0] < VERSION_INDEX:
+            self._migrer()
+
+    def _migrer(self) -> None:
+        """Schéma clé × exécution ; les clés d'un index v1 gardent leur unique exécution."""
+        with self.cnx:
+            ancienne = self.cnx.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cles'").fetchone()
+            if ancienne:
+                self.cnx.execute("DROP INDEX IF EXISTS cles_execution")
+                self.cnx.execute("ALTER TABLE cles RENAME TO cles_v1")
+            self.cnx.execute("""
+                CREATE TABLE cles (
+                    empreinte INTEGER NOT NULL,
+                    execution INTEGER NOT NULL,
+                    mois      TEXT,
+                    PRIMARY KEY (empreinte, execution)
+                ) WITHOUT ROWID
+            """)
+            self.cnx.execute("CREATE INDEX cles_execution ON cles (execution)")
+            if ancienne:
+                self.cnx.execute("INSERT INTO cles SELECT empreinte, execution, mois FROM cles_v1")
+                self.cnx.execute("DROP TABLE cles_v1")
+            self.cnx.execute(f"PRAGMA user_version = {VERSION_INDEX}")
+
+    def __len__(self) -> int:
+        """Nombre de clés distinctes connues."""
+        return self.cnx.execute("SELECT COUNT(DISTINCT empreinte) FROM cles").fetchone()[0]
+
+    def _charger(self, cles: np.ndarray) -> None:
+        """Clés de l'exécution courante dans une table temporaire (une ligne par clé distincte)."""
+        self.cnx.execute("CREATE TEMP TABLE IF NOT EXISTS nouvelles (empreinte INTEGER PRIMARY KEY) WITHOUT ROWID")
+        self.cnx.execute("DELETE FROM nouvelles")
+        distinctes = np.unique(cles).tolist()  # triées : insertions en fin d'arbre B
+        for i in range(0, len(distinctes), TAILLE_LOT):
+            self.cnx.executemany("INSERT INTO nouvelles VALUES (?)", ((c,) for c in distinctes[i:i + TAILLE_LOT]))
+
+    # ------------------------------------------------------------------ lecture
+    def chevauchements(self, cles: np.ndarray, sortie: str) -> np.ndarray:
+        """
+        Pour chaque ligne, identifiant de la dernière exécution ayant déjà consolidé sa clé (0 sinon).
+        Les exécutions ayant écrit `sortie` sont ignorées : ce fichier va être réécrit.
+        """
+        self._charger(cles)
+        trouvees = self.cnx.execute("""
+            SELECT n.empreinte, MAX(c.execution)
+            FROM nouvelles n
+            CROSS JOIN cles c ON c.empreinte = n.empreinte  -- impose le parcours des seules nouvelles clés
+            JOIN executions e ON e.id = c.execution
+            WHERE e.sortie != ?
+            GROUP BY n.empreinte
+        """, (_chemin_sortie(sortie),)).fetchall()
+        self.cnx.execute("DELETE FROM nouvelles")
+        self.cnx.commit()
+        if not trouvees:
+            return np.zeros(len(cles), dtype=np.int64)
+        empreintes_trouvees, executions = map(np.array, zip(*trouvees))
+        position = pd.Index(empreintes_trouvees).get_indexer(cles)
+        return np.where(position >= 0, executions[position], 0)
+
+    def executions(self, ids) -> pd.DataFrame:
+        """date et fichier de sortie des exécutions demandées, indexés par identifiant."""
+        ids = sorted({int(i) for i in ids})
+        lignes = self.cnx.execute(
+            f"SELECT id, date, sortie FROM executions WHERE id IN ({','.join('?' * len(ids))})", ids
+        ).fetchall() if ids else []
+        return pd.DataFrame(lignes, columns=["id", "date", "sortie"]).set_index("id")
+
+    # ------------------------------------------------------------------ écriture
+    def enregistrer(self, cles: np.ndarray, mois: np.ndarray, sortie: str) -> int:
+        """
+        Enregistre les clés écrites dans `sortie` et renvoie l'identifiant de l'exécution.
+        Les clés d'une écriture précédente de `sortie` sont retirées ; celles des autres
+        sorties sont conservées, même partagées.
+        """
+        sortie = _chemin_sortie(sortie)
+        with self.cnx:
+            anciennes = [i for (i,) in self.cnx.execute("SELECT id FROM executions WHERE sortie = ?", (sortie,))]
+            for i in anciennes:
+                self.cnx.execute("DELETE FROM cles WHERE execution = ?", (i,))
+                self.cnx.execute("DELETE FROM executions WHERE id = ?", (i,))
+            execution = self.cnx.execute(
+                "INSERT INTO executions (date, sortie, lignes) VALUES (?, ?, ?)",
+                (datetime.now().isoformat(timespec="seconds"), sortie, len(cles)),
+            ).lastrowid
+            ordre = np.argsort(cles, kind="stable")  # triées : insertions en fin d'arbre B
+            lignes = list(zip(cles[ordre].tolist(), mois[ordre].tolist()))
+            for i in range(0, len(lignes), TAILLE_LOT):
+                self.cnx.executemany("INSERT OR IGNORE INTO cles (empreinte, execution, mois) VALUES (?, ?, ?)",
+                                     ((c, execution, m) for c, m in lignes[i:i + TAILLE_LOT]))
+        return execution
+
+    def close(self) -> None:
+        self.cnx.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ------------------------------------------------------------------ rapport
+def rapport_chevauchements(df: pd.DataFrame, executions_precedentes: np.ndarray, infos: pd.DataFrame,
+                           detail: list[str]) -> pd.DataFrame:
+    """Une ligne par ligne déjà consolidée : origine, colonnes de détail, sortie et date précédentes."""
+    positions = np.flatnonzero(executions_precedentes)
+    precedentes = infos.reindex(executions_precedentes[positions])
+    rapport = {col: df[col].iloc[positions].to_numpy() for col in COLONNES_ORIGINE + detail if col in df.columns}
+    rapport["SORTIE PRÉCÉDENTE"] = precedentes["sortie"].to_numpy()
+    rapport["CONSOLIDÉE LE"] = precedentes["date"].to_numpy()
+    return pd.DataFrame(rapport)
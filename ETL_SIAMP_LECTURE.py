@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ETL_SIAMP_LECTURE.py – lecture des feuilles TURNOVER
+
+• Lecteur "stream" : openpyxl read_only + values_only, colonnes A:Q remplies
+  directement dans des tampons typés (float64 tant que possible).
+• Lecteur "pandas" : l'ancien chemin pd.ExcelFile.parse(usecols="A:Q").
+• Les deux lecteurs renvoient le même DataFrame (mêmes noms de colonnes,
+  mêmes dtypes, mêmes valeurs manquantes) : comme pandas, une ligne n'est vide
+  que si toutes ses cellules le sont (y compris au-delà de Q), les lignes vides
+  intercalées deviennent des lignes NaN et seul le bloc vide final est ignoré.
+"""
+from __future__ import annotations
+import math
+from array import array
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from ETL_SIAMP_META import noms_feuilles
+
+LECTEURS = ("stream", "pandas")
+VERSION_LECTEUR = 2          # à incrémenter si le DataFrame produit change
+NB_COLONNES = 17             # A:Q
+
+# Valeurs lues comme manquantes par pandas (na_values par défaut) + erreurs Excel
+VALEURS_NA = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a",
+    "nan", "null",
+    "#DIV/0!", "#NAME?", "#NULL!", "#NUM!", "#REF!", "#VALUE!",
+}
+_ENTIER_MAX = 2 ** 53
+
+
+class _Tampon:
+    """Tampon de colonne : float64 compact tant que la colonne est numérique, liste sinon."""
+    __slots__ = ("nums", "objs", "entiers")
+
+    def __init__(self, nb_vides: int = 0):
+        self.nums: array | None = array("d", [math.nan]) * nb_vides
+        self.objs: list | None = None
+        self.entiers = True
+
+    def ajouter(self, v) -> None:
+        if self.objs is not None:
+            self.objs.append(v)
+            return
+        t = type(v)
+        if v is None:
+            self.nums.append(math.nan)
+        elif t is float:
+            self.nums.append(v)
+            if self.entiers and not v.is_integer():
+                self.entiers = False
+        elif t is int and -_ENTIER_MAX < v < _ENTIER_MAX:
+            self.nums.append(v)
+        elif t is str and not v:
+            self.nums.append(math.nan)
+        else:
+            # première valeur non numérique : bascule en liste d'objets
+            self.objs = [None if x != x else (int(x) if x.is_integer() else x) for x in self.nums]
+            self.objs.append(v)
+            self.nums = None
+
+    def vers_tableau(self):
+        if self.objs is None:
+            valeurs = np.frombuffer(self.nums, dtype=np.float64)
+            if self.entiers and not np.isnan(valeurs).any():
+                return valeurs.astype(np.int64)
+            return valeurs
+        valeurs = np.empty(len(self.objs), dtype=object)
+        for i, v in enumerate(self.objs):
+            if v is None or (type(v) is str and v in VALEURS_NA):
+                v = np.nan
+            elif type(v) is float and v.is_integer():
+                v = int(v)
+            valeurs[i] = v
+        try:
+            # même inférence que le parseur pandas : "12" → 12, True/NaN → 1.0/NaN
+            return pd.to_numeric(valeurs)
+        except (ValueError, TypeError):
+            return valeurs
+
+
+def _noms_colonnes(entete: tuple, nb: int) -> list[str]:
+    noms: list[str] = []
+    vus: dict[str, int] = {}
+    for i in range(nb):
+        v = entete[i] if i < len(entete) else None
+        if isinstance(v, float) and v.is_integer():
+            v = int(v)
+        nom = f"Unnamed: {i}" if v is None or v == "" else str(v)
+        if nom in vus:
+            vus[nom] += 1
+            nom = f"{nom}.{vus[nom]}"
+        else:
+            vus[nom] = 0
+        noms.append(nom)
+    return noms
+
+
+def _largeur_entete(entete: tuple) -> int:
+    n = len(entete)
+    while n and (entete[n - 1] is None or entete[n - 1] == ""):
+        n -= 1
+    return n
+
+
+def lire_entete_stream(ws, nb_colonnes: int = NB_COLONNES) -> list[str]:
+    """Noms de colonnes de la feuille (première ligne uniquement), nommés comme lire_feuille_stream."""
+    entete = next(ws.iter_rows(min_row=1, max_row=1, max_col=nb_colonnes, values_only=True), ())
+    return _noms_colonnes(entete, _largeur_entete(entete))
+
+
+def lire_feuille_stream(ws, nb_colonnes: int = NB_COLONNES) -> pd.DataFrame:
+    """
+    Lit une feuille openpyxl ouverte en read_only ligne par ligne (values_only),
+    colonnes 1 à nb_colonnes. Les lignes vides intercalées sont conservées (NaN),
+    seules les lignes vides de fin de feuille sont ignorées.
+    """
+    if hasattr(ws, "reset_dimensions"):
+        ws.reset_dimensions()  # <dimension> souvent fausse dans les exports
+    # toutes les colonnes sont lues : une cellule au-delà de Q suffit à rendre la ligne non vide
+    lignes = ws.iter_rows(values_only=True)
+    entete = next(lignes, None)
+    if entete is None:
+        return pd.DataFrame()
+    entete = entete[:nb_colonnes]
+
+    tampons: list[_Tampon] = []
+    nb_lignes = 0
+    vides = 0        # lignes vides en attente : écrites (NaN) seulement si des données suivent
+    for ligne in lignes:
+        # largeur utile de la ligne (cellules vides de fin ignorées)
+        n = len(ligne)
+        while n and (ligne[n - 1] is None or ligne[n - 1] == ""):
+            n -= 1
+        if not n:
+            vides += 1
+            continue
+        if vides:
+            for t in tampons:
+                for _ in range(vides):
+                    t.ajouter(None)
+            nb_lignes += vides
+            vides = 0
+        n = min(n, nb_colonnes)
+        while len(tampons) < n:
+            tampons.append(_Tampon(nb_lignes))
+        for i in range(n):
+            tampons[i].ajouter(ligne[i])
+        for t in tampons[n:]:
+            t.ajouter(None)
+        nb_lignes += 1
+
+    largeur = max(len(tampons), _largeur_entete(entete))
+    while len(tampons) < largeur:
+        tampons.append(_Tampon(nb_lignes))
+    noms = _noms_colonnes(entete, largeur)
+    return pd.DataFrame({nom: t.vers_tableau() for nom, t in zip(noms, tampons)})
+
+
+def lire_colonnes_stream(ws, positions: list[int]) -> pd.DataFrame:
+    """
+    Comme pd.read_excel(feuille).iloc[:, positions] sans construire les autres colonnes :
+    une ligne n'est vide que si toutes ses cellules le sont (pas seulement celles retenues).
+    Les positions au-delà de la dernière colonne de la feuille sont ignorées.
+    """
+    if hasattr(ws, "reset_dimensions"):
+        ws.reset_dimensions()
+    lignes = ws.iter_rows(values_only=True)
+    entete = next(lignes, None)
+    if entete is None:
+        return pd.DataFrame()
+
+    tampons = {p: _Tampon() for p in positions}
+    largeur = _largeur_entete(entete)
+    vides = 0
+    for ligne in lignes:
+        n = len(ligne)
+        while n and (ligne[n - 1] is None or ligne[n - 1] == ""):
+            n -= 1
+        if not n:
+            vides += 1
+            continue
+        for _ in range(vides):
+            for t in tampons.values():
+                t.ajouter(None)
+        vides = 0
+        largeur = max(largeur, n)
+        for p, t in tampons.items():
+            t.ajouter(ligne[p] if p < n else None)
+
+    noms = _noms_colonnes(entete, largeur)
+    return pd.DataFrame({noms[p]: tampons[p].vers_tableau() for p in positions if p < largeur})
+
+
+class Classeur:
+    """
+    Classeur ouvert avec l'un des lecteurs ; à utiliser comme gestionnaire de contexte.
+    La liste des feuilles est lue dans l'archive zip (ETL_SIAMP_META) ; avec un
+    CacheFeuilles, le fichier Excel n'est ouvert que si une feuille manque dans le cache.
+    """
+
+    def __init__(self, path: str, lecteur: str = "stream", cache=None):
+        if lecteur not in LECTEURS:
+            raise ValueError(f"Lecteur inconnu : {lecteur} (attendu : {', '.join(LECTEURS)})")
+        self.path = path
+        self.lecteur = lecteur
+        self.cache = cache if cache is not None and cache.actif else None
+        self.depuis_cache = False   # la dernière feuille lue vient-elle du cache ?
+        self._xls = None
+        self._wb = None
+        try:
+            self.feuilles = noms_feuilles(path)
+        except Exception:
+            self._ouvrir()  # archive atypique : on laisse openpyxl trancher
+
+    def _ouvrir(self) -> None:
+        if self.lecteur == "pandas":
+            self._xls = pd.ExcelFile(self.path, engine="openpyxl")
+            self.feuilles = list(self._xls.sheet_names)
+        else:
+            self._wb = load_workbook(self.path, read_only=True, data_only=True, keep_links=False)
+            self.feuilles = list(self._wb.sheetnames)
+
+    def entete(self, feuille: str) -> list[str]:
+        """En-têtes A:Q de la feuille sans lire les données (schéma du cache si disponible)."""
+        if self.cache:
+            colonnes = self.cache.lire_colonnes(self.path, feuille, self.lecteur)
+            if colonnes is not None:
+                return colonnes
+        if self._xls is None and self._wb is None:
+            self._ouvrir()
+        if self.lecteur == "pandas":
+            return list(self._xls.parse(feuille, usecols="A:Q", nrows=0).columns)
+        return lire_entete_stream(self._wb[feuille])
+
+    def lire(self, feuille: str) -> pd.DataFrame:
+        if self.cache:
+            df = self.cache.lire(self.path, feuille, self.lecteur)
+            if df is not None:
+                self.depuis_cache = True
+                return df
+        self.depuis_cache = False
+        if self._xls is None and self._wb is None:
+            self._ouvrir()
+        if self.lecteur == "pandas":
+            df = self._xls.parse(feuille, usecols="A:Q")
+        else:
+            df = lire_feuille_stream(self._wb[feuille])
+        if self.cache:
+            self.cache.ecrire(self.path, feuille, self.lecteur, df)
+        return df
+
+    def close(self) -> None:
+        if self._xls is not None:
+            self._xls.close()
+        if self._wb is not None:
+            self._wb.close()
+
+    def __enter__(self) -> "Classeur":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ETL_SIAMP_META.py – métadonnées d'un classeur .xlsx sans le charger
+
+• Noms des feuilles lus dans xl/workbook.xml (+ xl/_rels/workbook.xml.rels).
+• Étendue de chaque feuille lue dans sa balise <dimension> : seul le début
+  du XML de la feuille est décompressé, la lecture s'arrête avant <sheetData>.
+"""
+from __future__ import annotations
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_REF = re.compile(r"^\$?([A-Z]+)\$?(\d+)(?::\$?([A-Z]+)\$?(\d+))?$")
+
+
+def _colonne_vers_index(lettres: str) -> int:
+    n = 0
+    for c in lettres:
+        n = n * 26 + ord(c) - 64
+    return n
+
+
+def taille_plage(ref: str | None) -> tuple[int, int] | None:
+    """"A1:Q301" → (301 lignes, 17 colonnes) ; None si la plage est absente ou illisible."""
+    m = _REF.match(ref or "")
+    if not m:
+        return None
+    c1, l1, c2, l2 = m.groups()
+    if c2 is None:
+        c2, l2 = c1, l1
+    return int(l2) - int(l1) + 1, _colonne_vers_index(c2) - _colonne_vers_index(c1) + 1
+
+
+def _feuilles_declarees(z: zipfile.ZipFile) -> list[tuple[str, str]]:
+    """[(nom, chemin dans l'archive)] dans l'ordre du classeur."""
+    cibles: dict[str, str] = {}
+    try:
+        rels = ET.fromstring(z.read("xl/_rels/workbook.xml.rels"))
+        for rel in rels.iter(f"{NS_PKG}Relationship"):
+            cible = rel.get("Target", "")
+            if cible.startswith("/"):
+                cible = cible.lstrip("/")
+            else:
+                cible = posixpath.normpath(posixpath.join("xl", cible))
+            cibles[rel.get("Id")] = cible
+    except KeyError:
+        pass
+    wb = ET.fromstring(z.read("xl/workbook.xml"))
+    return [(s.get("name"), cibles.get(s.get(f"{NS_REL}id"), ""))
+            for s in wb.iter(f"{NS_MAIN}sheet")]
+
+
+def _lire_dimension(z: zipfile.ZipFile, chemin: str) -> str | None:
+    try:
+        flux = z.open(chemin)
+    except KeyError:
+        return None
+    with flux:
+        for _, elem in ET.iterparse(flux, events=("start",)):
+            if elem.tag == f"{NS_MAIN}dimension":
+                return elem.get("ref")
+            if elem.tag == f"{NS_MAIN}sheetData":
+                return None
+    return None
+
+
+def noms_feuilles(path: str) -> list[str]:
+    """Noms des feuilles du classeur, sans ouvrir les feuilles elles-mêmes."""
+    with zipfile.ZipFile(path) as z:
+        return [nom for nom, _ in _feuilles_declarees(z)]
+
+
+def lister_feuilles(path: str, filtre=None) -> list[dict]:
+    """
+    Feuilles du classeur (éventuellement filtrées par `filtre(nom) -> bool`) avec leur étendue :
+    {"nom", "plage", "lignes", "colonnes"} ; lignes/colonnes valent None sans <dimension>.
+    """
+    infos = []
+    with zipfile.ZipFile(path) as z:
+        for nom, chemin in _feuilles_declarees(z):
+            if filtre is not None and not filtre(nom):
+                continue
+            plage = _lire_dimension(z, chemin) if chemin else None
+            taille = taille_plage(plage)
+            infos.append({
+                "nom": nom,
+                "plage": plage,
+                "lignes": taille[0] if taille else None,
+                "colonnes": taille[1] if taille else None,
+            })
+    return infos
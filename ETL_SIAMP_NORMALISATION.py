@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ETL_SIAMP_NORMALISATION.py – nettoyage des chaînes sur les valeurs distinctes
+
+• Chaque transformation (nettoyage, strip/upper…) est évaluée une seule fois par
+  valeur distincte d'une colonne (factorize → transformation → ré-indexation)
+  au lieu d'une fois par cellule.
+• La suppression des caractères invisibles passe par str.translate avec une
+  table construite à la demande, à la place de re.sub cellule par cellule.
+• Le résultat est identique, valeur par valeur et type par type, à celui de la
+  transformation appliquée à la colonne entière.
+"""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+
+class TableSuppression(dict):
+    """
+    Table str.translate qui supprime les caractères hors des plages conservées.
+    Chaque point de code n'est examiné qu'une fois (__missing__), puis mémorisé.
+    """
+
+    def __init__(self, plages: list[tuple[int, int]]):
+        super().__init__()
+        self.plages = plages
+
+    def __missing__(self, code: int):
+        garde = any(debut <= code <= fin for debut, fin in self.plages)
+        self[code] = code if garde else None
+        return self[code]
+
+
+# équivalent de re.sub(r'[^\x20-\x7E\u00A0-\uFFFF]', '', s)
+INVISIBLES = TableSuppression([(0x20, 0x7E), (0xA0, 0xFFFF)])
+# équivalent de re.sub(r'[^\x09\x0A\x0D\x20-\x7E\u00A0-\uFFFF]', '', s) : tabulations et retours conservés
+INVISIBLES_HORS_BLANCS = TableSuppression([(0x09, 0x0A), (0x0D, 0x0D), (0x20, 0x7E), (0xA0, 0xFFFF)])
+
+
+# ------------------------------------------------------------------ transformations (valeur par valeur)
+def nettoyer_str(s):
+    """strip + majuscules + suppression des caractères invisibles ; manquant → None."""
+    if pd.isna(s):
+        return None
+    if isinstance(s, str):
+        return s.strip().upper().translate(INVISIBLES)
+    return s
+
+
+def nettoyer_invisibles(x):
+    """Suppression des caractères invisibles (hors tabulations et retours à la ligne)."""
+    return x.translate(INVISIBLES_HORS_BLANCS) if isinstance(x, str) else x
+
+
+def majuscules(v) -> str:
+    """Équivalent cellule de .astype(str).str.strip().str.upper()"""
+    return str(v).strip().upper()
+
+
+def majuscules_sans_vides(v) -> str:
+    """Équivalent cellule de .fillna("").astype(str).str.strip().str.upper()"""
+    return "" if pd.isna(v) else str(v).strip().upper()
+
+
+def strip_majuscules(v):
+    """Équivalent cellule de .str.strip().str.upper() : manquants conservés, non-texte → NaN."""
+    if isinstance(v, str):
+        return v.strip().upper()
+    return v if pd.isna(v) else np.nan
+
+
+# équivalents « colonne entière », utilisés tels quels quand une colonne objet ne contient
+# aucune chaîne (pandas peut alors réinférer son type, ex. fillna("") sur des nombres)
+EQUIVALENTS_COLONNE = {
+    majuscules: lambda serie: serie.astype(str).str.strip().str.upper(),
+    majuscules_sans_vides: lambda serie: serie.fillna("").astype(str).str.strip().str.upper(),
+    strip_majuscules: lambda serie: serie.str.strip().str.upper(),
+}
+
+
+def _colonne_entiere(serie: pd.Series, fn) -> pd.Series:
+    equivalent = EQUIVALENTS_COLONNE.get(fn)
+    return equivalent(serie) if equivalent else serie.apply(fn)
+
+
+# ------------------------------------------------------------------ application par valeurs distinctes
+def par_valeurs_uniques(serie: pd.Series, fn) -> pd.Series:
+    """
+    Équivalent de serie.apply(fn), fn n'étant évaluée qu'une fois par valeur distincte.
+    Les colonnes catégorielles restent catégorielles ; pour une colonne objet, seules
+    les chaînes sont dédoublonnées (1, 1.0 et True ne sont pas confondus), les autres
+    valeurs passent une à une dans fn.
+    """
+    if len(serie) == 0:
+        return _colonne_entiere(serie, fn)
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return _par_categories(serie, fn)
+
+    valeurs = serie.to_numpy()
+    if serie.dtype == object:
+        if pd.api.types.infer_dtype(valeurs, skipna=True) == "string":
+            dedoublonnables = ~pd.isna(valeurs)
+        else:
+            dedoublonnables = np.fromiter((type(v) is str for v in valeurs), dtype=bool, count=len(valeurs))
+        if not dedoublonnables.any():
+            return _colonne_entiere(serie, fn)
+    else:
+        dedoublonnables = ~pd.isna(valeurs)
+
+    sortie = np.empty(len(valeurs), dtype=object)
+    if dedoublonnables.any():
+        codes, uniques = pd.factorize(valeurs[dedoublonnables])
+        sortie[dedoublonnables] = _appeler(fn, uniques)[codes]
+    reste = ~dedoublonnables
+    if reste.any():
+        sortie[reste] = _appeler(fn, valeurs[reste])
+
+    if not any(type(v) is str for v in sortie):
+        # aucune chaîne en sortie : on laisse pandas inférer le type comme sur la colonne entière
+        return _colonne_entiere(serie, fn)
+    return pd.Series(sortie, index=serie.index, name=serie.name)
+
+
+def _appeler(fn, valeurs) -> np.ndarray:
+    sortie = np.empty(len(valeurs), dtype=object)
+    sortie[:] = [fn(v) for v in valeurs]
+    return sortie
+
+
+def _par_categories(serie: pd.Series, fn) -> pd.Series:
+    categories = serie.cat.categories
+    codes = serie.cat.codes.to_numpy()
+    nouvelles = [fn(c) for c in categories]
+    if (codes < 0).any():
+        nouvelles.append(fn(np.nan))  # valeur produite pour les manquants
+        codes = np.where(codes < 0, len(categories), codes)
+    correspondance, uniques = pd.factorize(pd.Series(nouvelles, dtype=object))
+    return pd.Series(pd.Categorical.from_codes(correspondance[codes], categories=uniques),
+                     index=serie.index, name=serie.name)
+
+
+def normaliser(df: pd.DataFrame, fn, colonnes=None) -> pd.DataFrame:
+    """Applique fn (par valeurs distinctes) aux colonnes texte/catégorielles de df, en place."""
+    if colonnes is None:
+        colonnes = df.select_dtypes(include=["object", "category"]).columns
+    for col in colonnes:
+        df[col] = par_valeurs_uniques(df[col], fn)
+    return df
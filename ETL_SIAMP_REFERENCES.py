@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ETL_SIAMP_REFERENCES.py – tables de correspondance compilées (table, ZONE AFFECTATION)
+
+• Le classeur de référence (STATS…) est ouvert une seule fois, même quand ref_files.cfg
+  désigne le même fichier pour « table » et « ZONE AFFECTATION », et seules les colonnes
+  utilisées sont construites : table O, Q, V, W ; ZONE AFFECTATION A, E.
+• Les clés sont normalisées et dédoublonnées exactement comme le faisait ETL_SIAMP.py :
+  majuscules, keep="last" sur REFERENCE, puis sur V parmi les lignes gardées.
+• Les tables compilées sont stockées en Parquet (CacheFeuilles, dossier « references »),
+  invalidées par taille + mtime du classeur : les exécutions suivantes les relisent
+  en quelques millisecondes sans ouvrir le fichier Excel.
+"""
+from __future__ import annotations
+
+import os
+from time import perf_counter
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from ETL_SIAMP_CACHE import CacheFeuilles, dossier_application
+from ETL_SIAMP_LECTURE import lire_colonnes_stream
+from ETL_SIAMP_NORMALISATION import majuscules, par_valeurs_uniques
+
+VERSION_REFERENCES = 2      # à incrémenter si les tables compilées changent
+FEUILLE_TABLE = "table"
+FEUILLE_ZONES = "ZONE AFFECTATION"
+COLONNES_TABLE = [14, 16, 21, 22]   # O = REFERENCE, Q = Sur-famille, V = clé enseigne, W = Enseigne ret
+COLONNES_ZONES = [0, 4]             # A = PAYS, E = Zone commerciale
+LECTEUR = f"references-v{VERSION_REFERENCES}"
+
+
+class References:
+    """Tables de correspondance prêtes à fusionner (None si la référence n'a pas pu être chargée)."""
+
+    def __init__(self):
+        self.sur_famille: pd.DataFrame | None = None   # REFERENCE → Sur-famille
+        self.enseigne: pd.DataFrame | None = None      # concat_key → Enseigne ret
+        self.zones: pd.DataFrame | None = None         # PAYS → COMMERCIAL AREA
+        self.doublons_reference = 0
+        self.doublons_enseigne = 0
+
+
+# ------------------------------------------------------------------ compilation
+def compiler_table(brut: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Colonnes O, Q, V, W de « table » → (sur_famille, enseigne, comptes)."""
+    o, q, v, w = brut.columns
+    table = pd.DataFrame({
+        "REFERENCE": par_valeurs_uniques(brut[o], majuscules),
+        "Sur-famille": par_valeurs_uniques(brut[q], majuscules),
+        "V": brut[v],
+        "W": brut[w],
+    })
+    avant = len(table)
+    table = table.drop_duplicates(subset="REFERENCE", keep="last")
+    doublons_reference = avant - len(table)
+
+    # Enseigne ret : calculée sur les lignes gardées pour REFERENCE
+    enseigne = pd.DataFrame({
+        "concat_key": par_valeurs_uniques(table["V"], majuscules),
+        "Enseigne ret": par_valeurs_uniques(table["W"], majuscules),
+    })
+    avant = len(enseigne)
+    enseigne = enseigne.drop_duplicates(subset="concat_key", keep="last")
+    comptes = pd.DataFrame({"doublons_reference": [doublons_reference],
+                            "doublons_enseigne": [avant - len(enseigne)]})
+    return (table[["REFERENCE", "Sur-famille"]].reset_index(drop=True),
+            enseigne.reset_index(drop=True), comptes)
+
+
+def compiler_zones(brut: pd.DataFrame) -> pd.DataFrame:
+    """
+    Colonnes A, E de « ZONE AFFECTATION » → PAYS (majuscules), COMMERCIAL AREA.
+    Seuls les couples strictement identiques sont fusionnés : un pays rattaché à
+    plusieurs zones garde toutes ses lignes (comme le merge d'origine).
+    """
+    zones = brut.copy()
+    zones.columns = ["PAYS", "COMMERCIAL AREA"]
+    zones["PAYS"] = par_valeurs_uniques(zones["PAYS"], majuscules)
+    zones = zones.drop_duplicates().reset_index(drop=True)
+    ambigus = zones.loc[zones["PAYS"].duplicated(), "PAYS"].unique()
+    if len(ambigus):
+        print(f"[WARN] ⚠️ ZONE AFFECTATION : pays rattachés à plusieurs zones : {sorted(ambigus)}", flush=True)
+    return zones
+
+
+# ------------------------------------------------------------------ chargement
+def cache_references(taille_max_mo: float) -> CacheFeuilles:
+    return CacheFeuilles(os.path.join(dossier_application(), "references"), taille_max_mo)
+
+
+def _depuis_cache(refs: References, cache: CacheFeuilles | None, feuille: str, path: str) -> bool:
+    if cache is None or not cache.actif:
+        return False
+    if feuille == FEUILLE_TABLE:
+        tables = [cache.lire(path, nom, LECTEUR) for nom in ("sur_famille", "enseigne", "comptes")]
+        if any(t is None for t in tables):
+            return False
+        refs.sur_famille, refs.enseigne, comptes = tables
+        refs.doublons_reference = int(comptes["doublons_reference"].iloc[0])
+        refs.doublons_enseigne = int(comptes["doublons_enseigne"].iloc[0])
+        return True
+    refs.zones = cache.lire(path, "zones", LECTEUR)
+    return refs.zones is not None
+
+
+def _compiler(refs: References, cache: CacheFeuilles | None, feuille: str, path: str, wb) -> None:
+    if feuille == FEUILLE_TABLE:
+        refs.sur_famille, refs.enseigne, comptes = compiler_table(lire_colonnes_stream(wb[feuille], COLONNES_TABLE))
+        refs.doublons_reference = int(comptes["doublons_reference"].iloc[0])
+        refs.doublons_enseigne = int(comptes["doublons_enseigne"].iloc[0])
+        tables = {"sur_famille": refs.sur_famille, "enseigne": refs.enseigne, "comptes": comptes}
+    else:
+        refs.zones = compiler_zones(lire_colonnes_stream(wb[feuille], COLONNES_ZONES))
+        tables = {"zones": refs.zones}
+    if cache is not None and cache.actif:
+        for nom, df in tables.items():
+            if not cache.ecrire(path, nom, LECTEUR, df):
+                print(f"[WARN] ⚠️ « {feuille} » non mise en cache (types mélangés) : recompilée à chaque exécution",
+                      flush=True)
+                break
+
+
+def charger_references(table_path: str | None, zone_path: str | None,
+                       cache: CacheFeuilles | None = None) -> References:
+    """
+    Charge les tables de correspondance : depuis le cache compilé si le classeur n'a pas
+    changé, sinon en ouvrant chaque classeur une seule fois pour toutes ses feuilles.
+    """
+    t0 = perf_counter()
+    refs = References()
+    a_compiler: dict[str, list[str]] = {}
+    for feuille, path in ((FEUILLE_TABLE, table_path), (FEUILLE_ZONES, zone_path)):
+        if not path or not os.path.exists(path):
+            print(f"[WARN] ⚠️ Référence « {feuille} » introuvable : {path}", flush=True)
+        elif not _depuis_cache(refs, cache, feuille, path):
+            a_compiler.setdefault(os.path.abspath(path), []).append(feuille)
+
+    for path, feuilles in a_compiler.items():
+        try:
+            wb = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+        except Exception as e:
+            print(f"[ERROR] ❌ Erreur ouverture du classeur de référence {path} : {e}", flush=True)
+            continue
+        try:
+            for feuille in feuilles:
+                try:
+                    _compiler(refs, cache, feuille, path, wb)
+                except Exception as e:
+                    print(f"[ERROR] ❌ Erreur chargement {feuille} : {e}", flush=True)
+        finally:
+            wb.close()
+
+    duree = (perf_counter() - t0) * 1000
+    if a_compiler:
+        print(f"[INFO] 🧩 Références compilées en {duree:.0f} ms "
+              f"({len(a_compiler)} classeur(s) ouvert(s) pour {sum(map(len, a_compiler.values()))} feuille(s))",
+              flush=True)
+    elif refs.sur_famille is not None or refs.zones is not None:
+        print(f"[INFO] ⚡ Références relues depuis le cache compilé en {duree:.0f} ms", flush=True)
+    return refs
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ETL_SIAMP_SCAN.py – scan unique des fichiers filiales
+
+• Seules les feuilles TURNOVER de chaque classeur sont lues, une seule fois (via
+  Classeur + CacheFeuilles), pour en extraire : mois présents, devises, validité
+  du schéma et nombre de lignes. Les autres feuilles ne sont ni lues ni mises en cache.
+• Le résultat (manifeste JSON) est réutilisé par le GUI (mois, devises) et
+  transmis à ETL_SIAMP.py via --manifest : les feuilles déjà rejetées ne sont
+  plus rouvertes, les feuilles valides sont relues depuis le cache Parquet.
+
+Usage autonome : python ETL_SIAMP_SCAN.py fichier1.xlsx fichier2.xlsx --sortie manifeste.json
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+
+from ETL_SIAMP_LECTURE import Classeur, LECTEURS
+from ETL_SIAMP_CACHE import CacheFeuilles, dossier_application
+
+VERSION_MANIFESTE = 2      # 2 : feuilles TURNOVER seules
+
+
+def chemin_manifeste() -> str:
+    """Emplacement par défaut du manifeste partagé entre le GUI et ETL_SIAMP.py."""
+    return os.path.join(dossier_application(), "manifeste.json")
+
+
+def est_a_jour(entree: dict) -> bool:
+    """Le fichier scanné n'a-t-il pas changé depuis (taille + mtime) ?"""
+    try:
+        st = os.stat(entree["fichier"])
+    except OSError:
+        return False
+    return st.st_size == entree.get("taille") and st.st_mtime_ns == entree.get("mtime_ns")
+
+
+def scanner_fichier(path: str, lecteur: str = "stream", cache: CacheFeuilles | None = None) -> dict:
+    """
+    Lit les feuilles TURNOVER d'un classeur une fois et renvoie son entrée de manifeste :
+    {"fichier", "nom", "taille", "mtime_ns", "erreur", "feuilles": [{"nom", "turnover",
+     "lignes", "mois", "devises", "valide", "motif", "colonnes", "colonnes_manquantes",
+     "colonnes_sup"}]}
+    """
+    # import tardif : ETL_SIAMP importe lui-même les modules de lecture
+    from ETL_SIAMP import TURNOVER_SHEET, renommer_entete, sonder_feuille
+
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    entree = {
+        "fichier": path,
+        "nom": os.path.basename(path),
+        "taille": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "erreur": None,
+        "feuilles": [],
+    }
+    try:
+        with Classeur(path, lecteur, cache) as xls:
+            for sh in xls.feuilles:
+                if not TURNOVER_SHEET.match(sh):
+                    continue
+                df = xls.lire(sh)
+                info = {"nom": sh, "turnover": True, "lignes": len(df), "mois": [], "devises": []}
+                colonnes = [str(c).strip().upper() for c in df.columns]
+                if "MONTH" in colonnes:
+                    mois = pd.to_datetime(df.iloc[:, colonnes.index("MONTH")], errors="coerce").dt.to_period("M")
+                    info["mois"] = [str(m) for m in sorted(mois.dropna().unique())]
+                if "CURRENCY" in colonnes:
+                    devises = df.iloc[:, colonnes.index("CURRENCY")].dropna().astype(str).str.strip().str.upper()
+                    info["devises"] = sorted(set(devises))
+                valide, motif, manquantes, sup = sonder_feuille([str(c) for c in df.columns], entree["nom"])
+                info.update({
+                    "valide": bool(valide),
+                    "motif": motif,
+                    "colonnes": renommer_entete([str(c) for c in df.columns]),
+                    "colonnes_manquantes": manquantes,
+                    "colonnes_sup": sup,
+                })
+                entree["feuilles"].append(info)
+    except Exception as e:
+        entree["erreur"] = str(e)
+    return entree
+
+
+def scanner(paths: list[str], lecteur: str = "stream", cache: CacheFeuilles | None = None,
+            connus: dict[str, dict] | None = None) -> list[dict]:
+    """Entrées de manifeste pour `paths`, en réutilisant celles de `connus` encore à jour."""
+    connus = connus or {}
+    entrees = []
+    for path in paths:
+        entree = connus.get(os.path.abspath(path))
+        if entree is None or not est_a_jour(entree):
+            entree = scanner_fichier(path, lecteur, cache)
+        entrees.append(entree)
+    return entrees
+
+
+def ecrire_manifeste(chemin: str, entrees: list[dict], lecteur: str = "stream") -> None:
+    manifeste = {
+        "version": VERSION_MANIFESTE,
+        "cree_le": datetime.now().isoformat(timespec="seconds"),
+        "lecteur": lecteur,
+        "fichiers": entrees,
+    }
+    dossier = os.path.dirname(chemin) or "."
+    os.makedirs(dossier, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dossier, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifeste, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, chemin)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def lire_manifeste(chemin: str, lecteur: str | None = None) -> dict[str, dict]:
+    """
+    Entrées du manifeste indexées par chemin absolu, limitées à celles encore à jour.
+    Manifeste absent, illisible, d'une autre version ou d'un autre lecteur → {}.
+    """
+    try:
+        with open(chemin, encoding="utf-8") as f:
+            manifeste = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifeste.get("version") != VERSION_MANIFESTE:
+        return {}
+    if lecteur is not None and manifeste.get("lecteur") != lecteur:
+        return {}
+    return {e["fichier"]: e for e in manifeste.get("fichiers", []) if est_a_jour(e)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan des fichiers filiales (mois, devises, schéma)")
+    parser.add_argument("fichiers", nargs="+")
+    parser.add_argument("--sortie", default=None, help="Manifeste JSON à écrire (défaut : dossier de l'application)")
+    parser.add_argument("--lecteur", choices=LECTEURS, default="stream")
+    parser.add_argument("--no-cache", dest="no_cache", action="store_true")
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else CacheFeuilles()
+    sortie = args.sortie or chemin_manifeste()
+    entrees = scanner(args.fichiers, args.lecteur, cache, lire_manifeste(sortie, args.lecteur))
+    for e in entrees:
+        if e["erreur"]:
+            print(f"[WARN] ⚠ {e['nom']} : {e['erreur']}", flush=True)
+            continue
+        for f in e["feuilles"]:
+            statut = "" if not f["turnover"] else (" ✅" if f["valide"] else " ❌")
+            print(f"{e['nom']} / {f['nom']}{statut} : {f['lignes']} lignes, "
+                  f"mois {', '.join(f['mois']) or '-'}, devises {', '.join(f['devises']) or '-'}", flush=True)
+    ecrire_manifeste(sortie, entrees, args.lecteur)
+    print(f"[INFO] 📝 Manifeste écrit : {sortie}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ETL_SIAMP_SCHEMA.py – types compacts des colonnes métier
+
+• Les colonnes à faible cardinalité (devise, pays, unité, canal, famille…) et
+  les colonnes de traçabilité (NOMFICHIER, FEUILLE, SOURCE) passent en
+  `category` dès la lecture de chaque feuille : une chaîne par valeur
+  distincte au lieu d'une par ligne.
+• Les catégories sont unifiées avant pd.concat (sinon la colonne retombe en object).
+• Les nettoyages de chaînes (ETL_SIAMP_NORMALISATION) gardent les colonnes catégorielles.
+"""
+from __future__ import annotations
+
+import pandas as pd
+
+COLONNES_CATEGORIES = [
+    "SIAMP UNIT", "SALE TYPE", "TYPE OF CANAL", "FAMILLE", "CURRENCY", "COUNTRY",
+    "NOMFICHIER", "FEUILLE", "SOURCE",
+]
+COLONNES_NUMERIQUES = ["QUANTITY", "TURNOVER", "VARIABLE COSTS", "COGS"]
+
+
+def est_categorie(serie: pd.Series) -> bool:
+    return isinstance(serie.dtype, pd.CategoricalDtype)
+
+
+def typer_feuille(df: pd.DataFrame) -> pd.DataFrame:
+    """Applique le schéma à une feuille lue : catégories + colonnes numériques (sans perte)."""
+    for col in COLONNES_NUMERIQUES:
+        if col in df.columns and df[col].dtype == object:
+            try:
+                df[col] = pd.to_numeric(df[col])
+            except (ValueError, TypeError):
+                pass  # texte réel dans la colonne : laissé tel quel
+    for col in COLONNES_CATEGORIES:
+        if col in df.columns and not est_categorie(df[col]):
+            df[col] = df[col].astype("category")
+    return df
+
+
+def unifier_categories(dfs: list[pd.DataFrame]) -> None:
+    """Donne à chaque colonne catégorielle les mêmes catégories dans toutes les feuilles (en place)."""
+    for col in COLONNES_CATEGORIES:
+        series = [df[col] for df in dfs if col in df.columns and est_categorie(df[col])]
+        if len(series) < 2:
+            continue
+        toutes = pd.Index([], dtype=object).append([s.cat.categories for s in series]).unique()
+        for df in dfs:
+            if col in df.columns and est_categorie(df[col]):
+                df[col] = df[col].cat.set_categories(toutes)
+
+
+def en_objet(serie: pd.Series) -> pd.Series:
+    """Colonne catégorielle → object, manquants en None comme après nettoyer_str."""
+    if not est_categorie(serie):
+        return serie
+    serie = serie.astype(object)
+    return serie.where(serie.notna(), None)
+
+
+def memoire_mo(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def memoire_sans_categories_mo(df: pd.DataFrame) -> float:
+    """Empreinte qu'aurait df si ses colonnes catégorielles étaient restées en object."""
+    total = df.memory_usage(deep=True)
+    for col in df.columns:
+        if est_categorie(df[col]):
+            total[col] = df[col].astype(object).memory_usage(deep=True, index=False)
+    return total.sum() / 2**20
@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ETL_SIAMP_TAUX.py – base locale des taux de référence BCE
+
+• Stockage SQLite indexé par (date, devise), dans le dossier de l'application.
+• Amorçage unique depuis eurofxref-hist.xml, puis ajout des seuls jours manquants
+  depuis le flux quotidien ou le flux 90 jours.
+• Les recherches « taux au jour X » sont des requêtes locales : aucun accès
+  réseau pour une date déjà couverte, et réponse hors ligne à partir de la base.
+• Les flux XML sont lus en un seul passage iterparse vers un IndexTaux
+  (dates triées + matrice devise × date), interrogé par recherche dichotomique.
+• Cube mois × devise (moyenne, fin de mois, min, max) conservé dans la même
+  base et recalculé pour les seuls mois nouveaux ou encore incomplets.
+
+Usage autonome : python ETL_SIAMP_TAUX.py --cube 2025-01 2025-03
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sqlite3
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from ETL_SIAMP_CACHE import dossier_application
+from ETL_SIAMP_FOURNISSEURS import get_conditionnel
+
+URL_HIST = "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-hist.xml"
+URL_90J = "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-hist-90d.xml"
+URL_JOUR = "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-daily.xml"
+NS_BCE = "{http://www.ecb.int/vocabulary/2002-08-01/eurofxref}"
+
+FENETRE_JOURS = 60          # ancienneté maximale d'un taux retenu
+DELAI_SYNCHRO = timedelta(hours=1)
+TIMEOUT = 30
+STATISTIQUES_CUBE = ["moyenne", "fin_mois", "min", "max"]
+
+
+def lire_index(flux) -> "IndexTaux":
+    """
+    Lit un flux eurofxref (fichier ou objet fichier) en un seul passage iterparse,
+    chaque jour étant libéré dès qu'il est lu.
+    """
+    jours, devises, taux = [], [], []
+    jour_devises, jour_taux = [], []
+    parent = None
+    for evt, elem in ET.iterparse(flux, events=("start", "end")):
+        if elem.tag != f"{NS_BCE}Cube":
+            continue
+        if evt == "start":
+            if parent is None and not elem.attrib:
+                parent = elem  # <Cube> englobant : ses jours sont vidés au fil de l'eau
+            continue
+        if "currency" in elem.attrib:
+            jour_devises.append(elem.get("currency"))
+            jour_taux.append(float(elem.get("rate")))
+        elif "time" in elem.attrib:
+            jours.append(elem.get("time"))
+            devises.append(jour_devises)
+            taux.append(jour_taux)
+            jour_devises, jour_taux = [], []
+            if parent is not None:
+                parent.clear()
+    return IndexTaux.depuis_jours(jours, devises, taux)
+
+
+class IndexTaux:
+    """
+    Taux BCE en mémoire : dates triées (datetime64[D]) et matrice devise × date
+    (NaN : pas de cotation). « Dernier jour ≤ date » et « dernier taux de chaque
+    devise sur la fenêtre » sont des recherches dichotomiques (searchsorted).
+    """
+
+    def __init__(self, dates: np.ndarray, devises: list[str], matrice: np.ndarray):
+        ordre = np.argsort(dates, kind="stable")
+        self.dates = dates[ordre]
+        self.devises = list(devises)
+        self.matrice = matrice[:, ordre]
+        # position de la dernière cotation non nulle ≤ j, par devise (-1 : aucune)
+        cote = np.isfinite(self.matrice) & (self.matrice != 0)
+        self.derniere = np.maximum.accumulate(np.where(cote, np.arange(len(self.dates)), -1), axis=1)
+
+    @classmethod
+    def depuis_lignes(cls, dates, devises, taux) -> "IndexTaux":
+        """Construit l'index depuis des cotations à plat (date, devise, taux), dans n'importe quel ordre."""
+        jours, j = np.unique(np.asarray(dates, dtype="datetime64[D]"), return_inverse=True)
+        noms, d = np.unique(np.asarray(devises, dtype=str), return_inverse=True)
+        matrice = np.full((len(noms), len(jours)), np.nan)
+        matrice[d, j] = np.asarray(taux, dtype=float)
+        return cls(jours, noms.tolist(), matrice)
+
+    @classmethod
+    def depuis_jours(cls, jours: list[str], devises: list[list[str]], taux: list[list[float]]) -> "IndexTaux":
+        """Construit l'index depuis des listes parallèles (jour, devises du jour, taux du jour)."""
+        return cls.depuis_lignes(np.repeat(np.array(jours, dtype="datetime64[D]"), [len(l) for l in devises]),
+                                 [d for liste in devises for d in liste],
+                                 [t for liste in taux for t in liste])
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def position(self, date: str | None = None) -> int:
+        """Indice du dernier jour publié ≤ date (dernier jour si date absente), -1 si aucun."""
+        if date is None:
+            return len(self.dates) - 1
+        return int(np.searchsorted(self.dates, np.datetime64(date, "D"), side="right")) - 1
+
+    def taux_au(self, date: str | None = None, fenetre: int = FENETRE_JOURS) -> tuple[dict[str, float], str | None]:
+        """Même résultat que BaseTaux.taux_au, sans requête."""
+        i = self.position(date)
+        if i < 0:
+            return {}, None
+        cible = self.dates[i]
+        debut = (np.datetime64(date, "D") if date else cible) - np.timedelta64(fenetre, "D")
+        k = self.derniere[:, i]
+        retenues = (k >= 0) & (self.dates[np.maximum(k, 0)] >= debut)
+        taux = {"EUR": 1.0}
+        taux.update({self.devises[c]: float(self.matrice[c, k[c]]) for c in np.flatnonzero(retenues)})
+        return taux, str(cible)
+
+    def taux_lignes(self, dates, devises, fenetre: int = FENETRE_JOURS) -> np.ndarray:
+        """
+        Jointure « as-of » vectorisée : pour chaque ligne, taux de sa devise en vigueur
+        à sa date (même règle que taux_au). NaN si date manquante, devise inconnue
+        ou aucune cotation dans la fenêtre.
+        Le calcul porte sur les couples (jour, devise) distincts, puis est diffusé aux lignes.
+        """
+        codes_j, jours = pd.factorize(pd.to_datetime(pd.Series(dates), errors="coerce").dt.normalize())
+        codes_d, noms = pd.factorize(pd.Series(devises))
+        table = np.full((len(jours) + 1, len(noms) + 1), np.nan)  # dernière ligne/colonne : codes -1
+        if len(self.dates) and len(jours) and len(noms):
+            jours = jours.to_numpy().astype("datetime64[D]")
+            rang = {d: i for i, d in enumerate(self.devises)}
+            c = np.array([rang.get(d, -1) for d in noms], dtype=np.intp)[None, :]
+            i = (np.searchsorted(self.dates, jours, side="right") - 1)[:, None]
+            k = np.where((i >= 0) & (c >= 0), self.derniere[np.maximum(c, 0), np.maximum(i, 0)], -1)
+            retenus = (k >= 0) & (self.dates[np.maximum(k, 0)] >= jours[:, None] - np.timedelta64(fenetre, "D"))
+            table[:-1, :-1] = np.where(retenus, self.matrice[np.maximum(c, 0), np.maximum(k, 0)], np.nan)
+        return table[codes_j, codes_d]
+
+    def cube_mensuel(self) -> pd.DataFrame:
+        """
+        Par mois civil et par devise : moyenne, dernier taux du mois, min et max des
+        cotations non nulles, et nombre de cotations. Une ligne par couple coté.
+        """
+        if not len(self.dates):
+            return pd.DataFrame(columns=["mois", "devise", *STATISTIQUES_CUBE, "cotations"])
+        mois = self.dates.astype("datetime64[M]")
+        debuts = np.flatnonzero(np.r_[True, mois[1:] != mois[:-1]])
+        fins = np.r_[debuts[1:], len(mois)] - 1
+        cote = np.isfinite(self.matrice) & (self.matrice != 0)
+        valeurs = np.where(cote, self.matrice, np.nan)
+
+        nb = np.add.reduceat(cote, debuts, axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            moyenne = np.add.reduceat(np.where(cote, self.matrice, 0.0), debuts, axis=1) / nb
+        k = self.derniere[:, fins]
+        fin = np.where(k >= debuts, self.matrice[np.arange(len(self.devises))[:, None], np.maximum(k, 0)], np.nan)
+        c, m = np.nonzero(nb)
+        cube = pd.DataFrame({
+            "mois": np.datetime_as_string(mois[debuts], unit="M")[m],
+            "devise": np.array(self.devises, dtype=object)[c],
+            "moyenne": moyenne[c, m],
+            "fin_mois": fin[c, m],
+            "min": np.fmin.reduceat(valeurs, debuts, axis=1)[c, m],
+            "max": np.fmax.reduceat(valeurs, debuts, axis=1)[c, m],
+            "cotations": nb[c, m],
+        })
+        return cube.sort_values(["mois", "devise"], ignore_index=True)
+
+    def lignes(self, apres: str | None = None):
+        """(date, devise, taux) des cotations connues, limitées aux jours postérieurs à `apres`."""
+        debut = 0 if apres is None else int(np.searchsorted(self.dates, np.datetime64(apres, "D"), side="right"))
+        c, j = np.nonzero(np.isfinite(self.matrice[:, debut:]))
+        jours = np.datetime_as_string(self.dates[debut:])
+        for ci, ji in zip(c.tolist(), j.tolist()):
+            yield jours[ji], self.devises[ci], float(self.matrice[ci, debut + ji])
+
+
+def taux_mensuels_lignes(cube: pd.DataFrame, statistique: str, dates, devises) -> np.ndarray:
+    """
+    Pour chaque ligne, `statistique` du cube pour le mois de sa date et sa devise
+    (NaN si date manquante ou couple absent du cube). Jointure par get_indexer sur
+    les valeurs distinctes, diffusée aux lignes.
+    """
+    table = cube.pivot(index="mois", columns="devise", values=statistique)
+    valeurs = np.pad(table.to_numpy(dtype=float), ((0, 1), (0, 1)), constant_values=np.nan)
+    codes_j, jours = pd.factorize(pd.to_datetime(pd.Series(dates), errors="coerce"))
+    codes_d, noms = pd.factorize(pd.Series(devises))
+    # code -1 (manquant) → dernière position de la table, remplie de NaN
+    lignes = np.append(table.index.get_indexer(jours.strftime("%Y-%m")), -1)[codes_j]
+    colonnes = np.append(table.columns.get_indexer(noms), -1)[codes_d]
+    return valeurs[lignes, colonnes]
+
+
+class BaseTaux:
+    """Taux BCE (unités de devise pour 1 EUR) par date et devise."""
+
+    def __init__(self, chemin: str | None = None):
+        self.chemin = chemin or os.path.join(dossier_application(), "taux_bce.sqlite")
+        os.makedirs(os.path.dirname(self.chemin) or ".", exist_ok=True)
+        self.cnx = sqlite3.connect(self.chemin, timeout=30)
+        self.cnx.executescript("""
+            CREATE TABLE IF NOT EXISTS taux (
+                date   TEXT NOT NULL,
+                devise TEXT NOT NULL,
+                taux   REAL NOT NULL,
+                PRIMARY KEY (date, devise)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS taux_devise_date ON taux (devise, date);
+            CREATE TABLE IF NOT EXISTS meta (cle TEXT PRIMARY KEY, valeur TEXT);
+            CREATE TABLE IF NOT EXISTS cube_mois (
+                mois      TEXT NOT NULL,
+                devise    TEXT NOT NULL,
+                moyenne   REAL,
+                fin_mois  REAL,
+                min       REAL,
+                max       REAL,
+                cotations INTEGER,
+                PRIMARY KEY (mois, devise)
+            ) WITHOUT ROWID;
+        """)
+
+    # ------------------------------------------------------------------ état
+    def derniere_date(self) -> str | None:
+        return self.cnx.execute("SELECT MAX(date) FROM taux").fetchone()[0]
+
+    def _meta(self, cle: str) -> str | None:
+        ligne = self.cnx.execute("SELECT valeur FROM meta WHERE cle = ?", (cle,)).fetchone()
+        return ligne[0] if ligne else None
+
+    def _ecrire_meta(self, cle: str, valeur: str) -> None:
+        self.cnx.execute("INSERT OR REPLACE INTO meta (cle, valeur) VALUES (?, ?)", (cle, valeur))
+
+    # ------------------------------------------------------------------ synchronisation
+    def doit_synchroniser(self, date: str | None = None) -> bool:
+        """Faux si la base couvre déjà `date` ou a été synchronisée il y a moins de DELAI_SYNCHRO."""
+        derniere = self.derniere_date()
+        if derniere is None:
+            return True
+        if date and date <= derniere:
+            return False  # les taux publiés ne changent plus
+        synchro = self._meta("derniere_synchro")
+        return not synchro or datetime.now() - datetime.fromisoformat(synchro) > DELAI_SYNCHRO
+
+    def synchroniser(self, timeout: float = TIMEOUT) -> int:
+        """
+        Complète la base avec les jours postérieurs à la dernière date connue :
+        historique complet si la base est vide, sinon flux quotidien (un seul jour ouvré
+        manquant : il ne contient que la dernière publication) ou 90 jours.
+        GET conditionnel (ETag / Last-Modified mémorisés par flux) : un flux
+        inchangé n'est pas retéléchargé. Renvoie le nombre de taux ajoutés.
+        """
+        derniere = self.derniere_date()
+        if derniere is None:
+            url = URL_HIST
+        else:
+            aujourd_hui = datetime.now().date()
+            retard = (aujourd_hui - datetime.strptime(derniere, "%Y-%m-%d").date()).days
+            # jours ouvrés publiables depuis la dernière date (jours fériés comptés : majorant)
+            manquants = int(np.busday_count(np.datetime64(derniere, "D") + 1, np.datetime64(aujourd_hui, "D") + 1))
+            url = URL_JOUR if manquants <= 1 else URL_90J if retard <= 85 else URL_HIST
+        print(f"[INFO] 📡 Synchronisation des taux BCE ({url.rsplit('/', 1)[-1]})", flush=True)
+        validateurs = json.loads(self._meta(f"http:{url}") or "null") if derniere else None
+        reponse, validateurs = get_conditionnel(url, validateurs, timeout, stream=True)
+        lignes = []
+        if reponse is None:
+            print("[INFO] 💤 Flux BCE inchangé depuis la dernière synchronisation", flush=True)
+        else:
+            with reponse:
+                reponse.raw.decode_content = True
+                index = lire_index(reponse.raw)
+            lignes = list(index.lignes(apres=derniere))
+        with self.cnx:
+            self.cnx.executemany("INSERT OR REPLACE INTO taux (date, devise, taux) VALUES (?, ?, ?)", lignes)
+            self._ecrire_meta(f"http:{url}", json.dumps(validateurs))
+            self._ecrire_meta("derniere_synchro", datetime.now().isoformat(timespec="seconds"))
+        return len(lignes)
+
+    # ------------------------------------------------------------------ recherches
+    def taux_au(self, date: str | None = None, fenetre: int = FENETRE_JOURS) -> tuple[dict[str, float], str | None]:
+        """
+        Dernier taux non nul de chaque devise publié au plus tard à `date` et au plus
+        `fenetre` jours avant (date absente : dernière date de la base).
+        Renvoie (taux, date de référence), EUR = 1.0 inclus ; ({}, None) si rien n'est connu.
+        """
+        cible = self.cnx.execute(
+            "SELECT MAX(date) FROM taux" + (" WHERE date <= ?" if date else ""),
+            (date,) if date else (),
+        ).fetchone()[0]
+        if cible is None:
+            return {}, None
+        debut = (datetime.strptime(date or cible, "%Y-%m-%d") - timedelta(days=fenetre)).strftime("%Y-%m-%d")
+        # SQLite : avec MAX(), les colonnes nues viennent de la ligne du maximum
+        lignes = self.cnx.execute(
+            "SELECT devise, taux, MAX(date) FROM taux WHERE date BETWEEN ? AND ? AND taux != 0 GROUP BY devise",
+            (debut, cible),
+        ).fetchall()
+        taux = {"EUR": 1.0}
+        taux.update({devise: valeur for devise, valeur, _ in lignes})
+        return taux, cible
+
+    def index(self, debut: str | None = None, fin: str | None = None) -> IndexTaux:
+        """Cotations de la base entre `debut` et `fin` (bornes incluses), chargées en IndexTaux."""
+        lignes = self.cnx.execute(
+            "SELECT date, devise, taux FROM taux WHERE date BETWEEN ? AND ?",
+            (debut or "0000-00-00", fin or "9999-99-99"),
+        ).fetchall()
+        return IndexTaux.depuis_lignes(*zip(*lignes)) if lignes else IndexTaux.depuis_lignes([], [], [])
+
+    # ------------------------------------------------------------------ cube mensuel
+    def mettre_a_jour_cube(self) -> int:
+        """
+        Recalcule le cube à partir du dernier mois déjà calculé (peut-être incomplet
+        à l'époque) jusqu'à la dernière cotation. Renvoie le nombre de mois recalculés.
+        """
+        derniere = self.derniere_date()
+        calcule = self._meta("cube_jusqu_au")
+        if derniere is None or calcule == derniere:
+            return 0
+        depuis = calcule[:7] if calcule else None
+        cube = self.index(f"{depuis}-01" if depuis else None).cube_mensuel()
+        with self.cnx:
+            self.cnx.execute("DELETE FROM cube_mois WHERE mois >= ?", (depuis or "",))
+            self.cnx.executemany(
+                "INSERT INTO cube_mois (mois, devise, moyenne, fin_mois, min, max, cotations) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                cube.astype(object).itertuples(index=False, name=None),
+            )
+            self._ecrire_meta("cube_jusqu_au", derniere)
+        return cube["mois"].nunique()
+
+    def cube(self, debut: str | None = None, fin: str | None = None) -> pd.DataFrame:
+        """Cube mois × devise (mis à jour si besoin) pour les mois « YYYY-MM » de debut à fin."""
+        self.mettre_a_jour_cube()
+        return pd.read_sql_query(
+            "SELECT * FROM cube_mois WHERE mois BETWEEN ? AND ? ORDER BY mois, devise",
+            self.cnx, params=(debut or "0000-00", fin or "9999-99"),
+        )
+
+    def close(self) -> None:
+        self.cnx.close()
+
+    def __enter__(self) -> "BaseTaux":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Base locale des taux BCE")
+    parser.add_argument("--synchroniser", action="store_true", help="Compléter la base depuis la BCE")
+    parser.add_argument("--cube", nargs=2, metavar=("DEBUT", "FIN"), help="Afficher le cube mensuel (mois YYYY-MM)")
+    args = parser.parse_args()
+
+    with BaseTaux() as base:
+        if args.synchroniser:
+            print(f"[INFO] ✅ {base.synchroniser()} taux ajoutés à la base locale", flush=True)
+        print(f"[INFO] 🏦 {base.chemin} : dernière cotation {base.derniere_date() or '-'}", flush=True)
+        if args.cube:
+            with pd.option_context("display.max_rows", None, "display.width", 200):
+                print(base.cube(*args.cube).to_string(index=False), flush=True)
+
+
+if __name__ == "__main__":
+    main()
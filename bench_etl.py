@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+bench_etl.py – mesures de performance des étapes de l'ETL
+
+Usage : python bench_etl.py lecture --lignes 120000
+        python bench_etl.py marges --lignes 1000000
+        python bench_etl.py normalisation --lignes 1000000
+        python bench_etl.py bce [--hist eurofxref-hist.xml]
+        python bench_etl.py doublons --lignes 2000000
+        python bench_etl.py enrichissement --lignes 1000000
+        python bench_etl.py ecriture --lignes 20000
+Les classeurs de test sont générés une seule fois dans le dossier temporaire.
+"""
+from __future__ import annotations
+import argparse
+import os
+import re
+import tempfile
+import tracemalloc
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from ETL_SIAMP import COLONNES_EURO, FORMATS, calculer_montants_euro
+from ETL_SIAMP_DOUBLONS import dedoublonner
+from ETL_SIAMP_ECRITURE import FORMAT_EURO, classeur_sortie, ecrire_feuille
+from ETL_SIAMP_ENRICHISSEMENT import enrichir
+from ETL_SIAMP_LECTURE import Classeur
+from ETL_SIAMP_NORMALISATION import normaliser, nettoyer_str
+from ETL_SIAMP_TAUX import lire_index
+
+DOSSIER_BENCH = os.path.join(tempfile.gettempdir(), "etl_siamp_bench")
+
+
+def mesurer(nom: str, fn, repetitions: int = 1):
+    """Chronomètre fn (meilleur temps) puis mesure son pic mémoire Python (tracemalloc)."""
+    temps = []
+    for _ in range(repetitions):
+        t0 = perf_counter()
+        res = fn()
+        temps.append(perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {nom:<28} {min(temps):8.3f} s   pic mémoire {pic / 2**20:8.1f} Mo", flush=True)
+    return res, min(temps)
+
+
+def classeur_turnover(lignes: int) -> str:
+    """Génère (ou réutilise) un classeur TURNOVER de `lignes` lignes au format strict."""
+    os.makedirs(DOSSIER_BENCH, exist_ok=True)
+    path = os.path.join(DOSSIER_BENCH, f"turnover_{lignes}.xlsx")
+    if os.path.exists(path):
+        return path
+    print(f"[INFO] Génération de {path}…", flush=True)
+    rng = np.random.default_rng(0)
+    i = np.arange(lignes)
+    df = pd.DataFrame(dict(zip(FORMATS[0] + ["Transaction Type"], [
+        pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, lignes), unit="D"),
+        "SIAMP EGYPT", "EXT", "Wholesaler/Grossiste",
+        pd.Series(i % 50).map("ENSEIGNE {}".format), pd.Series(i % 400).map("CLIENT {}".format),
+        "EGYPT", "Technical equipment", "Set", 10013000 + i % 900,
+        pd.Series(i % 900).map("Produit {}".format), rng.integers(1, 1000, lignes),
+        rng.random(lignes) * 10000, "EGP", "EGY", rng.random(lignes) * 50,
+        rng.random(lignes) * 80, "VENTE",
+    ])))
+    try:
+        import xlsxwriter  # noqa: F401  chaînes partagées + <dimension>, comme un export Excel
+        df.to_excel(path, sheet_name="TURNOVER", index=False, engine="xlsxwriter")
+    except ImportError:
+        df.to_excel(path, sheet_name="TURNOVER", index=False, engine="openpyxl")
+    return path
+
+
+def bench_lecture(args) -> None:
+    path = classeur_turnover(args.lignes)
+    print(f"[BENCH] Lecture d'une feuille TURNOVER de {args.lignes} lignes ({os.path.getsize(path) / 2**20:.1f} Mo)")
+    resultats = {}
+    for lecteur in ("pandas", "stream"):
+        def lire(lecteur=lecteur):
+            with Classeur(path, lecteur) as xls:
+                return xls.lire("TURNOVER")
+        resultats[lecteur] = mesurer(f"lecteur {lecteur}", lire, args.repetitions)
+    pd.testing.assert_frame_equal(resultats["pandas"][0], resultats["stream"][0])
+    print(f"  → résultats identiques, accélération x{resultats['pandas'][1] / resultats['stream'][1]:.1f}")
+
+
+def fusion_synthetique(lignes: int) -> pd.DataFrame:
+    """Frame fusionné en mémoire avec ~5 % de manquants par colonne de calcul."""
+    rng = np.random.default_rng(0)
+
+    def trous(valeurs):
+        return np.where(rng.random(lignes) < 0.05, np.nan, valeurs)
+
+    return pd.DataFrame({
+        "QUANTITY": trous(rng.integers(1, 1000, lignes)),
+        "TURNOVER": trous(rng.random(lignes) * 10000),
+        "CURRENCY": rng.choice(["EGP", "GBP", "USD", "EUR", "XXX", None], lignes),
+        "VARIABLE COSTS": trous(rng.random(lignes) * 50),
+        "COGS": trous(rng.random(lignes) * 80),
+    })
+
+
+def montants_ligne_a_ligne(df: pd.DataFrame, rates: dict) -> pd.DataFrame:
+    """Ancien calcul (apply axis=1), conservé comme référence."""
+    df["Taux €"] = df["CURRENCY"].map(rates)
+    df["C.A en €"] = df.apply(
+        lambda row: row["TURNOVER"] * row["Taux €"]
+        if pd.notnull(row.get("TURNOVER")) and pd.notnull(row.get("Taux €"))
+        else None,
+        axis=1
+    )
+    for col, cout in (("VAR Margin", "VARIABLE COSTS"), ("Margin", "COGS")):
+        df[col] = df.apply(
+            lambda row: row["C.A en €"] - (row[cout] * row["Taux €"] * row["QUANTITY"])
+            if pd.notnull(row.get("C.A en €")) and pd.notnull(row.get(cout)) and pd.notnull(row.get("Taux €")) and pd.notnull(row.get("QUANTITY"))
+            else None,
+            axis=1
+        )
+    return df
+
+
+def bench_marges(args) -> None:
+    fusion = fusion_synthetique(args.lignes)
+    rates = {"EUR": 1.0, "USD": 0.93, "GBP": 1.15, "EGP": 0.019}
+    print(f"[BENCH] Taux, C.A en € et marges sur {args.lignes} lignes")
+    vecto, t_vecto = mesurer("vectorisé", lambda: calculer_montants_euro(fusion.copy(), rates), args.repetitions)
+    ligne, t_ligne = mesurer("apply(axis=1)", lambda: montants_ligne_a_ligne(fusion.copy(), rates), 1)
+    for col in ("Taux €", "C.A en €", "VAR Margin", "Margin"):
+        pd.testing.assert_series_equal(vecto[col], ligne[col].astype(float))
+    print(f"  → résultats identiques, accélération x{t_ligne / t_vecto:.0f}")
+
+
+def nettoyer_str_regex(s):
+    """Ancien nettoyage cellule par cellule (re.sub), conservé comme référence."""
+    if pd.isna(s):
+        return None
+    if isinstance(s, str):
+        s = s.strip().upper()
+        return re.sub(r'[^\x20-\x7E\u00A0-\uFFFF]', '', s)
+    return s
+
+
+def bench_normalisation(args) -> None:
+    rng = np.random.default_rng(0)
+    i = rng.integers(0, 5000, args.lignes)
+    fusion = pd.DataFrame({
+        "CUSTOMER NAME": pd.Series(i % 4000).map(" client {}\x07 ".format),
+        "PRODUCT NAME": pd.Series(i % 900).map("Produit\t{}".format).where(i % 17 > 0, None),
+        "ENSEIGNE": pd.Series(i % 50).map("enseigne {}".format),
+    })
+    print(f"[BENCH] nettoyer_str sur {args.lignes} lignes × {fusion.shape[1]} colonnes texte")
+
+    def par_cellule():
+        df = fusion.copy()
+        for col in df.columns:
+            df[col] = df[col].apply(nettoyer_str_regex)
+        return df
+
+    ancien, t_ancien = mesurer("apply + re.sub", par_cellule, 1)
+    nouveau, t_nouveau = mesurer("valeurs distinctes", lambda: normaliser(fusion.copy(), nettoyer_str), args.repetitions)
+    pd.testing.assert_frame_equal(ancien, nouveau)
+    print(f"  → résultats identiques, accélération x{t_ancien / t_nouveau:.1f}")
+
+
+def historique_bce(jours: int, devises: int = 30) -> str:
+    """Génère (ou réutilise) un eurofxref-hist.xml synthétique de `jours` jours ouvrés."""
+    os.makedirs(DOSSIER_BENCH, exist_ok=True)
+    path = os.path.join(DOSSIER_BENCH, f"eurofxref-hist_{jours}.xml")
+    if os.path.exists(path):
+        return path
+    print(f"[INFO] Génération de {path}…", flush=True)
+    rng = np.random.default_rng(0)
+    codes = [chr(65 + i // 26 % 26) + chr(65 + i % 26) + "X" for i in range(devises)]
+    dates = pd.bdate_range(end="2025-03-14", periods=jours)[::-1]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<gesmes:Envelope xmlns:gesmes="http://www.gesmes.org/xml/2002-08-01" '
+                'xmlns="http://www.ecb.int/vocabulary/2002-08-01/eurofxref">\n<gesmes:subject>Reference rates</gesmes:subject>\n<Cube>\n')
+        for d in dates:
+            f.write(f'<Cube time="{d:%Y-%m-%d}">')
+            for code in codes:
+                if rng.random() < 0.97:  # quelques devises non cotées certains jours
+                    f.write(f'<Cube currency="{code}" rate="{rng.random() * 100:.4f}"/>')
+            f.write("</Cube>\n")
+        f.write("</Cube>\n</gesmes:Envelope>\n")
+    return path
+
+
+def taux_arbre(contenu: bytes, date: str) -> dict:
+    """Ancienne recherche de get_ecb_rates (ET.fromstring + root.find par date), conservée comme référence."""
+    root = ET.fromstring(contenu)
+    ns = {'ns': 'http://www.ecb.int/vocabulary/2002-08-01/eurofxref'}
+    rates = {"EUR": 1.0}
+    limit_date = (datetime.strptime(date, "%Y-%m-%d") - timedelta(days=60)).strftime("%Y-%m-%d")
+    dates = [cube.attrib["time"] for cube in root.findall(".//ns:Cube[@time]", ns)]
+    dates = sorted([d for d in dates if limit_date <= d <= date], reverse=True)
+    for d in dates:
+        cube_d = root.find(f".//ns:Cube[@time='{d}']", ns)
+        for cube in cube_d.findall("ns:Cube", ns):
+            if cube.attrib["currency"] not in rates:
+                rates[cube.attrib["currency"]] = float(cube.attrib["rate"])
+    dates = sorted((cube.attrib["time"] for cube in root.findall(".//ns:Cube[@time]", ns)), reverse=True)
+    target_date = next(d for d in dates if d <= date)
+    for cube in root.find(f".//ns:Cube[@time='{target_date}']", ns).findall("ns:Cube", ns):
+        if float(cube.attrib["rate"]) != 0:
+            rates[cube.attrib["currency"]] = float(cube.attrib["rate"])
+    return rates
+
+
+def bench_bce(args) -> None:
+    path = args.hist or historique_bce(args.jours)
+    with open(path, "rb") as f:
+        contenu = f.read()
+    print(f"[BENCH] Historique BCE {os.path.basename(path)} ({len(contenu) / 2**20:.1f} Mo), "
+          f"{args.dates} dates recherchées")
+    index = lire_index(path)
+    dates = [str(d) for d in index.dates[np.linspace(70, len(index) - 1, args.dates).astype(int)]]
+
+    ancien, t_ancien = mesurer("fromstring + root.find", lambda: [taux_arbre(contenu, d) for d in dates], 1)
+    _, t_lecture = mesurer("iterparse → IndexTaux", lambda: lire_index(path), args.repetitions)
+    nouveau, t_recherche = mesurer("recherches searchsorted", lambda: [index.taux_au(d)[0] for d in dates],
+                                   args.repetitions)
+    assert ancien == nouveau
+    print(f"  → résultats identiques, accélération x{t_ancien / (t_lecture + t_recherche):.0f} "
+          f"(une lecture puis {args.dates} recherches, contre une lecture par appel)")
+
+
+def fusion_doublons(lignes: int) -> pd.DataFrame:
+    """Frame de 25 colonnes (texte, catégories, montants) avec ~40 % de lignes répétées."""
+    rng = np.random.default_rng(0)
+    i = rng.integers(0, int(lignes * 0.6), lignes)
+    colonnes = {"MONTH": pd.Timestamp("2025-01-01") + pd.to_timedelta(i % 12 * 31, unit="D")}
+    for k, nom in enumerate(["SIAMP UNIT", "SALE TYPE", "TYPE OF CANAL", "FAMILLE", "CURRENCY", "COUNTRY",
+                             "NOMFICHIER", "FEUILLE"]):
+        colonnes[nom] = pd.Categorical(pd.Series(i % (3 + k)).map(f"{nom} {{}}".format))
+    for k, nom in enumerate(["CUSTOMER NAME", "COMMERCIAL AREA", "SUR FAMILLE", "REFERENCE", "PRODUCT NAME",
+                             "Enseigne ret", "Sur famille", "ENSEIGNE", "CLIENT"]):
+        colonnes[nom] = pd.Series(i % (40 + 500 * k)).map(f"{nom[:3]} {{}}".format)
+    for k, nom in enumerate(["QUANTITY", "TURNOVER", "C.A en €", "VARIABLE COSTS", "COGS", "VAR Margin",
+                             "Margin"]):
+        colonnes[nom] = (i * (k + 7) % 100_003) / 7.0
+    return pd.DataFrame(colonnes)
+
+
+def bench_doublons(args) -> None:
+    fusion = fusion_doublons(args.lignes)
+    cle = ["MONTH", "REFERENCE", "CUSTOMER NAME", "QUANTITY"]
+    print(f"[BENCH] Doublons sur {args.lignes} lignes × {fusion.shape[1]} colonnes")
+    for nom, colonnes, garder in (("clé métier", cle, "last"), ("ligne entière", None, "first")):
+        ancien, t_ancien = mesurer(f"drop_duplicates ({nom})",
+                                   lambda: fusion.drop_duplicates(subset=colonnes, keep=garder), args.repetitions)
+        (nouveau, journal), t_nouveau = mesurer(f"empreintes ({nom})",
+                                                lambda: dedoublonner(fusion, colonnes, garder), args.repetitions)
+        pd.testing.assert_frame_equal(ancien, nouveau)
+        print(f"  → résultats identiques, {len(journal)} ligne(s) écartée(s) et journalisée(s), "
+              f"coût relatif x{t_nouveau / t_ancien:.1f} journal compris")
+
+
+def references_synthetiques(lignes: int) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Frame fusionné (COUNTRY, REFERENCE, ENSEIGNE) et tables zones / sur-famille / enseigne à clés uniques."""
+    rng = np.random.default_rng(0)
+    fusion = pd.DataFrame({
+        "COUNTRY": pd.Series(rng.integers(0, 60, lignes)).map("PAYS {}".format),
+        "REFERENCE": pd.Series(rng.integers(0, 25_000, lignes)).map("REF{:06d}".format),
+        "ENSEIGNE": pd.Series(rng.integers(0, 3_000, lignes)).map("CLIENT {}".format),
+        "QUANTITY": rng.integers(1, 500, lignes),
+    })
+    # ~10 % des clés sans correspondance, comme les références hors catalogue
+    zones = pd.DataFrame({"PAYS": [f"PAYS {k}" for k in range(54)],
+                          "COMMERCIAL AREA": [f"ZONE {k % 7}" for k in range(54)]})
+    sur_famille = pd.DataFrame({"REFERENCE": [f"REF{k:06d}" for k in range(22_500)],
+                                "Sur-famille": [f"FAM {k % 40}" for k in range(22_500)]})
+    enseigne = pd.DataFrame({"concat_key": [f"CLIENT {k}" for k in range(2_700)],
+                             "Enseigne ret": [f"ENS {k % 90}" for k in range(2_700)]})
+    return fusion, zones, sur_famille, enseigne
+
+
+def enrichir_par_merge(fusion, zones, sur_famille, enseigne) -> pd.DataFrame:
+    """Ancienne chaîne : trois merge(how="left") successifs."""
+    df = fusion.merge(zones, how="left", left_on="COUNTRY", right_on="PAYS").drop(columns=["PAYS"])
+    df = df.merge(sur_famille, how="left", on="REFERENCE")
+    df = df.merge(enseigne, how="left", left_on="ENSEIGNE", right_on="concat_key").drop(columns=["concat_key"])
+    return df
+
+
+def enrichir_par_index(fusion, zones, sur_famille, enseigne) -> pd.DataFrame:
+    df = fusion.copy()  # enrichir complète le frame sur place
+    df, _ = enrichir(df, "COUNTRY", zones, "PAYS", "COMMERCIAL AREA")
+    df, _ = enrichir(df, "REFERENCE", sur_famille, "REFERENCE", "Sur-famille")
+    df, _ = enrichir(df, "ENSEIGNE", enseigne, "concat_key", "Enseigne ret")
+    return df
+
+
+def bench_enrichissement(args) -> None:
+    tables = references_synthetiques(args.lignes)
+    print(f"[BENCH] Correspondances sur {args.lignes} lignes (3 tables de référence)")
+    ancien, t_ancien = mesurer("3 × merge(how=left)", lambda: enrichir_par_merge(*tables), args.repetitions)
+    nouveau, t_nouveau = mesurer("index + take", lambda: enrichir_par_index(*tables), args.repetitions)
+    pd.testing.assert_frame_equal(ancien, nouveau)
+    print(f"  → résultats identiques, accélération x{t_ancien / t_nouveau:.1f} (copie du frame comprise)")
+
+
+def ecriture_trois_passages(df: pd.DataFrame, chemin: str) -> None:
+    """Ancienne sortie : to_excel, relecture load_workbook, table + format € cellule par cellule, save."""
+    from openpyxl import load_workbook
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.table import Table, TableStyleInfo
+    df.to_excel(chemin, index=False)
+    wb = load_workbook(chemin)
+    ws = wb.active
+    table = Table(displayName="FusionTable", ref=f"A1:{get_column_letter(ws.max_column)}{ws.max_row}")
+    table.tableStyleInfo = TableStyleInfo(name="TableStyleMedium9", showFirstColumn=False, showLastColumn=False,
+                                          showRowStripes=True, showColumnStripes=False)
+    ws.add_table(table)
+    for col_idx in range(1, ws.max_column + 1):
+        if ws.cell(row=1, column=col_idx).value in COLONNES_EURO:
+            for row_idx in range(2, ws.max_row + 1):
+                ws.cell(row=row_idx, column=col_idx).number_format = FORMAT_EURO
+    wb.save(chemin)
+
+
+def ecriture_un_passage(df: pd.DataFrame, chemin: str) -> None:
+    classeur = classeur_sortie()
+    ecrire_feuille(classeur, df, "Sheet1", formats={c: FORMAT_EURO for c in COLONNES_EURO}, table="FusionTable")
+    classeur.save(chemin)
+
+
+def bench_ecriture(args) -> None:
+    fusion = fusion_doublons(args.lignes)
+    os.makedirs(DOSSIER_BENCH, exist_ok=True)
+    ancien = os.path.join(DOSSIER_BENCH, "sortie_trois_passages.xlsx")
+    nouveau = os.path.join(DOSSIER_BENCH, "sortie_un_passage.xlsx")
+    print(f"[BENCH] Écriture de la sortie : {args.lignes} lignes × {fusion.shape[1]} colonnes")
+    _, t_ancien = mesurer("to_excel + openpyxl", lambda: ecriture_trois_passages(fusion, ancien), args.repetitions)
+    _, t_nouveau = mesurer("write_only un passage", lambda: ecriture_un_passage(fusion, nouveau), args.repetitions)
+    pd.testing.assert_frame_equal(pd.read_excel(ancien), pd.read_excel(nouveau))
+    print(f"  → valeurs relues identiques, accélération x{t_ancien / t_nouveau:.1f} "
+          f"({os.path.getsize(ancien) / 2**20:.1f} Mo contre {os.path.getsize(nouveau) / 2**20:.1f} Mo)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks ETL SIAMP")
+    sous = parser.add_subparsers(dest="bench", required=True)
+    p = sous.add_parser("lecture", help="lecteur stream vs pd.ExcelFile.parse")
+    p.add_argument("--lignes", type=int, default=120_000)
+    p.add_argument("--repetitions", type=int, default=1)
+    p.set_defaults(fn=bench_lecture)
+    p = sous.add_parser("marges", help="calcul vectorisé vs apply(axis=1)")
+    p.add_argument("--lignes", type=int, default=1_000_000)
+    p.add_argument("--repetitions", type=int, default=3)
+    p.set_defaults(fn=bench_marges)
+    p = sous.add_parser("normalisation", help="nettoyage par valeurs distinctes vs apply cellule par cellule")
+    p.add_argument("--lignes", type=int, default=1_000_000)
+    p.add_argument("--repetitions", type=int, default=3)
+    p.set_defaults(fn=bench_normalisation)
+    p = sous.add_parser("bce", help="iterparse + IndexTaux vs ET.fromstring + root.find par date")
+    p.add_argument("--hist", default=None, help="copie enregistrée d'eurofxref-hist.xml (défaut : synthétique)")
+    p.add_argument("--jours", type=int, default=6700)
+    p.add_argument("--dates", type=int, default=12)
+    p.add_argument("--repetitions", type=int, default=3)
+    p.set_defaults(fn=bench_bce)
+    p = sous.add_parser("doublons", help="empreintes 64 bits vs drop_duplicates")
+    p.add_argument("--lignes", type=int, default=2_000_000)
+    p.add_argument("--repetitions", type=int, default=3)
+    p.set_defaults(fn=bench_doublons)
+    p = sous.add_parser("enrichissement", help="recherche indexée vs trois merge successifs")
+    p.add_argument("--lignes", type=int, default=1_000_000)
+    p.add_argument("--repetitions", type=int, default=3)
+    p.set_defaults(fn=bench_enrichissement)
+    p = sous.add_parser("ecriture", help="écriture write_only en un passage vs to_excel + load_workbook + save")
+    p.add_argument("--lignes", type=int, default=20_000)
+    p.add_argument("--repetitions", type=int, default=1)
+    p.set_defaults(fn=bench_ecriture)
+    args = parser.parse_args()
+    args.fn(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""Configuration pytest : modules ETL_SIAMP_* importables depuis tests/, classeur d'exemple, exécution du core."""
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RACINE not in sys.path:
+    sys.path.insert(0, RACINE)
+
+CLASSEUR_EXEMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "EGY TURNOVER V2.xlsx")
+
+
+@pytest.fixture
+def classeur_exemple() -> str:
+    return CLASSEUR_EXEMPLE
+
+
+@pytest.fixture
+def executer_etl(tmp_path):
+    """Lance ETL_SIAMP.py dans tmp_path (sans ref_files.cfg, dossier de travail isolé) ; renvoie le processus terminé."""
+    def executer(*args: str) -> subprocess.CompletedProcess:
+        env = dict(os.environ, FROM_GUI="1", ETL_SIAMP_DATA=str(tmp_path / "donnees"), PYTHONIOENCODING="utf-8")
+        return subprocess.run([sys.executable, os.path.join(RACINE, "ETL_SIAMP.py"), *args], cwd=tmp_path, env=env,
+                              capture_output=True, text=True, encoding="utf-8", timeout=300)
+    return executer
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""CacheFeuilles : relecture à l'identique, invalidation sur modification du fichier, éviction LRU."""
+from __future__ import annotations
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ETL_SIAMP_CACHE import PARQUET_DISPONIBLE, CacheFeuilles
+
+pytestmark = pytest.mark.skipif(not PARQUET_DISPONIBLE, reason="pyarrow requis pour le cache")
+
+
+def _feuille(n: int = 200, graine: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(graine)
+    return pd.DataFrame({
+        "MONTH": pd.date_range("2025-01-01", periods=n, freq="D"),
+        "CUSTOMER NAME": np.where(rng.random(n) < 0.2, np.nan, rng.choice(np.array(["A", "B", "C"], dtype=object), n)),
+        "QUANTITY": rng.integers(0, 1000, n),
+        "TURNOVER": rng.random(n) * 1000,
+    })
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "EGY TURNOVER.xlsx"
+    path.write_bytes(b"contenu initial")
+    return str(path)
+
+
+def _chemin(cache: CacheFeuilles, source: str, feuille: str) -> str:
+    return cache._chemin(cache.cle_fichier(source), cache._suffixe_feuille(feuille, "stream"))
+
+
+def _fichiers(cache: CacheFeuilles) -> dict[str, int]:
+    return {e.name: e.stat().st_size for e in os.scandir(cache.dossier) if e.name.endswith(".parquet")}
+
+
+def test_relecture_identique(tmp_path, source):
+    cache = CacheFeuilles(str(tmp_path / "cache"))
+    df = _feuille()
+    assert cache.lire(source, "TURNOVER", "stream") is None
+    assert cache.ecrire(source, "TURNOVER", "stream", df)
+    pd.testing.assert_frame_equal(cache.lire(source, "TURNOVER", "stream"), df)
+    assert cache.lire_colonnes(source, "TURNOVER", "stream") == list(df.columns)
+    # clé distincte par feuille et par lecteur
+    assert cache.lire(source, "TURNOVER", "pandas") is None
+    assert cache.lire(source, "TURNOVER Jan 25", "stream") is None
+
+
+def test_invalidation_fichier_modifie(tmp_path, source):
+    cache = CacheFeuilles(str(tmp_path / "cache"))
+    cache.ecrire(source, "TURNOVER", "stream", _feuille())
+    st = os.stat(source)
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))   # même taille, mtime changé
+    assert cache.lire(source, "TURNOVER", "stream") is None
+    cache.ecrire(source, "TURNOVER", "stream", _feuille())
+    with open(source, "ab") as f:                                          # taille changée
+        f.write(b" modifie")
+    assert cache.lire(source, "TURNOVER", "stream") is None
+
+
+def test_empreinte_contenu(tmp_path, source):
+    cache = CacheFeuilles(str(tmp_path / "cache"), empreinte="contenu")
+    df = _feuille()
+    cache.ecrire(source, "TURNOVER", "stream", df)
+    st = os.stat(source)
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))   # contenu inchangé : toujours valide
+    pd.testing.assert_frame_equal(CacheFeuilles(cache.dossier, empreinte="contenu").lire(source, "TURNOVER", "stream"), df)
+    with open(source, "wb") as f:
+        f.write(b"autre contenu!!")
+    assert CacheFeuilles(cache.dossier, empreinte="contenu").lire(source, "TURNOVER", "stream") is None
+    with pytest.raises(ValueError):
+        CacheFeuilles(cache.dossier, empreinte="inconnue")
+
+
+def test_eviction_lru_et_taille_max(tmp_path, source):
+    cache = CacheFeuilles(str(tmp_path / "cache"))
+    feuilles = ["A", "B", "C"]
+    for i, feuille in enumerate(feuilles):
+        cache.ecrire(source, feuille, "stream", _feuille(graine=i))
+    fichiers = _fichiers(cache)
+    assert len(fichiers) == 3
+
+    # dates d'accès contrôlées : A la plus ancienne, puis B, puis C ; relire A la rafraîchit
+    maintenant = time.time()
+    for age, feuille in zip((300, 200, 100), feuilles):
+        os.utime(_chemin(cache, source, feuille), (maintenant - age, maintenant - age))
+    assert cache.lire(source, "A", "stream") is not None
+
+    cache.taille_max = sum(fichiers.values()) + 100   # place pour trois feuilles seulement
+    cache.ecrire(source, "D", "stream", _feuille(graine=3))
+    assert cache.lire(source, "B", "stream") is None        # la moins récemment utilisée
+    for feuille in ("A", "C", "D"):
+        assert cache.lire(source, feuille, "stream") is not None
+    assert sum(_fichiers(cache).values()) <= cache.taille_max
+
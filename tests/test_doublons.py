@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Dédoublonnage par empreintes : même résultat que drop_duplicates, journal des lignes écartées."""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ETL_SIAMP_DOUBLONS import dedoublonner, empreintes
+
+
+def _frame(n: int = 3000, graine: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(graine)
+    clients = np.array(["CLIENT A", "CLIENT B", "client b", "CLIENT C", None], dtype=object)
+    df = pd.DataFrame({
+        "MONTH": pd.to_datetime("2025-01-01") + pd.to_timedelta(rng.integers(0, 3, n) * 31, unit="D"),
+        "REFERENCE": rng.integers(10013250, 10013260, n),
+        "CUSTOMER NAME": clients[rng.integers(0, len(clients), n)],
+        "QUANTITY": np.where(rng.random(n) < 0.1, np.nan, rng.integers(1, 4, n).astype(float)),
+        "CURRENCY": pd.Categorical(rng.choice(["EGP", "EUR", "GBP"], n)),
+        "NOMFICHIER": rng.choice(["EGY.xlsx", "GBR.xlsx"], n),
+        "FEUILLE": "TURNOVER",
+    })
+    df.loc[df.index[::97], "MONTH"] = pd.NaT
+    return df
+
+
+@pytest.mark.parametrize("garder", ["first", "last"])
+@pytest.mark.parametrize("colonnes", [None, ["MONTH", "REFERENCE", "CUSTOMER NAME", "QUANTITY"], ["CURRENCY"]])
+def test_identique_a_drop_duplicates(colonnes, garder):
+    df = _frame()
+    attendu = df.drop_duplicates(subset=colonnes, keep=garder)
+    resultat, journal = dedoublonner(df, colonnes, garder=garder, etape="test")
+    pd.testing.assert_frame_equal(resultat, attendu)
+    assert len(journal) == len(df) - len(attendu)
+
+
+def test_journal_origines():
+    df = pd.DataFrame({
+        "REFERENCE": [1, 2, 1, 1],
+        "QUANTITY": [5.0, 6.0, 5.0, 5.0],
+        "NOMFICHIER": ["A.xlsx", "A.xlsx", "B.xlsx", "C.xlsx"],
+        "FEUILLE": ["TURNOVER", "TURNOVER", "TURNOVER Jan 25", "TURNOVER"],
+    })
+    resultat, journal = dedoublonner(df, ["REFERENCE", "QUANTITY"], garder="last", etape="clé métier")
+    assert resultat.index.tolist() == [1, 3]
+    assert journal["NOMFICHIER"].tolist() == ["A.xlsx", "B.xlsx"]
+    assert journal["NOMFICHIER CONSERVÉE"].tolist() == ["C.xlsx", "C.xlsx"]
+    assert journal["FEUILLE"].tolist() == ["TURNOVER", "TURNOVER Jan 25"]
+    assert set(journal["ÉTAPE"]) == {"clé métier"}
+    assert journal["REFERENCE"].tolist() == [1, 1]
+
+
+def test_sans_doublon():
+    df = _frame(50).drop_duplicates()
+    resultat, journal = dedoublonner(df)
+    pd.testing.assert_frame_equal(resultat, df)
+    assert journal.empty
+
+
+def test_empreintes_comme_hash_pandas_object():
+    df = _frame(500)[["REFERENCE", "CUSTOMER NAME", "QUANTITY"]]
+    attendu = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    np.testing.assert_array_equal(empreintes(df), attendu)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Écriture write_only : mêmes valeurs que pandas.to_excel, formats €/dates, table, en-tête."""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from ETL_SIAMP_ECRITURE import (FORMAT_DATE_HEURE, FORMAT_EURO, LIGNES_MAX_FEUILLE, STYLE_TABLE, classeur_sortie,
+                                ecrire_feuille)
+
+COLONNES_EURO = ["C.A en €", "VAR Margin", "Margin"]
+
+
+def _fusion() -> pd.DataFrame:
+    return pd.DataFrame({
+        "MONTH": pd.to_datetime(["2025-01-02", "2025-02-03", None, "2025-03-04"]),
+        "REFERENCE": [10013254, 10013255, 10013256, 10013257],
+        "CUSTOMER NAME": ["CLIENT A", None, "CLIENT C", "CLIENT D"],
+        "QUANTITY": [800, 10, 3, 1],
+        "CURRENCY": pd.Categorical(["EGP", "EUR", "EGP", "GBP"]),
+        "C.A en €": [1520.0, np.nan, 3.25, np.inf],
+        "VAR Margin": [np.nan, np.nan, -1.5, 2.0],
+        "Margin": [np.nan, 4.0, np.nan, np.nan],
+    })
+
+
+@pytest.fixture
+def sortie(tmp_path):
+    df = _fusion()
+    path = tmp_path / "sortie.xlsx"
+    classeur = classeur_sortie()
+    ecrire_feuille(classeur, df, "Sheet1", formats={c: FORMAT_EURO for c in COLONNES_EURO}, table="FusionTable")
+    classeur.save(path)
+    return df, path
+
+
+def test_valeurs_comme_to_excel(sortie, tmp_path):
+    df, path = sortie
+    df.to_excel(tmp_path / "pandas.xlsx", index=False)
+    attendu = [list(r) for r in load_workbook(tmp_path / "pandas.xlsx").active.iter_rows(values_only=True)]
+    lu = [list(r) for r in load_workbook(path)["Sheet1"].iter_rows(values_only=True)]
+    assert lu == attendu
+
+
+def test_formats_euro_y_compris_cellules_vides(sortie):
+    df, path = sortie
+    ws = load_workbook(path)["Sheet1"]
+    entete = [c.value for c in ws[1]]
+    for nom in COLONNES_EURO:
+        col = entete.index(nom) + 1
+        formats = {ws.cell(row=r, column=col).number_format for r in range(2, len(df) + 2)}
+        assert formats == {FORMAT_EURO}, nom
+        assert ws.column_dimensions[ws.cell(row=1, column=col).column_letter].number_format == FORMAT_EURO
+    assert ws.cell(row=2, column=entete.index("QUANTITY") + 1).number_format == "General"
+
+
+def test_format_dates(sortie):
+    _, path = sortie
+    ws = load_workbook(path)["Sheet1"]
+    assert ws["A2"].number_format == FORMAT_DATE_HEURE
+    assert ws["A4"].value is None
+    assert ws.column_dimensions["A"].number_format == FORMAT_DATE_HEURE
+
+
+def test_table_et_entete(sortie):
+    df, path = sortie
+    ws = load_workbook(path)["Sheet1"]
+    table = ws.tables["FusionTable"]
+    assert table.ref == "A1:H5"
+    assert table.tableStyleInfo.name == STYLE_TABLE
+    assert [c.name for c in table.tableColumns] == list(df.columns)
+    assert all(c.font.bold and c.border.left.style == "thin" for c in ws[1])
+
+
+def test_options_historique(tmp_path):
+    path = tmp_path / "historique.xlsx"
+    classeur = classeur_sortie()
+    ecrire_feuille(classeur, _fusion(), "Sheet1", table="HistoriqueTable", style_table="TableStyleMedium2",
+                   figer=True, largeur_max=12)
+    classeur.save(path)
+    ws = load_workbook(path)["Sheet1"]
+    assert ws.freeze_panes == "A2"
+    assert ws.tables["HistoriqueTable"].tableStyleInfo.name == "TableStyleMedium2"
+    assert ws.column_dimensions["A"].width == 12          # "2025-01-02" + 2, plafonné
+    assert ws.column_dimensions["D"].width == len("QUANTITY") + 2
+
+
+def test_feuille_trop_grande_refusee():
+    trop = pd.DataFrame({"A": np.zeros(LIGNES_MAX_FEUILLE + 1)})
+    with pytest.raises(ValueError, match="limite d'Excel"):
+        ecrire_feuille(classeur_sortie(), trop, "Sheet1")
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Enrichissement indexé : mêmes colonnes et mêmes lignes que le merge left qu'il remplace."""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from ETL_SIAMP_ENRICHISSEMENT import enrichir
+
+
+def _fusion() -> pd.DataFrame:
+    return pd.DataFrame({
+        "REFERENCE": ["10013254", "10013255", "INCONNUE", None, "10013254", "10013256"],
+        "COUNTRY": ["EGYPT", "EGYPT", "FRANCE", "UK", "SPAIN", "EGYPT"],
+        "QUANTITY": [800, 10, 3, 1, 2, 7],
+    })
+
+
+def _par_merge(df, cle, table, cle_table, colonne, nom=None) -> pd.DataFrame:
+    """Ancien chemin : merge left, clé de droite retirée, colonne existante remplacée (_x/_y)."""
+    nom = nom or colonne
+    droite = table[[cle_table, colonne]].rename(columns={colonne: nom})
+    if cle == cle_table:
+        fusion = df.merge(droite, how="left", on=cle)
+    else:
+        fusion = df.merge(droite, how="left", left_on=cle, right_on=cle_table).drop(columns=[cle_table])
+    if f"{nom}_x" in fusion.columns:
+        fusion = fusion.drop(columns=[f"{nom}_x"]).rename(columns={f"{nom}_y": nom})
+    return fusion
+
+
+def test_cle_unique():
+    table = pd.DataFrame({"REF": ["10013254", "10013255", "10013256"], "Sur-famille": ["TECH", "SET", "SPARE"]})
+    attendu = _par_merge(_fusion(), "REFERENCE", table, "REF", "Sur-famille", "SUR FAMILLE")
+    resultat, rapport = enrichir(_fusion(), "REFERENCE", table, "REF", "Sur-famille", "SUR FAMILLE")
+    pd.testing.assert_frame_equal(resultat, attendu)
+    assert rapport["lignes"] == 6 and rapport["trouvees"] == 4
+    assert rapport["absentes"][0] == "INCONNUE" and pd.isna(rapport["absentes"][1])
+
+
+def test_meme_nom_de_cle_et_colonne_remplacee():
+    fusion = _fusion()
+    fusion["COMMERCIAL AREA"] = "ANCIENNE"
+    table = pd.DataFrame({"COUNTRY": ["EGYPT", "SPAIN"], "COMMERCIAL AREA": ["MEA", "EUROPE"]})
+    attendu = _par_merge(fusion.copy(), "COUNTRY", table, "COUNTRY", "COMMERCIAL AREA")
+    resultat, rapport = enrichir(fusion.copy(), "COUNTRY", table, "COUNTRY", "COMMERCIAL AREA")
+    pd.testing.assert_frame_equal(resultat, attendu)
+    assert list(resultat.columns)[-1] == "COMMERCIAL AREA"
+    assert rapport["taux"] == 4 / 6
+
+
+def test_cle_non_unique_repli_sur_merge():
+    # un pays rattaché à deux zones : le merge duplique la ligne, l'enrichissement aussi
+    table = pd.DataFrame({"PAYS": ["EGYPT", "EGYPT", "SPAIN"], "COMMERCIAL AREA": ["MEA", "AFRICA", "EUROPE"]})
+    attendu = _par_merge(_fusion(), "COUNTRY", table, "PAYS", "COMMERCIAL AREA")
+    resultat, rapport = enrichir(_fusion(), "COUNTRY", table, "PAYS", "COMMERCIAL AREA")
+    pd.testing.assert_frame_equal(resultat, attendu)
+    assert len(resultat) == len(_fusion()) + 3
+    assert rapport["absentes"] == ["FRANCE", "UK"]
+
+
+def test_grand_frame_aleatoire():
+    rng = np.random.default_rng(1)
+    cles = np.array([f"K{i}" for i in range(300)], dtype=object)
+    fusion = pd.DataFrame({"CLE": cles[rng.integers(0, 300, 20_000)], "V": rng.random(20_000)})
+    table = pd.DataFrame({"CLE": cles[::2], "ZONE": [f"Z{i % 7}" for i in range(150)]})
+    attendu = _par_merge(fusion.copy(), "CLE", table, "CLE", "ZONE")
+    resultat, _ = enrichir(fusion.copy(), "CLE", table, "CLE", "ZONE")
+    pd.testing.assert_frame_equal(resultat, attendu)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Ordonnanceur d'étapes : graphe vérifié, secours, chemin critique, sortie des étapes thread retenue d'un bloc."""
+from __future__ import annotations
+
+import contextvars
+import sys
+import threading
+import time
+from functools import partial
+
+import pytest
+
+from ETL_SIAMP_ETAPES import Etape, Ordonnanceur, _Aiguillage
+
+
+def _constante(valeur, **entrees):
+    return valeur
+
+
+# ------------------------------------------------------------------ graphe
+def test_noms_en_double():
+    with pytest.raises(ValueError, match="double"):
+        Ordonnanceur([Etape("a", _constante), Etape("a", _constante)])
+
+
+def test_entree_inconnue():
+    with pytest.raises(ValueError, match=r"« b ».*\['x'\]"):
+        Ordonnanceur([Etape("a", _constante), Etape("b", _constante, ["a", "x"])])
+
+
+def test_cycle_detecte_avant_execution():
+    appels = []
+    etapes = [Etape("a", appels.append), Etape("b", _constante, ["a", "d"]),
+              Etape("c", _constante, ["b"]), Etape("d", _constante, ["c"])]
+    with pytest.raises(ValueError, match=r"Cycle.*\['b', 'c', 'd'\]"):
+        Ordonnanceur(etapes)
+    assert appels == []
+
+
+def test_executeur_inconnu():
+    with pytest.raises(ValueError, match="Exécuteur inconnu"):
+        Etape("a", _constante, executeur="gpu")
+
+
+def test_resultats_transmis_et_rappels():
+    rappels = []
+    etapes = [
+        Etape("a", partial(_constante, 2), executeur="thread", rappel=rappels.append),
+        Etape("b", partial(_constante, 3)),
+        Etape("somme", lambda a, b: a + b, ["a", "b"], rappel=rappels.append),
+    ]
+    assert Ordonnanceur(etapes).executer() == {"a": 2, "b": 3, "somme": 5}
+    assert sorted(rappels) == [2, 5]
+
+
+# ------------------------------------------------------------------ secours
+def _echec(**entrees):
+    raise RuntimeError("réseau indisponible")
+
+
+@pytest.mark.parametrize("executeur", ["thread", "processus"])
+def test_secours_remplace_le_resultat(executeur):
+    fn = _echec if executeur == "thread" else partial(int, "pas un nombre")
+    erreurs = []
+    etapes = [
+        Etape("lecture", fn, executeur=executeur, secours=lambda e: erreurs.append(type(e).__name__) or "repli"),
+        Etape("suite", lambda lecture: lecture.upper(), ["lecture"]),
+    ]
+    ordonnanceur = Ordonnanceur(etapes, processus=2)
+    assert ordonnanceur.executer()["suite"] == "REPLI"
+    assert erreurs == ["RuntimeError" if executeur == "thread" else "ValueError"]
+    assert set(ordonnanceur.fins) == {"lecture", "suite"}
+
+
+def test_erreur_sans_secours_remonte():
+    suite = []
+    etapes = [Etape("lecture", _echec, executeur="thread"), Etape("suite", suite.append, ["lecture"])]
+    with pytest.raises(RuntimeError, match="réseau"):
+        Ordonnanceur(etapes).executer()
+    assert suite == []
+    assert not isinstance(sys.stdout, _Aiguillage)
+
+
+# ------------------------------------------------------------------ chemin critique
+def test_chemin_critique():
+    etapes = [
+        Etape("court", lambda: time.sleep(0.02), executeur="thread"),
+        Etape("long", lambda: time.sleep(0.3), executeur="thread"),
+        Etape("milieu", lambda court: time.sleep(0.05), ["court"]),
+        Etape("fin", lambda milieu, long: None, ["milieu", "long"]),
+    ]
+    ordonnanceur = Ordonnanceur(etapes)
+    assert ordonnanceur.chemin_critique() == []
+    ordonnanceur.executer()
+    assert ordonnanceur.chemin_critique() == ["long", "fin"]
+    assert ordonnanceur.fins["long"] >= 0.3 > ordonnanceur.fins["milieu"]
+    assert all(ordonnanceur.debuts[n] <= ordonnanceur.fins[n] for n in ordonnanceur.fins)
+
+
+# ------------------------------------------------------------------ sortie console
+def _bavarde(nom: str, lignes: int = 5, sous_thread: bool = False, **entrees):
+    for i in range(lignes):
+        print(f"{nom} {i}", flush=True)
+        time.sleep(0.01)
+    if sous_thread:
+        # un fil lancé avec le contexte de l'étape écrit dans le même tampon
+        fil = threading.Thread(target=contextvars.copy_context().run, args=(print, f"{nom} sous-thread"))
+        fil.start()
+        fil.join()
+    return nom
+
+
+def test_sorties_thread_imprimees_d_un_bloc(capsys):
+    vu_par_la_fin = []
+    etapes = [
+        Etape("a", partial(_bavarde, "a", sous_thread=True), executeur="thread"),
+        Etape("b", partial(_bavarde, "b"), executeur="thread"),
+        Etape("c", partial(_bavarde, "c", 3), executeur="thread"),
+        Etape("principal", partial(_bavarde, "principal", 2)),
+        Etape("fin", lambda a, b, c: vu_par_la_fin.append(sys.stdout), ["a", "b", "c"]),
+    ]
+    sortie = sys.stdout
+    Ordonnanceur(etapes).executer()
+    lignes = capsys.readouterr().out.splitlines()
+
+    assert sys.stdout is sortie
+    assert vu_par_la_fin == [sortie]  # aiguillage retiré dès la dernière étape thread terminée
+    for nom, attendues in (("a", [f"a {i}" for i in range(5)] + ["a sous-thread"]),
+                           ("b", [f"b {i}" for i in range(5)]), ("c", [f"c {i}" for i in range(3)])):
+        debut = lignes.index(attendues[0])
+        assert lignes[debut:debut + len(attendues)] == attendues, lignes  # bloc contigu, dans l'ordre
+    # l'étape principale imprime directement, sans attendre la fin des étapes thread
+    assert lignes[:2] == ["principal 0", "principal 1"]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""Exécution complète du core : lecture parallèle (--workers) identique à la lecture séquentielle."""
+from __future__ import annotations
+
+import shutil
+
+import pandas as pd
+
+
+def _fusion(executer_etl, tmp_path, fichiers, sortie, *options) -> pd.DataFrame:
+    res = executer_etl("--fichiers", *fichiers, "--chemin_sortie", sortie, "--date", "2025-03-10",
+                       "--mois_selectionnes", "2025-01,2025-02,2025-03", "--taux_manuels", "EGP=0.019",
+                       "--historique", "aucun", *options)
+    assert res.returncode == 0, res.stdout + res.stderr
+    return pd.read_excel(tmp_path / sortie)
+
+
+def test_workers_identique_au_sequentiel(executer_etl, tmp_path, classeur_exemple):
+    fichiers = []
+    for nom in ("EGY_A TURNOVER.xlsx", "EGY_B TURNOVER.xlsx", "EGY_C TURNOVER.xlsx"):
+        shutil.copy(classeur_exemple, tmp_path / nom)
+        fichiers.append(nom)
+    sequentiel = _fusion(executer_etl, tmp_path, fichiers, "sequentiel.xlsx", "--workers", "1", "--no-cache")
+    parallele = _fusion(executer_etl, tmp_path, fichiers, "parallele.xlsx", "--workers", "3", "--no-cache")
+    assert len(sequentiel) > 0
+    pd.testing.assert_frame_equal(sequentiel, parallele)
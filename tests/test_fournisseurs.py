@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Fournisseurs de taux face à un serveur HTTP local (http.server) : 304, délais, 404, priorité, hors ligne."""
+from __future__ import annotations
+
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import ETL_SIAMP_TAUX
+from ETL_SIAMP_FOURNISSEURS import (CacheTaux, Fournisseur, FournisseurBCE, FournisseurCurrencyAPI,
+                                    FournisseurLocal, taux_fusionnes)
+
+ETAG = '"taux-v1"'
+DERNIERE_MODIF = "Mon, 10 Mar 2025 16:00:00 GMT"
+REPONSE = {"valid": True, "base": "USD", "rates": {"USD": 1.0, "EUR": 0.5, "GBP": 0.4, "EGP": 50.0}}
+
+
+class _Bouchon(BaseHTTPRequestHandler):
+    """/taux : JSON avec ETag (304 si revalidé) ; /lent : répond après 2 s ; le reste : 404."""
+    requetes: list[tuple[str, dict]] = []
+
+    def do_GET(self):
+        chemin = self.path.split("?")[0]
+        self.requetes.append((chemin, dict(self.headers)))
+        if chemin == "/lent":
+            time.sleep(2)
+        if chemin not in ("/taux", "/lent"):
+            self.send_error(404)
+            return
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        corps = json.dumps(REPONSE).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corps)))
+        self.send_header("ETag", ETAG)
+        self.send_header("Last-Modified", DERNIERE_MODIF)
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def serveur():
+    _Bouchon.requetes = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Bouchon)
+    httpd.daemon_threads = True
+    fil = threading.Thread(target=httpd.serve_forever, daemon=True)
+    fil.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _api(url: str, timeout: float = 5.0) -> FournisseurCurrencyAPI:
+    fournisseur = FournisseurCurrencyAPI("cle-test")
+    fournisseur.url = url
+    fournisseur.timeout = timeout
+    return fournisseur
+
+
+def _port_ferme() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_fournisseur_abstrait():
+    with pytest.raises(TypeError):
+        Fournisseur()
+
+
+def test_revalidation_etag(serveur):
+    api = _api(f"{serveur}/taux")
+    premier = api.taux()
+    assert premier["EUR"] == 1.0 and premier["GBP"] == pytest.approx(0.8)
+    assert api.validateurs == {"etag": ETAG, "last_modified": DERNIERE_MODIF}
+
+    second = api.taux()   # 304 : dernière réponse resservie
+    assert second == premier
+    (_, entetes1), (_, entetes2) = _Bouchon.requetes
+    assert "If-None-Match" not in entetes1
+    assert entetes2["If-None-Match"] == ETAG
+    assert entetes2["If-Modified-Since"] == DERNIERE_MODIF
+
+
+def test_delai_depasse_ignore(serveur, capsys):
+    lent = _api(f"{serveur}/lent", timeout=0.3)
+    debut = time.monotonic()
+    taux, provenance = taux_fusionnes([lent, FournisseurLocal({"EUR": 1.0, "MAD": 0.094})])
+    assert time.monotonic() - debut < 1.5
+    assert taux == {"EUR": 1.0, "MAD": 0.094}
+    assert set(provenance.values()) == {"local"}
+    assert "currencyapi" in capsys.readouterr().out
+
+
+def test_404_ignore(serveur, capsys):
+    absent = _api(f"{serveur}/introuvable")
+    taux, provenance = taux_fusionnes([absent, FournisseurLocal({"EUR": 1.0})])
+    assert taux == {"EUR": 1.0} and provenance == {"EUR": "local"}
+    assert "404" in capsys.readouterr().out
+
+
+def test_fusion_par_priorite(serveur):
+    api = _api(f"{serveur}/taux")
+    local = FournisseurLocal({"GBP": 9.9, "MAD": 0.094})
+    taux, provenance = taux_fusionnes([api, local])
+    assert taux["GBP"] == pytest.approx(0.8) and provenance["GBP"] == "currencyapi"
+    assert taux["MAD"] == 0.094 and provenance["MAD"] == "local"
+
+    # ordre inversé : le fournisseur local passe devant
+    taux, provenance = taux_fusionnes([local, api])
+    assert taux["GBP"] == 9.9 and provenance["GBP"] == "local"
+    assert provenance["USD"] == "currencyapi"
+
+
+def test_fusion_arretee_quand_devises_couvertes(serveur):
+    lent = _api(f"{serveur}/lent", timeout=5.0)
+    debut = time.monotonic()
+    taux, _ = taux_fusionnes([FournisseurLocal({"EUR": 1.0, "MAD": 0.094}), lent], devises={"MAD"})
+    assert time.monotonic() - debut < 1.5
+    assert taux == {"EUR": 1.0, "MAD": 0.094}
+
+
+def test_cache_evite_la_requete(serveur):
+    cache = CacheTaux()
+    api = _api(f"{serveur}/taux")
+    premier, _ = taux_fusionnes([api], cache=cache)
+    second, _ = taux_fusionnes([api], cache=cache)
+    assert premier == second
+    assert len(_Bouchon.requetes) == 1
+
+
+def test_repli_hors_ligne(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("ETL_SIAMP_DATA", str(tmp_path))
+    injoignable = f"http://127.0.0.1:{_port_ferme()}/eurofxref.xml"
+    for nom in ("URL_HIST", "URL_90J", "URL_JOUR"):
+        monkeypatch.setattr(ETL_SIAMP_TAUX, nom, injoignable)
+
+    bce = FournisseurBCE(secours={"EUR": 1.0, "USD": 0.93})
+    bce.timeout = 2.0
+    cache = CacheTaux()
+    taux, provenance = taux_fusionnes([bce, FournisseurLocal({"MAD": 0.094})], "2025-03-10", cache=cache)
+    assert taux == {"EUR": 1.0, "USD": 0.93, "MAD": 0.094}
+    assert provenance["USD"] == "BCE"
+    assert cache.lire("BCE", "2025-03-10") is None   # un repli hors ligne n'est pas mémorisé
+    assert "Repli" in capsys.readouterr().out
+
+    # sans taux de secours, la BCE hors ligne est ignorée au profit des suivants
+    sans_secours = FournisseurBCE()
+    sans_secours.timeout = 2.0
+    taux, provenance = taux_fusionnes([sans_secours, FournisseurLocal({"EUR": 1.0})], "2025-03-10")
+    assert taux == {"EUR": 1.0} and provenance == {"EUR": "local"}
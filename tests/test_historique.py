@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Index historique des clés consolidées : clés partagées entre sorties, réécriture d'une sortie, modes du core."""
+from __future__ import annotations
+
+import os
+import shutil
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ETL_SIAMP_HISTORIQUE import IndexHistorique, VERSION_INDEX, FEUILLE_CHEVAUCHEMENTS
+
+A, B, C = 11, 22, 33
+
+
+@pytest.fixture
+def index(tmp_path):
+    with IndexHistorique(str(tmp_path / "historique.sqlite")) as idx:
+        yield idx
+
+
+def _enregistrer(index, cles, sortie) -> int:
+    cles = np.array(cles, dtype=np.int64)
+    return index.enregistrer(cles, np.full(len(cles), "2025-01", dtype=object), sortie)
+
+
+def _precedentes(index, cles, sortie) -> list[int]:
+    return index.chevauchements(np.array(cles, dtype=np.int64), sortie).tolist()
+
+
+def test_cle_partagee_signalee_avec_la_derniere_sortie(index, tmp_path):
+    out1, out2, out3 = (str(tmp_path / f"out{i}.xlsx") for i in (1, 2, 3))
+    e1 = _enregistrer(index, [A, B], out1)
+    assert _precedentes(index, [B, C], out2) == [e1, 0]
+    e2 = _enregistrer(index, [B, C], out2)
+    assert _precedentes(index, [A, B, C], out3) == [e1, e2, e2]  # B : out2, plus récente que out1
+    assert len(index) == 3
+
+
+def test_sortie_courante_ignoree(index, tmp_path):
+    out1 = str(tmp_path / "out1.xlsx")
+    _enregistrer(index, [A, B], out1)
+    assert _precedentes(index, [A, B], out1) == [0, 0]
+
+
+def test_reecriture_garde_les_cles_des_autres_sorties(index, tmp_path):
+    out1, out2, out3 = (str(tmp_path / f"out{i}.xlsx") for i in (1, 2, 3))
+    _enregistrer(index, [A, B], out1)
+    e2 = _enregistrer(index, [B, C], out2)
+    e1 = _enregistrer(index, [A], out1)                          # out1 réécrite sans B
+    assert _precedentes(index, [A, B, C], out3) == [e1, e2, e2]  # B toujours connue par out2
+    _enregistrer(index, [C], out2)                               # plus aucune sortie ne contient B
+    assert _precedentes(index, [B], out3) == [0]
+    assert index.cnx.execute("SELECT COUNT(*) FROM executions").fetchone()[0] == 2
+
+
+def test_index_v1_migre(tmp_path):
+    chemin = str(tmp_path / "historique.sqlite")
+    with sqlite3.connect(chemin) as cnx:
+        cnx.executescript("""
+            CREATE TABLE executions (id INTEGER PRIMARY KEY, date TEXT NOT NULL, sortie TEXT NOT NULL, lignes INTEGER NOT NULL);
+            CREATE TABLE cles (empreinte INTEGER PRIMARY KEY, execution INTEGER NOT NULL, mois TEXT) WITHOUT ROWID;
+            CREATE INDEX cles_execution ON cles (execution);
+            INSERT INTO executions VALUES (1, '2025-01-01T00:00:00', '/ancienne.xlsx', 2);
+            INSERT INTO cles VALUES (11, 1, '2025-01'), (22, 1, '2025-01');
+        """)
+    cnx.close()
+    with IndexHistorique(chemin) as index:
+        assert index.cnx.execute("PRAGMA user_version").fetchone()[0] == VERSION_INDEX
+        assert _precedentes(index, [A, B, C], str(tmp_path / "out.xlsx")) == [1, 1, 0]
+        e2 = _enregistrer(index, [B], str(tmp_path / "out.xlsx"))
+        assert _precedentes(index, [B], str(tmp_path / "out3.xlsx")) == [e2]
+    with IndexHistorique(chemin) as index:  # réouverture : pas de seconde migration
+        assert len(index) == 2
+
+
+def test_sorties_successives_du_core(executer_etl, tmp_path, classeur_exemple):
+    shutil.copy(classeur_exemple, tmp_path / "EGY TURNOVER.xlsx")
+    # (sortie, mode, sortie précédente attendue dans la feuille des lignes déjà consolidées)
+    for sortie, mode, precedente in (("out1.xlsx", "signaler", None), ("out2.xlsx", "remplacer", "out1.xlsx"),
+                                     ("out3.xlsx", "signaler", "out2.xlsx"), ("out1.xlsx", "signaler", "out3.xlsx")):
+        res = executer_etl("--fichiers", "EGY TURNOVER.xlsx", "--chemin_sortie", sortie, "--date", "2025-03-10",
+                           "--mois_selectionnes", "2025-01,2025-02,2025-03", "--taux_manuels", "EGP=0.019",
+                           "--historique", mode)
+        assert res.returncode == 0, res.stdout + res.stderr
+        deja = pd.read_excel(tmp_path / sortie, sheet_name=None).get(FEUILLE_CHEVAUCHEMENTS)
+        if precedente is None:
+            assert deja is None
+        else:
+            assert set(deja["SORTIE PRÉCÉDENTE"].map(os.path.basename)) == {precedente}, sortie
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Lecteur stream (openpyxl read_only) : même DataFrame que pd.read_excel."""
+from __future__ import annotations
+
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook, load_workbook
+
+from ETL_SIAMP_LECTURE import Classeur, lire_colonnes_stream, lire_feuille_stream
+
+ENTETE = ["MONTH", "SIAMP UNIT", "SALE TYPE", "TYPE OF CANAL", "ENSEIGNE", "CUSTOMER NAME", "COMMERCIAL AREA",
+          "SUR FAMILLE", "FAMILLE", "REFERENCE", "PRODUCT NAME", "QUANTITY", "TURNOVER", "CURRENCY", "COUNTRY",
+          "VARIABLE COSTS", "COGS", "Transaction Type"]
+
+
+def _ligne(i: int) -> list:
+    return [datetime(2025, 1 + i % 3, 1), "SIAMP EGYPT", "EXT", "Wholesaler", f"ENSEIGNE {i % 7}", f"CLIENT {i}",
+            "EGYPT", "Technical", "Set", 10013254 + i, f"Produit {i}", i * 10, i * 1.5, "EGP", "EGY",
+            None if i % 5 == 0 else i / 3, "12" if i % 4 == 0 else i / 7, "vente"]
+
+
+def _classeur(path, lignes: dict[int, list]) -> str:
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "TURNOVER"
+    ws.append(ENTETE)
+    for numero, valeurs in lignes.items():
+        for col, v in enumerate(valeurs, 1):
+            if v is not None:
+                ws.cell(row=numero, column=col, value=v)
+    wb.save(path)
+    return str(path)
+
+
+def _lire_stream(path: str) -> pd.DataFrame:
+    wb = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    try:
+        return lire_feuille_stream(wb["TURNOVER"])
+    finally:
+        wb.close()
+
+
+def test_classeur_exemple(classeur_exemple):
+    attendu = pd.read_excel(classeur_exemple, sheet_name="TURNOVER", usecols="A:Q")
+    pd.testing.assert_frame_equal(_lire_stream(classeur_exemple), attendu)
+
+
+def test_grand_bloc_de_lignes_vides(tmp_path):
+    # 50 lignes, 1500 lignes vides, puis 49 lignes : rien ne doit être perdu après le trou
+    lignes = {2 + i: _ligne(i) for i in range(50)}
+    lignes.update({1552 + i: _ligne(50 + i) for i in range(49)})
+    path = _classeur(tmp_path / "trou.xlsx", lignes)
+    attendu = pd.read_excel(path, sheet_name="TURNOVER", usecols="A:Q")
+    lu = _lire_stream(path)
+    assert len(lu) == len(attendu) == 1599
+    pd.testing.assert_frame_equal(lu, attendu)
+
+
+def test_lignes_finales_hors_colonnes_lues(tmp_path):
+    # lignes de fin renseignées seulement après Q : lignes NaN pour pandas, donc aussi pour le lecteur stream
+    lignes = {2: _ligne(1)}
+    lignes.update({3 + i: [None] * 19 + [f"note {i}"] for i in range(3)})
+    path = _classeur(tmp_path / "hors_colonnes.xlsx", lignes)
+    attendu = pd.read_excel(path, sheet_name="TURNOVER", usecols="A:Q")
+    lu = _lire_stream(path)
+    assert len(lu) == len(attendu) == 4
+    pd.testing.assert_frame_equal(lu, attendu)
+
+
+def test_lignes_vides_finales_ignorees(tmp_path):
+    lignes = {2 + i: _ligne(i) for i in range(10)}
+    lignes[2000] = [None, ""]
+    path = _classeur(tmp_path / "fin_vide.xlsx", lignes)
+    pd.testing.assert_frame_equal(_lire_stream(path), pd.read_excel(path, sheet_name="TURNOVER", usecols="A:Q"))
+
+
+def test_colonnes_choisies(tmp_path):
+    lignes = {2 + i: _ligne(i) for i in range(20)}
+    lignes.update({1600 + i: _ligne(20 + i) for i in range(5)})
+    lignes[1700] = [None] * 19 + ["note"]
+    path = _classeur(tmp_path / "colonnes.xlsx", lignes)
+    attendu = pd.read_excel(path, sheet_name="TURNOVER").iloc[:, [0, 9, 16]]
+    wb = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    try:
+        lu = lire_colonnes_stream(wb["TURNOVER"], [0, 9, 16])
+    finally:
+        wb.close()
+    pd.testing.assert_frame_equal(lu, attendu)
+
+
+@pytest.mark.parametrize("lecteur", ["stream", "pandas"])
+def test_classeur_lecteurs(classeur_exemple, lecteur):
+    with Classeur(classeur_exemple, lecteur) as classeur:
+        assert classeur.feuilles == ["TURNOVER"]
+        df = classeur.lire("TURNOVER")
+    pd.testing.assert_frame_equal(df, pd.read_excel(classeur_exemple, sheet_name="TURNOVER", usecols="A:Q"))
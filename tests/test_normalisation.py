@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Normalisation par valeurs distinctes : même résultat que l'ancien chemin cellule par cellule, sur le classeur d'exemple."""
+from __future__ import annotations
+
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ETL_SIAMP_NORMALISATION import (normaliser, par_valeurs_uniques, nettoyer_str, nettoyer_invisibles,
+                                     majuscules, majuscules_sans_vides, strip_majuscules)
+from ETL_SIAMP_SCHEMA import typer_feuille
+
+
+# ------------------------------------------------------------------ ancien chemin (cellule par cellule, re.sub)
+def _ancien_nettoyer_str(s):
+    if pd.isna(s):
+        return None
+    if isinstance(s, str):
+        s = s.strip().upper()
+        s = re.sub(r'[^\x20-\x7E\u00A0-\uFFFF]', '', s)
+        return s
+    return s
+
+
+def _ancien_appliquer(serie: pd.Series, fn) -> pd.Series:
+    """serie.apply(fn), une fois par catégorie pour une colonne catégorielle (ancien ETL_SIAMP_SCHEMA.appliquer)."""
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.apply(fn)
+    valeurs = pd.Series([fn(c) for c in serie.cat.categories], dtype=object)
+    correspondance, uniques = pd.factorize(valeurs)
+    codes = serie.cat.codes.to_numpy()
+    nouveaux = np.where(codes >= 0, correspondance[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(nouveaux, categories=uniques), index=serie.index, name=serie.name)
+
+
+def _ancien_nettoyer_cellules(df: pd.DataFrame) -> pd.DataFrame:
+    return df.map(lambda x: re.sub(r'[^\x09\x0A\x0D\x20-\x7E\u00A0-\uFFFF]', '', str(x)) if isinstance(x, str) else x)
+
+
+# ------------------------------------------------------------------ données
+@pytest.fixture
+def turnover(classeur_exemple) -> pd.DataFrame:
+    """Feuille TURNOVER d'exemple, salie : espaces, minuscules, caractères de contrôle, NBSP, manquants."""
+    df = pd.read_excel(classeur_exemple, sheet_name="TURNOVER")
+    rng = np.random.default_rng(10)
+    salissures = np.array([" {} ", "{}\x07", " {}", "\t{}\r\n", "{}\U0001F600", "\u00a0{}", "{}"], dtype=object)
+    for col in df.select_dtypes(include="object").columns:
+        valeurs = df[col].to_numpy(dtype=object).copy()
+        for i in rng.choice(len(valeurs), size=len(valeurs) // 2, replace=False):
+            if isinstance(valeurs[i], str):
+                valeurs[i] = rng.choice(salissures).format(valeurs[i].lower())
+        valeurs[rng.choice(len(valeurs), size=3, replace=False)] = None
+        df[col] = valeurs
+    return df
+
+
+def test_classeur_exemple_a_des_colonnes_texte(turnover):
+    assert len(turnover) == 47
+    assert len(turnover.select_dtypes(include="object").columns) >= 5
+
+
+def test_nettoyer_str_colonnes_objet(turnover):
+    attendu = turnover.copy()
+    for col in attendu.select_dtypes(include=["object", "category"]).columns:
+        attendu[col] = attendu[col].apply(_ancien_nettoyer_str)
+    pd.testing.assert_frame_equal(normaliser(turnover.copy(), nettoyer_str), attendu)
+
+
+def test_nettoyer_str_colonnes_categorielles(turnover):
+    typee = typer_feuille(turnover.copy())
+    assert any(isinstance(t, pd.CategoricalDtype) for t in typee.dtypes)
+    attendu = typee.copy()
+    for col in attendu.select_dtypes(include=["object", "category"]).columns:
+        attendu[col] = _ancien_appliquer(attendu[col], _ancien_nettoyer_str)
+    resultat = normaliser(typee.copy(), nettoyer_str)
+    pd.testing.assert_frame_equal(resultat, attendu)
+
+
+def test_nettoyer_invisibles(turnover):
+    attendu = _ancien_nettoyer_cellules(turnover)
+    pd.testing.assert_frame_equal(normaliser(turnover.copy(), nettoyer_invisibles), attendu)
+
+
+@pytest.mark.parametrize("fn, ancienne", [
+    (majuscules, lambda s: s.astype(str).str.strip().str.upper()),
+    (majuscules_sans_vides, lambda s: s.fillna("").astype(str).str.strip().str.upper()),
+    (strip_majuscules, lambda s: s.str.strip().str.upper()),
+])
+def test_expressions_colonne(turnover, fn, ancienne):
+    for col in turnover.select_dtypes(include="object").columns:
+        pd.testing.assert_series_equal(par_valeurs_uniques(turnover[col], fn), ancienne(turnover[col]))
+    # colonne sans chaîne : le type inféré par pandas est conservé
+    nombres = turnover["QUANTITY"].astype(object)
+    pd.testing.assert_series_equal(par_valeurs_uniques(nombres, majuscules), nombres.astype(str).str.strip().str.upper())
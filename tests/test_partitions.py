@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Sortie partitionnée : découpage auto / annee / mois, tranches numérotées, SANS DATE, feuille INDEX, classeurs séparés."""
+from __future__ import annotations
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from ETL_SIAMP_ECRITURE import (FEUILLE_INDEX, FORMAT_EURO, SANS_DATE, classeur_sortie, ecrire_partitions,
+                                index_partitions, partitionner)
+
+DATES = pd.Series(pd.to_datetime(["2024-03-05", "2025-01-10", "2024-01-20", None,
+                                  "2025-02-01", "2025-02-14", "2025-02-28", "2024-03-31"]))
+
+
+def _partitions(dates, mode, lignes_max=3) -> list[tuple[str, list[int]]]:
+    return [(etiquette, positions.tolist()) for etiquette, positions in partitionner(dates, mode, lignes_max)]
+
+
+def _fusion() -> pd.DataFrame:
+    return pd.DataFrame({
+        "MONTH": DATES,
+        "REFERENCE": [f"REF{i}" for i in range(len(DATES))],
+        "C.A en €": [10.0, 20.0, np.nan, 1.5, 100.0, 200.0, 300.0, 5.0],
+        "Margin": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0],
+    })
+
+
+# ------------------------------------------------------------------ découpage
+def test_sans_depassement_pas_de_partition():
+    assert partitionner(DATES, "auto", lignes_max=8) == []
+    assert partitionner(DATES, "aucune", lignes_max=1) == []
+    with pytest.raises(ValueError, match="Mode de partition inconnu"):
+        partitionner(DATES, "semaine")
+
+
+def test_auto_par_annee_puis_par_mois():
+    # 2024 (3 lignes) tient dans la limite ; 2025 (4 lignes) est redécoupée par mois
+    assert _partitions(DATES, "auto") == [("2024", [0, 2, 7]), ("2025-01", [1]), ("2025-02", [4, 5, 6]),
+                                          (SANS_DATE, [3])]
+
+
+def test_annee_tranches_numerotees():
+    assert _partitions(DATES, "annee") == [("2024", [0, 2, 7]), ("2025 (1)", [1, 4, 5]), ("2025 (2)", [6]),
+                                           (SANS_DATE, [3])]
+
+
+def test_mois():
+    assert _partitions(DATES, "mois", lignes_max=100) == [
+        ("2024-01", [2]), ("2024-03", [0, 7]), ("2025-01", [1]), ("2025-02", [4, 5, 6]), (SANS_DATE, [3])]
+
+
+def test_mois_au_dela_de_la_limite_en_tranches():
+    assert _partitions(DATES, "mois", lignes_max=2) == [
+        ("2024-01", [2]), ("2024-03", [0, 7]), ("2025-01", [1]), ("2025-02 (1)", [4, 5]), ("2025-02 (2)", [6]),
+        (SANS_DATE, [3])]
+
+
+def test_sans_date_en_dernier_et_decoupe():
+    dates = pd.Series(pd.to_datetime([None, "2025-01-01", None, None, "2025-01-02"]))
+    assert _partitions(dates, "auto", lignes_max=2) == [
+        ("2025", [1, 4]), (f"{SANS_DATE} (1)", [0, 2]), (f"{SANS_DATE} (2)", [3])]
+
+
+def test_dates_texte_converties():
+    texte = pd.Series(["2025-01-10", "2025-02-01", "pas une date", "2025-01-31"])
+    assert _partitions(texte, "mois") == [("2025-01", [0, 3]), ("2025-02", [1]), (SANS_DATE, [2])]
+
+
+@pytest.mark.parametrize("mode", ["auto", "annee", "mois"])
+def test_chaque_ligne_une_seule_fois_dans_l_ordre(mode):
+    rng = np.random.default_rng(25)
+    jours = pd.to_datetime("2023-01-01") + pd.to_timedelta(rng.integers(0, 900, 5000), unit="D")
+    dates = pd.Series(jours).where(rng.random(5000) > 0.02)
+    partitions = partitionner(dates, mode, lignes_max=400)
+    assert all(0 < len(p) <= 400 for _, p in partitions)
+    assert all((np.diff(p) > 0).all() for _, p in partitions)
+    assert np.array_equal(np.sort(np.concatenate([p for _, p in partitions])), np.arange(len(dates)))
+    etiquettes = [e for e, _ in partitions]
+    assert etiquettes[-1].startswith(SANS_DATE) and len(set(etiquettes)) == len(etiquettes)
+
+
+# ------------------------------------------------------------------ index
+def test_index_totaux():
+    df = _fusion()
+    partitions = partitionner(df["MONTH"], "annee", lignes_max=3)
+    index = index_partitions(df, partitions, [e for e, _ in partitions], "FEUILLE", ["C.A en €", "Margin", "ABSENTE"])
+    assert list(index.columns) == ["PARTITION", "FEUILLE", "LIGNES", "C.A en €", "Margin"]
+    assert index["PARTITION"].tolist() == ["2024", "2025 (1)", "2025 (2)", SANS_DATE, "TOTAL"]
+    assert index["LIGNES"].tolist() == [3, 3, 1, 1, 8]
+    assert index["C.A en €"].tolist() == [15.0, 320.0, 300.0, 1.5, 636.5]  # NaN ignoré
+    assert index["Margin"].iloc[-1] == df["Margin"].sum()
+    assert index["FEUILLE"].iloc[-1] is None
+
+
+# ------------------------------------------------------------------ écriture
+def test_ecriture_en_feuilles(tmp_path):
+    df = _fusion()
+    path = str(tmp_path / "out.xlsx")
+    classeur = classeur_sortie()
+    partitions = partitionner(df["MONTH"], "auto", lignes_max=3)
+    ecrire_partitions(classeur, df, partitions, path, formats={"C.A en €": FORMAT_EURO}, table="FusionTable",
+                      totaux=["C.A en €"])
+    classeur.save(path)
+
+    wb = load_workbook(path)
+    assert wb.sheetnames == [FEUILLE_INDEX, "2024", "2025-01", "2025-02", SANS_DATE]
+    index = pd.read_excel(path, sheet_name=FEUILLE_INDEX)
+    assert index["FEUILLE"].tolist()[:-1] == wb.sheetnames[1:]
+    assert index["LIGNES"].tolist() == [3, 1, 3, 1, 8]
+    assert wb[FEUILLE_INDEX].freeze_panes == "A2"
+    assert wb[FEUILLE_INDEX]["D2"].number_format == FORMAT_EURO
+    assert list(wb["2025-02"].tables) == ["FusionTable_2025_02"]
+    assert list(wb[SANS_DATE].tables) == ["FusionTable_SANS_DATE"]
+    lu = pd.read_excel(path, sheet_name="2024")
+    pd.testing.assert_frame_equal(lu, df.iloc[[0, 2, 7]].reset_index(drop=True), check_dtype=False)
+
+
+def test_ecriture_en_classeurs(tmp_path):
+    df = _fusion()
+    path = str(tmp_path / "out.xlsx")
+    classeur = classeur_sortie()
+    partitions = partitionner(df["MONTH"], "mois", lignes_max=2)
+    index = ecrire_partitions(classeur, df, partitions, path, "classeurs", table="FusionTable")
+    classeur.save(path)
+
+    attendus = ["out_2024_01.xlsx", "out_2024_03.xlsx", "out_2025_01.xlsx", "out_2025_02_1.xlsx",
+                "out_2025_02_2.xlsx", "out_SANS_DATE.xlsx"]
+    assert index["FICHIER"].tolist()[:-1] == attendus
+    assert sorted(os.listdir(tmp_path)) == sorted(attendus + ["out.xlsx"])
+    assert load_workbook(path).sheetnames == [FEUILLE_INDEX]
+    partiel = load_workbook(tmp_path / "out_2025_02_1.xlsx")
+    assert partiel.sheetnames == ["2025-02 (1)"]
+    assert list(partiel["2025-02 (1)"].tables) == ["FusionTable_2025_02_1"]
+    assert pd.read_excel(tmp_path / "out_2025_02_1.xlsx")["REFERENCE"].tolist() == ["REF4", "REF5"]
+    with pytest.raises(ValueError, match="Cible de partition inconnue"):
+        ecrire_partitions(classeur_sortie(), df, partitions, path, "dossiers")
+
+
+def test_core_partition_par_mois_en_classeurs(executer_etl, tmp_path, classeur_exemple):
+    res = executer_etl("--fichiers", classeur_exemple, "--chemin_sortie", "out.xlsx", "--date", "2025-03-10",
+                       "--mois_selectionnes", "2025-01,2025-02,2025-03", "--taux_manuels", "EGP=0.019",
+                       "--historique", "aucun", "--partition", "mois", "--partition_cible", "classeurs")
+    assert res.returncode == 0, res.stdout + res.stderr
+    index = pd.read_excel(tmp_path / "out.xlsx", sheet_name=FEUILLE_INDEX)
+    assert index["FICHIER"].tolist()[:-1] == ["out_2025_01.xlsx", "out_2025_02.xlsx", "out_2025_03.xlsx"]
+    lignes = [len(pd.read_excel(tmp_path / f)) for f in index["FICHIER"].iloc[:-1]]
+    assert lignes == index["LIGNES"].tolist()[:-1] and sum(lignes) == index["LIGNES"].iloc[-1]
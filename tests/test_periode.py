@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Filtre de période (mois choisis, bornes de dates) : bords de mois, sélections vides, dates manquantes."""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ETL_SIAMP import filtre_periode, masque_periode, cle_mois
+
+DATES = pd.Series(pd.to_datetime([
+    "2024-12-31 23:59:59", "2025-01-01 00:00:00", "2025-01-15", "2025-01-31 23:59:59.999",
+    "2025-02-01", "2025-02-28 18:00", "2025-03-01", None, "2025-03-31", "2026-01-10",
+], format="ISO8601"))
+
+
+def _par_periodes(dates: pd.Series, mois: list[str]) -> np.ndarray:
+    """Ancien filtre : .dt.to_period("M").astype(str).isin(mois)."""
+    return dates.dt.to_period("M").astype(str).isin(mois).to_numpy()
+
+
+def test_aucun_filtre():
+    assert filtre_periode(None, None, None) is None
+    assert filtre_periode("", "", "") is None
+
+
+@pytest.mark.parametrize("mois", ["2025-01", "2025-01,2025-02", "2024-12,2025-03", "2025-01,2026-01", "2023-06"])
+def test_mois_choisis_identiques_aux_periodes(mois):
+    garder = masque_periode(DATES, filtre_periode(mois, None, None))
+    np.testing.assert_array_equal(garder, _par_periodes(DATES, mois.split(",")))
+
+
+def test_bords_de_mois():
+    garder = masque_periode(DATES, filtre_periode("2025-01", None, None))
+    assert DATES[garder].tolist() == DATES[1:4].tolist()  # 1er janvier 0 h → 31 janvier 23:59:59.999
+
+
+def test_espaces_et_virgules_superflues():
+    attendu = masque_periode(DATES, filtre_periode("2025-01,2025-02", None, None))
+    np.testing.assert_array_equal(masque_periode(DATES, filtre_periode(" 2025-01 , 2025-02,", None, None)), attendu)
+
+
+def test_selection_vide_ne_garde_rien():
+    filtre = filtre_periode(" , ", None, None)
+    assert filtre["mois"].size == 0
+    assert not masque_periode(DATES, filtre).any()
+
+
+def test_bornes_incluses():
+    garder = masque_periode(DATES, filtre_periode(None, "2025-01-01", "2025-01-31"))
+    assert DATES[garder].tolist() == DATES[1:4].tolist()  # journée de fin incluse jusqu'à 23:59:59.999
+    garder = masque_periode(DATES, filtre_periode(None, "2025-02-28", None))
+    assert DATES[garder].tolist() == DATES[[5, 6, 8, 9]].tolist()
+    garder = masque_periode(DATES, filtre_periode(None, None, "2024-12-31"))
+    assert DATES[garder].tolist() == DATES[:1].tolist()
+
+
+def test_bornes_inversees_ne_gardent_rien():
+    assert not masque_periode(DATES, filtre_periode(None, "2025-03-01", "2025-02-01")).any()
+
+
+def test_mois_et_bornes_cumules():
+    garder = masque_periode(DATES, filtre_periode("2025-01,2025-02", "2025-01-15", "2025-02-01"))
+    assert DATES[garder].tolist() == DATES[2:5].tolist()
+
+
+def test_dates_manquantes_ecartees():
+    nat = pd.Series(pd.to_datetime([None, None]))
+    for filtre in (filtre_periode("2025-01", None, None), filtre_periode(None, "1970-01-01", None),
+                   filtre_periode(None, None, "2100-01-01")):
+        assert not masque_periode(DATES, filtre)[7]
+        assert not masque_periode(nat, filtre).any()
+    # la clé de mois d'un NaT ne peut correspondre à aucun mois choisi
+    assert cle_mois(nat)[0] == np.iinfo(np.int64).min
+
+
+def test_resolution_des_dates_sans_effet():
+    secondes = DATES.astype("datetime64[s]")
+    filtre = filtre_periode("2025-01,2025-03", "2025-01-10", "2025-03-31")
+    np.testing.assert_array_equal(masque_periode(secondes, filtre), masque_periode(DATES, filtre))
+
+
+def test_serie_vide():
+    vide = pd.Series([], dtype="datetime64[ns]")
+    assert masque_periode(vide, filtre_periode("2025-01", "2025-01-01", "2025-01-31")).shape == (0,)
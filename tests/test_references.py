@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Références compilées : mêmes tables que l'ancienne lecture pandas, cache relu puis invalidé sur modification du classeur."""
+from __future__ import annotations
+
+import os
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+import ETL_SIAMP_REFERENCES
+from ETL_SIAMP_CACHE import PARQUET_DISPONIBLE
+from ETL_SIAMP_REFERENCES import charger_references, cache_references
+
+TABLE = [  # (O = REFERENCE, Q = Sur-famille, V = clé enseigne, W = Enseigne ret)
+    (10013254, "tech ", "CARREFOUREGYPT", "carrefour"),
+    ("10013255", "set", " AUCHAN", "Auchan"),
+    (" 10013254", "spare", "carrefouregypt", "CARREFOUR MARKET"),  # doublon masqué sur REFERENCE et V
+    (10013256, None, None, None),
+    ("ref-a", "Tech", "auchan ", "metro"),  # doublon masqué sur V
+]
+ZONES = [("Egypt", "MEA"), ("egypt ", "MEA"), ("Spain", "EUROPE"), ("UK", "EUROPE"), ("UK", "NORTH")]
+
+
+def _classeur(path, table=TABLE, zones=ZONES) -> str:
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "table"
+    ws.append([f"COL{i}" for i in range(23)])
+    for o, q, v, w in table:
+        ligne = [None] * 23
+        ligne[0], ligne[14], ligne[16], ligne[21], ligne[22] = "x", o, q, v, w
+        ws.append(ligne)
+    ws = wb.create_sheet("ZONE AFFECTATION")
+    ws.append(["PAYS", "B", "C", "D", "ZONE"])
+    for pays, zone in zones:
+        ws.append([pays, None, None, None, zone])
+    wb.save(path)
+    return str(path)
+
+
+def _ancienne_lecture(path) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Expressions de l'ancien ETL_SIAMP.py (read_excel, astype(str).str.strip().str.upper(), keep="last")."""
+    table = pd.read_excel(path, sheet_name="table", engine="openpyxl")
+    for i in (14, 16, 21, 22):
+        table.iloc[:, i] = table.iloc[:, i].astype(str).str.strip().str.upper()
+    table = table.drop_duplicates(subset=table.columns[14], keep="last")
+    sur_famille = table.iloc[:, [14, 16]].set_axis(["REFERENCE", "Sur-famille"], axis=1)
+    table["concat_key"] = table.iloc[:, 21]
+    table = table.drop_duplicates(subset="concat_key", keep="last")
+    enseigne = table[["concat_key", table.columns[22]]].set_axis(["concat_key", "Enseigne ret"], axis=1)
+    zones = pd.read_excel(path, sheet_name="ZONE AFFECTATION", usecols="A,E", engine="openpyxl")
+    zones.columns = ["PAYS", "COMMERCIAL AREA"]
+    zones["PAYS"] = zones["PAYS"].astype(str).str.strip().str.upper()
+    return tuple(df.reset_index(drop=True) for df in (sur_famille, enseigne, zones.drop_duplicates()))
+
+
+@pytest.fixture
+def ouvertures(monkeypatch) -> list[str]:
+    """Classeurs ouverts par charger_references."""
+    appels = []
+    ouvrir = ETL_SIAMP_REFERENCES.load_workbook
+
+    def compter(path, **kwargs):
+        appels.append(os.path.basename(path))
+        return ouvrir(path, **kwargs)
+
+    monkeypatch.setattr(ETL_SIAMP_REFERENCES, "load_workbook", compter)
+    return appels
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    if not PARQUET_DISPONIBLE:
+        pytest.skip("pyarrow requis pour le cache")
+    monkeypatch.setenv("ETL_SIAMP_DATA", str(tmp_path / "donnees"))
+    return cache_references(100)
+
+
+def test_tables_identiques_a_l_ancienne_lecture(tmp_path, ouvertures):
+    path = _classeur(tmp_path / "STATS.xlsx")
+    refs = charger_references(path, path)
+    sur_famille, enseigne, zones = _ancienne_lecture(path)
+    pd.testing.assert_frame_equal(refs.sur_famille, sur_famille, check_dtype=False)
+    pd.testing.assert_frame_equal(refs.enseigne, enseigne, check_dtype=False)
+    pd.testing.assert_frame_equal(refs.zones, zones, check_dtype=False)
+    assert (refs.doublons_reference, refs.doublons_enseigne) == (1, 1)
+    assert ouvertures == ["STATS.xlsx"]  # table et zones lues dans une seule ouverture
+
+
+def test_cache_relu_sans_ouvrir_le_classeur(tmp_path, ouvertures, cache, capsys):
+    path = _classeur(tmp_path / "STATS.xlsx")
+    premiere = charger_references(path, path, cache)
+    assert ouvertures == ["STATS.xlsx"]
+    seconde = charger_references(path, path, cache_references(100))
+    assert ouvertures == ["STATS.xlsx"]
+    assert "relues depuis le cache compilé" in capsys.readouterr().out
+    for nom in ("sur_famille", "enseigne", "zones"):
+        pd.testing.assert_frame_equal(getattr(seconde, nom), getattr(premiere, nom))
+    assert (seconde.doublons_reference, seconde.doublons_enseigne) == (1, 1)
+
+
+def test_invalidation_sur_modification_du_classeur(tmp_path, ouvertures, cache):
+    path = _classeur(tmp_path / "STATS.xlsx")
+    charger_references(path, path, cache)
+    mtime = os.stat(path).st_mtime_ns
+    _classeur(path, table=TABLE + [("ref-b", "set", "LIDL", "lidl")], zones=ZONES[:2])
+    os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+    refs = charger_references(path, path, cache)
+    assert ouvertures == ["STATS.xlsx", "STATS.xlsx"]
+    assert refs.sur_famille["REFERENCE"].tolist()[-1] == "REF-B"
+    assert refs.zones["PAYS"].tolist() == ["EGYPT"]
+
+
+def test_invalidation_sur_seule_date_de_modification(tmp_path, ouvertures, cache):
+    path = _classeur(tmp_path / "STATS.xlsx")
+    charger_references(path, path, cache)
+    mtime = os.stat(path).st_mtime_ns
+    os.utime(path, ns=(mtime + 10**9, mtime + 10**9))  # même contenu, fichier ré-enregistré
+    charger_references(path, path, cache)
+    charger_references(path, path, cache)
+    assert ouvertures == ["STATS.xlsx", "STATS.xlsx"]
+
+
+def test_tables_compilees_versionnees(tmp_path, ouvertures, cache, monkeypatch):
+    path = _classeur(tmp_path / "STATS.xlsx")
+    charger_references(path, path, cache)
+    monkeypatch.setattr(ETL_SIAMP_REFERENCES, "LECTEUR", "references-v999")
+    charger_references(path, path, cache)
+    assert ouvertures == ["STATS.xlsx", "STATS.xlsx"]
+
+
+def test_classeurs_distincts_et_reference_absente(tmp_path, ouvertures, cache, capsys):
+    table = _classeur(tmp_path / "TABLE.xlsx")
+    zones = _classeur(tmp_path / "ZONES.xlsx")
+    refs = charger_references(table, zones, cache)
+    assert sorted(ouvertures) == ["TABLE.xlsx", "ZONES.xlsx"]
+    refs = charger_references(str(tmp_path / "ABSENT.xlsx"), zones, cache)
+    assert refs.sur_famille is None and refs.zones is not None
+    assert "introuvable" in capsys.readouterr().out
+    assert len(ouvertures) == 2
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Scan des classeurs : feuilles TURNOVER seules, manifeste écrit puis relu."""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+
+from openpyxl import load_workbook
+
+from ETL_SIAMP_CACHE import CacheFeuilles
+from ETL_SIAMP_SCAN import VERSION_MANIFESTE, ecrire_manifeste, lire_manifeste, scanner, scanner_fichier
+
+
+def _classeur_avec_annexe(tmp_path, classeur_exemple) -> str:
+    path = tmp_path / "EGY TURNOVER.xlsx"
+    wb = load_workbook(classeur_exemple)
+    annexe = wb.create_sheet("NOTES")
+    annexe.append(["MONTH", "COMMENTAIRE"])
+    annexe.append(["2019-06-01", "hors périmètre"])
+    wb.save(path)
+    return str(path)
+
+
+def test_feuilles_turnover_seules(tmp_path, classeur_exemple):
+    path = _classeur_avec_annexe(tmp_path, classeur_exemple)
+    cache = CacheFeuilles(str(tmp_path / "cache"))
+    entree = scanner_fichier(path, "stream", cache)
+    assert entree["erreur"] is None
+    assert [f["nom"] for f in entree["feuilles"]] == ["TURNOVER"]
+    feuille = entree["feuilles"][0]
+    assert feuille["valide"] and feuille["lignes"] == 47
+    assert feuille["devises"] == ["EGP"]
+    assert "2019-06" not in feuille["mois"] and feuille["mois"][0] == "2025-01"
+    if cache.actif:   # seule la feuille TURNOVER est mise en cache
+        assert len([n for n in os.listdir(cache.dossier) if n.endswith(".parquet")]) == 1
+
+
+def test_manifeste_ecrit_puis_relu(tmp_path, classeur_exemple):
+    a = _classeur_avec_annexe(tmp_path, classeur_exemple)
+    b = str(tmp_path / "GBR TURNOVER.xlsx")
+    shutil.copy(classeur_exemple, b)
+    entrees = scanner([a, b])
+    chemin = str(tmp_path / "donnees" / "manifeste.json")
+    ecrire_manifeste(chemin, entrees, "stream")
+
+    relu = lire_manifeste(chemin, "stream")
+    assert relu == {e["fichier"]: e for e in entrees}
+    assert lire_manifeste(chemin) == relu
+    assert lire_manifeste(chemin, "pandas") == {}            # autre lecteur
+
+    # un fichier modifié n'est plus repris ; scanner() le relit, l'autre vient du manifeste
+    st = os.stat(b)
+    os.utime(b, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))
+    relu = lire_manifeste(chemin, "stream")
+    assert list(relu) == [os.path.abspath(a)]
+    rescannes = scanner([a, b], connus=relu)
+    assert rescannes[0] is relu[os.path.abspath(a)]
+    assert rescannes[1]["mtime_ns"] == os.stat(b).st_mtime_ns
+
+
+def test_manifeste_autre_version_ou_illisible(tmp_path, classeur_exemple):
+    chemin = tmp_path / "manifeste.json"
+    ecrire_manifeste(str(chemin), scanner([classeur_exemple]))
+    contenu = json.loads(chemin.read_text(encoding="utf-8"))
+    contenu["version"] = VERSION_MANIFESTE - 1
+    chemin.write_text(json.dumps(contenu), encoding="utf-8")
+    assert lire_manifeste(str(chemin)) == {}
+    chemin.write_text("{pas du json", encoding="utf-8")
+    assert lire_manifeste(str(chemin)) == {}
+    assert lire_manifeste(str(tmp_path / "absent.json")) == {}
+
+
+def test_fichier_illisible(tmp_path):
+    path = tmp_path / "casse.xlsx"
+    path.write_bytes(b"pas un classeur")
+    entree = scanner_fichier(str(path))
+    assert entree["erreur"] and entree["feuilles"] == []
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""Base des taux BCE : choix du flux à la synchronisation (serveur HTTP local), jointure « as-of » par ligne."""
+from __future__ import annotations
+
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+import ETL_SIAMP_TAUX
+from ETL_SIAMP_TAUX import BaseTaux, NS_BCE, taux_mensuels_lignes
+
+NS = NS_BCE.strip("{}")
+
+
+def _jours_ouvres(n: int) -> list[str]:
+    """Les n derniers jours ouvrés jusqu'à aujourd'hui inclus, du plus ancien au plus récent."""
+    dernier = np.busday_offset(np.datetime64(date.today(), "D"), 0, roll="backward")
+    return [str(np.busday_offset(dernier, -i)) for i in reversed(range(n))]
+
+
+def _flux(jours: list[str]) -> bytes:
+    cubes = "".join(f'<Cube time="{j}"><Cube currency="USD" rate="{1 + i / 100:.2f}"/>'
+                    f'<Cube currency="EGP" rate="{50 + i}"/></Cube>'
+                    for i, j in enumerate(jours))
+    return (f'<?xml version="1.0" encoding="UTF-8"?><gesmes:Envelope xmlns:gesmes="http://www.gesmes.org/xml/2002-08-01"'
+            f' xmlns="{NS}"><Cube>{cubes}</Cube></gesmes:Envelope>').encode("utf-8")
+
+
+class _Bouchon(BaseHTTPRequestHandler):
+    """/jour : dernier jour publié seulement ; /90j : tous les jours ; le reste : 404."""
+    jours: list[str] = []
+    requetes: list[str] = []
+
+    def do_GET(self):
+        self.requetes.append(self.path)
+        flux = {"/jour": self.jours[-1:], "/90j": self.jours}.get(self.path)
+        if flux is None:
+            self.send_error(404)
+            return
+        corps = _flux(flux)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def serveur(monkeypatch):
+    _Bouchon.jours = _jours_ouvres(3)
+    _Bouchon.requetes = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Bouchon)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    monkeypatch.setattr(ETL_SIAMP_TAUX, "URL_JOUR", f"{url}/jour")
+    monkeypatch.setattr(ETL_SIAMP_TAUX, "URL_90J", f"{url}/90j")
+    monkeypatch.setattr(ETL_SIAMP_TAUX, "URL_HIST", f"{url}/hist")
+    yield _Bouchon
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _base(tmp_path, jusqu_au: str) -> BaseTaux:
+    base = BaseTaux(str(tmp_path / "taux.sqlite"))
+    with base.cnx:
+        base.cnx.execute("INSERT INTO taux (date, devise, taux) VALUES (?, 'USD', 1.0)", (jusqu_au,))
+    return base
+
+
+def test_deux_jours_de_retard_passe_par_le_flux_90_jours(tmp_path, serveur):
+    avant_hier, hier, dernier = serveur.jours
+    base = _base(tmp_path, avant_hier)
+    assert base.synchroniser(timeout=5) == 4
+    assert serveur.requetes == ["/90j"]
+    dates = [d for (d,) in base.cnx.execute("SELECT DISTINCT date FROM taux ORDER BY date")]
+    assert dates == [avant_hier, hier, dernier]  # le jour intermédiaire n'est pas perdu
+    assert base.taux_au(hier)[0] == {"EUR": 1.0, "USD": 1.01, "EGP": 51.0}
+
+
+def test_un_jour_de_retard_passe_par_le_flux_quotidien(tmp_path, serveur):
+    _, hier, dernier = serveur.jours
+    base = _base(tmp_path, hier)
+    assert base.synchroniser(timeout=5) == 2
+    assert serveur.requetes == ["/jour"]
+    assert base.derniere_date() == dernier
+
+
+def test_base_vide_amorcee_par_l_historique(tmp_path, serveur):
+    base = BaseTaux(str(tmp_path / "taux.sqlite"))
+    with pytest.raises(requests.HTTPError):
+        base.synchroniser(timeout=5)  # /hist absent du bouchon : 404
+    assert serveur.requetes == ["/hist"]
+
+
+# ------------------------------------------------------------------ taux par ligne
+DEVISES = ["USD", "GBP", "EGP", "JPY"]
+
+
+@pytest.fixture
+def base_aleatoire(tmp_path) -> BaseTaux:
+    """Jours ouvrés du 1er semestre 2024, cotations lacunaires, quelques taux nuls, JPY plus coté après mi-février."""
+    rng = np.random.default_rng(13)
+    jours = np.arange(np.datetime64("2024-01-01"), np.datetime64("2024-07-01"))
+    jours = jours[np.is_busday(jours)]
+    lignes = []
+    for j in jours:
+        for d in DEVISES:
+            if rng.random() < 0.15 or (d == "JPY" and j > np.datetime64("2024-02-15")):
+                continue
+            lignes.append((str(j), d, 0.0 if rng.random() < 0.03 else round(float(rng.uniform(0.5, 200)), 4)))
+    base = BaseTaux(str(tmp_path / "taux.sqlite"))
+    with base.cnx:
+        base.cnx.executemany("INSERT INTO taux (date, devise, taux) VALUES (?, ?, ?)", lignes)
+    return base
+
+
+def test_taux_lignes_identique_a_taux_au(base_aleatoire):
+    rng = np.random.default_rng(130)
+    jours = np.arange(np.datetime64("2023-12-01"), np.datetime64("2024-11-01"))
+    dates = pd.Series(rng.choice(jours, 2000)).astype("datetime64[ns]")
+    dates[rng.choice(len(dates), 50, replace=False)] = pd.NaT
+    # EUR exclu : absente de l'index, elle reçoit NaN (taux global 1.0 au calcul des montants)
+    devises = pd.Series(rng.choice(np.array([*DEVISES, "XXX", None], dtype=object), len(dates)))
+
+    resultat = base_aleatoire.index().taux_lignes(dates, devises)
+
+    attendu = np.array([
+        np.nan if pd.isna(j) or d is None else base_aleatoire.taux_au(j.strftime("%Y-%m-%d"))[0].get(d, np.nan)
+        for j, d in zip(dates, devises)
+    ])
+    np.testing.assert_array_equal(resultat, attendu)
+    # la comparaison couvre bien les cas limites
+    assert (dates < "2024-01-01").any() and (dates.dt.dayofweek >= 5).any() and (dates > "2024-09-01").any()
+    assert np.isnan(resultat[(devises == "XXX").to_numpy()]).all()
+    assert np.isnan(resultat[(dates < "2024-01-01").to_numpy()]).all()
+    assert np.isfinite(resultat).sum() > 500
+
+
+def test_taux_lignes_fenetre_depassee(base_aleatoire):
+    index = base_aleatoire.index()
+    dates = pd.Series(pd.to_datetime(["2024-02-10", "2024-05-01", "2024-06-29"]))
+    jpy = index.taux_lignes(dates, pd.Series(["JPY"] * 3))
+    assert np.isfinite(jpy[0]) and np.isnan(jpy[1])  # dernière cotation JPY > 60 jours
+    assert jpy[0] == base_aleatoire.taux_au("2024-02-10")[0]["JPY"]
+    assert np.isnan(index.taux_lignes(dates, pd.Series(["JPY"] * 3), fenetre=30)[1])
+
+
+# ------------------------------------------------------------------ cube mensuel
+def _cotations(base: BaseTaux) -> pd.DataFrame:
+    return pd.read_sql_query("SELECT date, devise, taux FROM taux ORDER BY date", base.cnx)
+
+
+def _cube_groupby(cotations: pd.DataFrame) -> pd.DataFrame:
+    cotees = cotations[cotations["taux"] != 0].assign(mois=cotations["date"].str[:7])
+    groupes = cotees.groupby(["mois", "devise"])["taux"]
+    return pd.DataFrame({
+        "moyenne": groupes.mean(), "fin_mois": groupes.last(), "min": groupes.min(), "max": groupes.max(),
+        "cotations": groupes.size(),
+    }).reset_index()
+
+
+def test_cube_mensuel_identique_au_groupby(base_aleatoire):
+    cube = base_aleatoire.index().cube_mensuel()
+    attendu = _cube_groupby(_cotations(base_aleatoire))
+    pd.testing.assert_frame_equal(cube, attendu, check_dtype=False, rtol=1e-12)
+    assert cube["mois"].tolist()[0] == "2024-01" and "JPY" not in cube.loc[cube["mois"] == "2024-03", "devise"].tolist()
+
+
+def test_cube_incremental_identique_a_la_reconstruction(base_aleatoire, tmp_path):
+    cotations = _cotations(base_aleatoire)
+    with base_aleatoire.cnx:
+        base_aleatoire.cnx.execute("DELETE FROM taux WHERE date > '2024-03-13'")
+    assert base_aleatoire.mettre_a_jour_cube() == 3        # mars encore incomplet
+    assert base_aleatoire.mettre_a_jour_cube() == 0        # rien de nouveau
+    with base_aleatoire.cnx:
+        base_aleatoire.cnx.executemany("INSERT INTO taux (date, devise, taux) VALUES (?, ?, ?)",
+                                       cotations[cotations["date"] > "2024-03-13"].itertuples(index=False))
+    assert base_aleatoire.mettre_a_jour_cube() == 4        # mars recalculé, puis avril → juin
+
+    with BaseTaux(str(tmp_path / "complete.sqlite")) as complete:
+        with complete.cnx:
+            complete.cnx.executemany("INSERT INTO taux (date, devise, taux) VALUES (?, ?, ?)",
+                                     cotations.itertuples(index=False))
+        pd.testing.assert_frame_equal(base_aleatoire.cube(), complete.cube())
+    pd.testing.assert_frame_equal(base_aleatoire.cube("2024-03", "2024-04"),
+                                  base_aleatoire.cube().query("'2024-03' <= mois <= '2024-04'").reset_index(drop=True))
+
+
+def test_taux_mensuels_lignes(base_aleatoire):
+    cube = base_aleatoire.cube()
+    dates = pd.Series(pd.to_datetime(["2024-01-15", "2024-03-31", None, "2023-12-31", "2024-02-29", "2024-05-02"]))
+    devises = pd.Series(["USD", "JPY", "USD", "USD", "XXX", None], dtype=object)
+    par_couple = cube.set_index(["mois", "devise"])
+    for statistique in ["moyenne", "fin_mois", "min", "max"]:
+        resultat = taux_mensuels_lignes(cube, statistique, dates, devises)
+        attendu = [par_couple[statistique].get((j.strftime("%Y-%m"), d), np.nan) if pd.notna(j) else np.nan
+                   for j, d in zip(dates, devises)]
+        np.testing.assert_array_equal(resultat, np.array(attendu, dtype=float))
+        assert np.isfinite(resultat[0]) and np.isnan(resultat[1:]).all()